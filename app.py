@@ -1,16 +1,50 @@
+import atexit
+import codecs
+import csv
+import hashlib
+import hmac
 import os
 import random
 import string
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-import psycopg2
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+import click
+from flask import (Flask, render_template, request, redirect, url_for, flash, session, g, jsonify,
+                   make_response, Response, stream_with_context, before_render_template,
+                   template_rendered, has_request_context)
 from psycopg2.extras import RealDictCursor
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
+from db import ConnectionPool, PoolTimeout, Replica, ReplicaRouter, parse_lsn
+from cache import TTLCache, MISSING, VersionClock, RedisVersionClock, FragmentCache
+from audit import AuditWriter
+from assets import Assets, VENDOR_LOCK, build as build_assets, fetch_vendor, missing_vendor, unverified_vendor
+from passwords import PasswordHasher, LoginThrottle, HashPoolBusy
+from ratelimit import TokenBuckets, RedisTokenBuckets, ConcurrencyLimit
+import archive
+import bulk
+import dal
+import metrics
+import migrate
 
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# With a message queue, every emit is published through the broker and each
+# worker delivers it to the room members connected to it, so board rooms work
+# across processes. Unset means single-process, in-memory delivery.
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+socketio = SocketIO(
+    app, cors_allowed_origins="*",
+    message_queue=SOCKETIO_MESSAGE_QUEUE,
+    channel=os.environ.get('SOCKETIO_CHANNEL', 'nexusboard'),
+    async_mode=os.environ.get('SOCKETIO_ASYNC_MODE') or None,
+)
 app.secret_key = os.environ.get('FLASK_SECRET', 'change_this_secret')
+instrumentation = metrics.Instrumentation()
+instrumentation.instrument_socketio(socketio)
+# asset_url() for templates and /assets/<hashed name>; see assets.py
+asset_pipeline = Assets(app)
 
 # DB config — change if needed
 DB_HOST = os.environ.get('DB_HOST', 'localhost')
@@ -18,29 +52,611 @@ DB_NAME = os.environ.get('DB_NAME', 'nexusboard')
 DB_USER = os.environ.get('DB_USER', 'postgres')
 DB_PASS = os.environ.get('DB_PASS', 'Abhi2002')
 DB_PORT = os.environ.get('DB_PORT', '5432')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTHCHECK = float(os.environ.get('DB_POOL_HEALTHCHECK', '30'))
+# read replicas (comma-separated host or host:port, same database and
+# credentials) for the views marked @replica_reads; unset = primary only
+DB_REPLICAS = [h.strip() for h in os.environ.get('DB_REPLICAS', '').split(',') if h.strip()]
+# a replica further behind the primary than this many seconds is skipped
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+# seconds between probes of each replica's health and lag
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5'))
+DB_REPLICA_POOL_SIZE = int(os.environ.get('DB_REPLICA_POOL_SIZE', str(DB_POOL_SIZE)))
+DB_REPLICA_CONNECT_TIMEOUT = int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT', '2'))
+# how long a (user, board) -> role lookup is trusted. Membership changes
+# invalidate it at once: in every worker through SHARED_CACHE_URL, else only
+# in this one (and roles aren't cached at all when SOCKETIO_MESSAGE_QUEUE
+# says there are several workers without a shared cache)
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '30'))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+# redis:// URL for state every worker must agree on (dashboard and
+# membership versions, rate limits); unset keeps it in process, which is
+# only correct with a single worker
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL') or None
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+# a search ranks at most this many of its newest matches, which bounds the
+# cost of very broad terms on large boards
+SEARCH_MAX_CANDIDATES = int(os.environ.get('SEARCH_MAX_CANDIDATES', '2000'))
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', '50'))
+MY_TASKS_PAGE_SIZE = int(os.environ.get('MY_TASKS_PAGE_SIZE', '50'))
+# raw history older than this many days is rolled up by `flask compact-history`
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', '0')) or None
+# history is partitioned by month: partitions are created this many months
+# ahead, and whole months past HISTORY_RETENTION_DAYS are rolled up and dropped,
+# every HISTORY_MAINTENANCE_INTERVAL seconds (0 = only by the CLI commands)
+HISTORY_PARTITIONS_AHEAD = int(os.environ.get('HISTORY_PARTITIONS_AHEAD', '2'))
+HISTORY_MAINTENANCE_INTERVAL = float(os.environ.get('HISTORY_MAINTENANCE_INTERVAL', '3600'))
+# boards not opened or changed for this many days have their tasks and
+# history archived by that same maintenance round; unset = never
+BOARD_ARCHIVE_DAYS = int(os.environ.get('BOARD_ARCHIVE_DAYS', '0')) or None
+# task tombstones further than this many versions behind their board are
+# pruned by that round too; clients further behind reload the task list
+# (0 = keep them all)
+TASK_TOMBSTONE_VERSIONS = int(os.environ.get('TASK_TOMBSTONE_VERSIONS', '10000')) or None
+# Werkzeug hash method for new and upgraded passwords; stored hashes made
+# with anything else are re-hashed on the user's next successful login
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+# failed logins allowed per client IP / per account in LOGIN_WINDOW seconds
+LOGIN_WINDOW = float(os.environ.get('LOGIN_WINDOW', '900'))
+LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', '50'))
+LOGIN_MAX_FAILURES_PER_ACCOUNT = int(os.environ.get('LOGIN_MAX_FAILURES_PER_ACCOUNT', '10'))
+# token buckets for writes and Socket.IO events, per user, per board and per
+# socket: RATE actions a second after a burst of BURST; a RATE of 0 turns the
+# bucket off. With SHARED_CACHE_URL the user and board buckets are shared by
+# every worker.
+RATE_LIMIT_USER_RATE = float(os.environ.get('RATE_LIMIT_USER_RATE', '5'))
+RATE_LIMIT_USER_BURST = int(os.environ.get('RATE_LIMIT_USER_BURST', '30'))
+RATE_LIMIT_BOARD_RATE = float(os.environ.get('RATE_LIMIT_BOARD_RATE', '20'))
+RATE_LIMIT_BOARD_BURST = int(os.environ.get('RATE_LIMIT_BOARD_BURST', '60'))
+RATE_LIMIT_SOCKET_RATE = float(os.environ.get('RATE_LIMIT_SOCKET_RATE', '2'))
+RATE_LIMIT_SOCKET_BURST = int(os.environ.get('RATE_LIMIT_SOCKET_BURST', '10'))
+# writes (and socket events) doing DB work at once in each process; the rest
+# are turned away instead of queueing for a connection that reads need too
+# (0 = no cap)
+DB_WORK_CONCURRENCY = int(os.environ.get('DB_WORK_CONCURRENCY', str(max(DB_POOL_SIZE - 2, 1))))
+# memory for rendered board page fragments (header, members, task grid) in
+# each process; one fragment may use at most an eighth of it
+FRAGMENT_CACHE_BYTES = int(os.environ.get('FRAGMENT_CACHE_BYTES', str(32 * 1024 * 1024)))
+# most tasks one import may add
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '50000'))
+# a task_update carries at most this many rows; bigger changes (imports) tell
+# clients to fetch the delta from /api/board/<id>/tasks instead
+TASK_DELTA_INLINE_MAX = int(os.environ.get('TASK_DELTA_INLINE_MAX', '500'))
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '2000'))
+# the page queries in dal.py run as per-connection prepared statements; turn
+# this off behind PgBouncer in transaction mode (or anything else that
+# doesn't give a connection the same server session throughout)
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+# bearer token required by /metrics when set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+# Server-Timing breakdown on responses: off, header (only for requests
+# sending "X-Profile: 1") or always
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', 'off')
+
+db_pool = ConnectionPool(
+    maxconn=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, healthcheck_after=DB_POOL_HEALTHCHECK,
+    host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS, port=DB_PORT,
+    connection_factory=instrumentation.connection_factory(),   # times every statement
+)
+
+def _replica_address(entry):
+    host, _, port = entry.rpartition(':')
+    return (host, port) if host and port.isdigit() else (entry, DB_PORT)
+
+db_router = ReplicaRouter(
+    [Replica(f'{host}:{port}', ConnectionPool(
+        # a full replica pool sends the request to the next replica (or the
+        # primary) rather than holding it for the whole DB_POOL_TIMEOUT
+        maxconn=DB_REPLICA_POOL_SIZE, timeout=min(DB_POOL_TIMEOUT, 0.5),
+        healthcheck_after=DB_POOL_HEALTHCHECK, connect_timeout=DB_REPLICA_CONNECT_TIMEOUT,
+        host=host, database=DB_NAME, user=DB_USER, password=DB_PASS, port=port,
+        connection_factory=instrumentation.connection_factory(),
+     )) for host, port in map(_replica_address, DB_REPLICAS)],
+    max_lag=DB_REPLICA_MAX_LAG, check_interval=DB_REPLICA_CHECK_INTERVAL,
+)
+dal.PREPARED_STATEMENTS = DB_PREPARED_STATEMENTS
 
 def get_db_conn():
-    return psycopg2.connect(
-        host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS, port=DB_PORT
-    )
+    """Return this request's connection, borrowing it from the pool on first use.
+
+    The connection goes back to the pool in release_db_conn when the request
+    ends, so routes only close their cursors.
+
+    GET requests to views marked @replica_reads get a read replica's
+    connection instead, as long as one is healthy, within
+    DB_REPLICA_MAX_LAG and has replayed this session's last write;
+    otherwise they use the primary like everything else.
+    """
+    if g.get('replica_reads'):
+        if 'replica_conn' not in g:
+            start = time.perf_counter()
+            replica, conn = db_router.checkout(session.get('wal_lsn', 0))
+            if conn is None:
+                g.replica_reads = False
+                return get_db_conn()
+            instrumentation.observe_connect(time.perf_counter() - start)
+            g.replica, g.replica_conn = replica, conn
+        return g.replica_conn
+    if 'db_conn' not in g:
+        start = time.perf_counter()
+        g.db_conn = db_pool.getconn()
+        instrumentation.observe_connect(time.perf_counter() - start)
+    return g.db_conn
+
+def replica_reads(view):
+    """Let a read-only view's GET requests run on a read replica (see
+    get_db_conn). Put it below @board_access, so permissions are still
+    checked against the primary."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'GET' and db_router:
+            g.replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.teardown_appcontext
+def release_db_conn(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.putconn(conn)
+    conn = g.pop('replica_conn', None)
+    if conn is not None:
+        db_router.checkin(g.pop('replica'), conn)
+
+def notify_history(board_ids):
+    for board_id in board_ids:
+        socketio.emit('history_update', {'board_id': board_id}, room=f'board_{board_id}')
+
+# history rows are written in batches off the request path; one
+# history_update per board per batch, however many entries it held
+audit_writer = AuditWriter(
+    db_pool, notify=notify_history, spawn=socketio.start_background_task,
+    max_batch=int(os.environ.get('AUDIT_BATCH_SIZE', '500')),
+    flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', '0.5')),
+    max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', '10000')),
+)
+atexit.register(audit_writer.close)
+
+# partition upkeep, board archival and tombstone pruning, in the background
+# of whichever worker gets to it first; see archive.py
+maintenance = archive.Maintenance(
+    db_pool, interval=HISTORY_MAINTENANCE_INTERVAL, months_ahead=HISTORY_PARTITIONS_AHEAD,
+    retention_days=HISTORY_RETENTION_DAYS, archive_days=BOARD_ARCHIVE_DAYS,
+    tombstone_versions=TASK_TOMBSTONE_VERSIONS, spawn=socketio.start_background_task,
+)
+atexit.register(maintenance.close)
+
+# ---------- INSTRUMENTATION ----------
+@app.before_request
+def start_request_timing():
+    metrics.start_request()
+    maintenance.ensure_started()
+
+@app.after_request
+def record_request_timing(response):
+    timing = metrics.current()
+    if timing is not None:
+        instrumentation.observe_request(request.endpoint or 'unmatched', request.method,
+                                        response.status_code, timing)
+        if PROFILE_REQUESTS == 'always' or (PROFILE_REQUESTS == 'header'
+                                            and request.headers.get('X-Profile') == '1'):
+            response.headers['Server-Timing'] = timing.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_timing(exc):
+    metrics.end_request()
+
+@before_render_template.connect_via(app)
+def start_render_timing(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_render_timing(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        instrumentation.observe_render(template.name or 'string', time.perf_counter() - started)
+
+def _pool_gauges():
+    return {(k,): v for k, v in db_pool.stats().items()}
+
+def _cache_gauges():
+    return {(name, k): v for name, cache in (('role', role_cache), ('task_board', task_board_cache),
+                                             ('fragment', fragment_cache))
+            for k, v in cache.stats().items()}
+
+instrumentation.registry.gauge('nexusboard_db_pool', 'Connection pool state and lifetime counters.',
+                               ['stat'], _pool_gauges)
+instrumentation.registry.gauge('nexusboard_db_replica', 'Read replica state, routed reads and pool counters '
+                               '(replica="primary": read-only requests no replica could take).',
+                               ['replica', 'stat'],
+                               lambda: {**{(name, k): v for name, stats in db_router.stats().items()
+                                           for k, v in stats.items()},
+                                        ('primary', 'reads'): db_router.primary_reads})
+instrumentation.registry.gauge('nexusboard_audit_writer', 'Background history writer counters.',
+                               ['stat'], lambda: {(k,): v for k, v in audit_writer.stats().items()})
+instrumentation.registry.gauge('nexusboard_history_maintenance', 'History partition and board archival counters.',
+                               ['stat'], lambda: {(k,): v for k, v in maintenance.stats().items()})
+instrumentation.registry.gauge('nexusboard_cache', 'In-process cache sizes and hit counts.',
+                               ['cache', 'stat'], _cache_gauges)
+instrumentation.registry.gauge('nexusboard_auth', 'Password hash pool and login throttle counters.',
+                               ['stat'], lambda: {(k,): v for k, v in {**password_hasher.stats(),
+                                                                       **login_throttle.stats()}.items()})
+
+def _admission_gauges():
+    values = {(scope, k): v for scope, buckets in rate_limits.items() if buckets is not None
+              for k, v in buckets.stats().items()}
+    values.update({('db_work', k): v for k, v in db_work_slots.stats().items()})
+    return values
+
+instrumentation.registry.gauge('nexusboard_admission', 'Token bucket (user, board, socket) and DB work slot '
+                               'counters for writes and socket events.', ['scope', 'stat'], _admission_gauges)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return "Unauthorized", 401
+    return instrumentation.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.errorhandler(PoolTimeout)
+def db_pool_exhausted(e):
+    app.logger.warning('DB pool exhausted: %s', db_pool.stats())
+    return "Server busy, please retry", 503
+
+# password hashes run on native threads, never on the worker's event loop
+password_hasher = PasswordHasher(
+    method=PASSWORD_HASH_METHOD,
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2')),
+    max_pending=int(os.environ.get('PASSWORD_HASH_QUEUE', '32')),
+    async_mode=socketio.async_mode,
+)
+login_throttle = LoginThrottle(
+    window=LOGIN_WINDOW, max_per_ip=LOGIN_MAX_FAILURES_PER_IP,
+    max_per_account=LOGIN_MAX_FAILURES_PER_ACCOUNT,
+)
+
+@app.errorhandler(HashPoolBusy)
+def password_hasher_busy(e):
+    app.logger.warning('password hash pool full: %s', password_hasher.stats())
+    return "Server busy, please retry", 503, {'Retry-After': '1'}
+
+# ---------- ADMISSION CONTROL ----------
+# Writes and socket events draw a token from their user's and board's (or
+# socket's) bucket, then take one of DB_WORK_CONCURRENCY slots while they run.
+# A client stuck in a loop, or one user hammering a board, is turned away
+# before it reaches the database or fans out to a whole room.
+def _token_buckets(scope, rate, burst, shared=True):
+    if not rate:
+        return None
+    if shared and SHARED_CACHE_URL:
+        return RedisTokenBuckets(SHARED_CACHE_URL, rate, burst, prefix=f'nexusboard:bucket:{scope}:')
+    return TokenBuckets(rate, burst)
+
+rate_limits = {
+    'user': _token_buckets('user', RATE_LIMIT_USER_RATE, RATE_LIMIT_USER_BURST),
+    'board': _token_buckets('board', RATE_LIMIT_BOARD_RATE, RATE_LIMIT_BOARD_BURST),
+    # a socket lives on one worker, so its bucket can too
+    'socket': _token_buckets('socket', RATE_LIMIT_SOCKET_RATE, RATE_LIMIT_SOCKET_BURST, shared=False),
+}
+db_work_slots = ConcurrencyLimit(DB_WORK_CONCURRENCY)
+
+def admission_wait(keys, slot=True):
+    """Take a token from each (scope, key) bucket, then (with `slot`) a DB
+    work slot. Returns 0 once all of them are held (the caller releases the
+    slot), else the seconds until it is worth trying again. A request turned
+    away holds nothing: tokens already taken from the other buckets are
+    handed back."""
+    taken, wait = [], 0.0
+    for scope, key in keys:
+        buckets = rate_limits[scope]
+        if buckets is not None and key is not None:
+            wait = buckets.take(key)
+            if wait:
+                break
+            taken.append((buckets, key))
+    if not wait and slot and not db_work_slots.acquire():
+        wait = 1.0
+    if wait:
+        for buckets, key in taken:
+            buckets.refund(key)
+    return wait
+
+def admission(api=False, methods=('POST',), hold_slot=True):
+    """Route decorator for writes: admit the request past the user's and
+    the board's token buckets and a DB work slot (held until the view
+    returns). Put it below @board_access; routes without a board only use
+    the user's bucket. Only `methods` are limited, so a view's GET form
+    stays free. Views that spend most of their time elsewhere (reading an
+    upload) pass hold_slot=False and take the slot around their DB work.
+
+    Turned away requests get a 429 with Retry-After; page routes flash and
+    redirect back to the board instead, marked with an X-RateLimited header
+    (and Retry-After) so scripts and the benchmark can tell.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = session.get('user')
+            if request.method not in methods or not user:
+                return view(*args, **kwargs)
+            wait = admission_wait((('user', user['id']), ('board', g.get('board_id'))), slot=hold_slot)
+            if wait:
+                retry_after = str(int(wait) + 1)
+                if api:
+                    return "Too many requests, please slow down", 429, {'Retry-After': retry_after}
+                flash('Too many changes at once. Please wait a moment and try again.', 'error')
+                board_id = g.get('board_id')
+                resp = redirect(url_for('board_view', board_id=board_id) if board_id else url_for('dashboard'))
+                resp.headers['Retry-After'] = retry_after
+                resp.headers['X-RateLimited'] = '1'
+                return resp
+            try:
+                return view(*args, **kwargs)
+            finally:
+                if hold_slot:
+                    db_work_slots.release()
+        return wrapper
+    return decorator
+
+def socket_admission(event):
+    """Socket.IO handler decorator: the socket's and the user's buckets,
+    and a DB work slot, as for @admission. A turned away event is deferred
+    rather than lost: the client gets rate_limited {event, retry_after} and
+    sends it again after that many seconds."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args):
+            user = session.get('user')
+            wait = admission_wait((('socket', request.sid), ('user', user and user['id'])))
+            if wait:
+                emit('rate_limited', {'event': event, 'retry_after': round(wait, 2)})
+                return None
+            try:
+                return handler(*args)
+            finally:
+                db_work_slots.release()
+        return wrapper
+    return decorator
 
 def gen_code():
     return 'NXB' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
 
 def log_action(board_id, user_id, action):
-    conn = get_db_conn()
-    cur = conn.cursor()
+    """Stage a history entry for this request. It reaches the audit writer
+    only if the request's transaction commits through commit_db(), but
+    keeps the time it was logged at."""
+    g.setdefault('pending_history', []).append((board_id, user_id, action, datetime.now(timezone.utc)))
+
+def commit_db(conn):
+    """Commit the request's transaction, then release its staged history.
+
+    With read replicas, the session also remembers where the primary's WAL
+    got to, so its next reads (the page a mutation redirects to) only go to a
+    replica that has replayed the commit.
+    """
+    conn.commit()
+    if db_router and has_request_context():
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT pg_current_wal_insert_lsn()::text")
+            session['wal_lsn'] = parse_lsn(cur.fetchone()[0])
+        finally:
+            cur.close()
+    for entry in g.pop('pending_history', []):
+        audit_writer.submit(*entry, conn=conn)
+
+# ---------- BOARD AUTHORIZATION ----------
+role_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)   # (user_id, board_id) -> (role, version)
+task_board_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=3600)      # task_id -> board_id (never changes)
+ROLE_RANK = {'member': 1, 'owner': 2}
+# each board's membership version; a cached role read under an older one is
+# stale. Shared by every worker with SHARED_CACHE_URL; without it only this
+# worker's invalidations count, which is only safe with a single worker
+membership_versions = (RedisVersionClock(SHARED_CACHE_URL, prefix='nexusboard:membership:')
+                       if SHARED_CACHE_URL else None)
+ROLE_CACHE_ENABLED = bool(SHARED_CACHE_URL or not SOCKETIO_MESSAGE_QUEUE)
+ROLE_SQL = """
+    SELECT b.owner_id = %s,
+           EXISTS (SELECT 1 FROM user_boards ub WHERE ub.board_id = b.id AND ub.user_id = %s)
+    FROM boards b WHERE b.id = %s
+"""
+
+def board_role(user_id, board_id):
+    """'owner', 'member' or None (not a member / no such board)."""
+    if not ROLE_CACHE_ENABLED:
+        return query_board_role(user_id, board_id)
+    key = (user_id, board_id)
+    # read the version before the role, so a change landing in between
+    # leaves this entry already stale
+    version = membership_versions.token(board_id) if membership_versions else None
+    cached = role_cache.get(key, MISSING)
+    if cached is not MISSING and cached[1] == version:
+        return cached[0]
+    role = query_board_role(user_id, board_id)
+    role_cache.set(key, (role, version))
+    return role
+
+def query_board_role(user_id, board_id):
+    cur = get_db_conn().cursor()
     try:
-        cur.execute("INSERT INTO history (board_id, user_id, action) VALUES (%s, %s, %s)",
-                    (board_id, user_id, action))
-        conn.commit()
-        socketio.emit('history_update', {'board_id': board_id}, room=f'board_{board_id}')
+        cur.execute(ROLE_SQL, (user_id, user_id, board_id))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    role = None
+    if row and row[0]:
+        role = 'owner'
+    elif row and row[1]:
+        role = 'member'
+    return role
 
-    except Exception:
-        conn.rollback()
+def invalidate_board_role(board_id, user_id=None):
+    """Forget cached roles for one member of a board, or for all of them.
+    Other workers drop theirs (all of the board's) through the board's
+    membership version."""
+    if membership_versions:
+        membership_versions.bump([board_id])
+    if user_id is not None:
+        role_cache.discard((user_id, board_id))
+    else:
+        role_cache.discard_where(lambda key: key[1] == board_id)
+
+def task_board(task_id):
+    board_id = task_board_cache.get(task_id)
+    if board_id is None:
+        cur = get_db_conn().cursor()
+        try:
+            cur.execute("SELECT board_id FROM tasks WHERE id=%s", (task_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+        if not row:
+            return None
+        board_id = row[0]
+        task_board_cache.set(task_id, board_id)
+    return board_id
+
+def history_board(log_id):
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("SELECT board_id FROM history WHERE id=%s", (log_id,))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    return row[0] if row else None
+
+def board_access(role='member', resolve=None, api=False, denied='Not authorized'):
+    """Route decorator: require a logged-in user holding at least `role` on the
+    board. The board comes from the route's board_id argument, or from
+    resolve(**view_args) for routes keyed by a task or history id. Sets
+    g.board_id and g.board_role for the view.
+
+    Page routes flash and redirect on failure; api=True routes get a JSON
+    error with 403/404 instead.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not session.get('user'):
+                return (jsonify(error='Unauthorized'), 403) if api else redirect(url_for('login'))
+            board_id = resolve(**kwargs) if resolve else kwargs['board_id']
+            if board_id is None:
+                if api:
+                    return jsonify(error='Not found'), 404
+                flash('Not found', 'error'); return redirect(url_for('dashboard'))
+            current = board_role(session['user']['id'], board_id)
+            if current is None:
+                if api:
+                    return jsonify(error='Not a member of this board'), 403
+                flash('You are not a member of this board', 'error'); return redirect(url_for('dashboard'))
+            if ROLE_RANK[current] < ROLE_RANK[role]:
+                if api:
+                    return jsonify(error=denied), 403
+                flash(denied, 'error'); return redirect(url_for('board_view', board_id=board_id))
+            g.board_id, g.board_role = board_id, current
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ---------- TASK DELTAS ----------
+# Every task mutation bumps boards.task_seq and stamps the touched rows with it
+# (deletes leave a tombstone in task_deletions), so clients can ask for
+# "everything after version N" instead of re-rendering the whole board.
+def bump_task_seq(board_id):
+    """Take the board's next task version. The row lock on boards is held until
+    commit, so versions on a board are handed out in commit order."""
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("UPDATE boards SET task_seq = task_seq + 1 WHERE id=%s RETURNING task_seq", (board_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+
+def bump_meta_seq(board_id):
+    """Move the board's details/membership version (see BOARD_FRAGMENTS)."""
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("UPDATE boards SET meta_seq = meta_seq + 1 WHERE id=%s", (board_id,))
     finally:
         cur.close()
-        conn.close()
+
+def row_json(row):
+    if hasattr(row, '_asdict'):
+        row = row._asdict()
+    return {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()}
+
+def task_delta(board_id, since):
+    """(changed task rows, deleted task ids) on a board after version `since`."""
+    cur = get_db_conn().cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(f"""
+            SELECT {dal.TASK_COLUMNS}, u.username AS assigned_name
+            FROM tasks t
+            LEFT JOIN users u ON t.assigned_to = u.id
+            WHERE t.board_id=%s AND t.version > %s
+            ORDER BY t.position ASC, t.id ASC
+        """, (board_id, since))
+        tasks = [row_json(r) for r in cur.fetchall()]
+        deleted = []
+        if since:
+            cur.execute("SELECT task_id FROM task_deletions WHERE board_id=%s AND version > %s",
+                        (board_id, since))
+            deleted = [r['task_id'] for r in cur.fetchall()]
+    finally:
+        cur.close()
+    return tasks, deleted
+
+def emit_task_delta(board_id, seq, tasks, deleted=(), resync=False):
+    """resync=True sends no rows and has clients fetch everything after
+    their current version instead."""
+    data = {'board_id': board_id, 'seq': seq, 'tasks': tasks, 'deleted': list(deleted)}
+    if resync:
+        data['resync'] = True
+    socketio.emit('task_update', data, room=f'board_{board_id}')
+
+# ---------- DASHBOARD UPDATES ----------
+# Every socket joins its user's room on connect, and board_update goes only to
+# the users whose dashboard lists the board, carrying the board row:
+# {'action': 'added' | 'updated' | 'removed', 'board': {...}}.
+# The same call bumps those users' dashboard versions, which the dashboard
+# route serves as its ETag.
+dashboard_versions = (RedisVersionClock(SHARED_CACHE_URL, prefix='nexusboard:dashboard:')
+                      if SHARED_CACHE_URL else VersionClock())
+
+def user_room(user_id):
+    return f'user_{user_id}'
+
+def dashboard_board(board_id):
+    """The board as the dashboard shows it, or None if it's gone."""
+    row = dal.dashboard_board(get_db_conn(), board_id)
+    return row_json(row) if row else None
+
+def board_audience(board_id):
+    """Ids of the owner and members of a board."""
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("""
+            SELECT user_id FROM user_boards WHERE board_id=%s
+            UNION SELECT owner_id FROM boards WHERE id=%s
+        """, (board_id, board_id))
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        cur.close()
+
+def emit_board_update(action, board, user_ids):
+    if board and user_ids:
+        dashboard_versions.bump(user_ids)
+        socketio.emit('board_update', {'action': action, 'board': board},
+                      room=[user_room(uid) for uid in user_ids])
+
+def refresh_dashboards(board_id, exclude=()):
+    """Push a board's fresh row (counts included) to everyone listing it."""
+    emit_board_update('updated', dashboard_board(board_id),
+                      [uid for uid in board_audience(board_id) if uid not in exclude])
 
 # ---------- AUTH ----------
 @app.route('/')
@@ -58,20 +674,27 @@ def register():
         if not username or not email or not password:
             flash('All fields required', 'error')
             return render_template('auth.html', mode='register')
-        hashed = generate_password_hash(password)
+        # every registration costs a hash, so it counts against the IP's budget
+        ip = request.remote_addr
+        wait = login_throttle.retry_after(ip, None)
+        if wait:
+            flash(f'Too many attempts. Try again in {int(wait) + 1} seconds.', 'error')
+            return render_template('auth.html', mode='register'), 429, {'Retry-After': str(int(wait) + 1)}
+        login_throttle.failed(ip, None)
+        hashed = password_hasher.hash(password)
         conn = get_db_conn()
         cur = conn.cursor()
         try:
             cur.execute("INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
                         (username, email, hashed))
-            conn.commit()
+            commit_db(conn)
             flash('Registration successful. Please login.', 'success')
             return redirect(url_for('login'))
         except Exception as e:
             conn.rollback()
             flash('Registration error: ' + str(e), 'error')
         finally:
-            cur.close(); conn.close()
+            cur.close()
     return render_template('auth.html', mode='register')
 
 
@@ -80,20 +703,38 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email','').strip().lower()
         password = request.form.get('password','')
+        ip = request.remote_addr
+        # throttled attempts are turned away before they cost a hash
+        wait = login_throttle.retry_after(ip, email)
+        if wait:
+            flash(f'Too many failed logins. Try again in {int(wait) + 1} seconds.', 'error')
+            return render_template('auth.html', mode='login'), 429, {'Retry-After': str(int(wait) + 1)}
         conn = get_db_conn()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         try:
             cur.execute("SELECT id, username, email, password_hash FROM users WHERE email=%s", (email,))
             user = cur.fetchone()
-            if user and check_password_hash(user['password_hash'], password):
+            # unknown emails are checked against a dummy hash so they take as long
+            ok = password_hasher.verify(user['password_hash'] if user else None, password)
+            if user and ok:
+                login_throttle.succeeded(email)
+                if password_hasher.needs_rehash(user['password_hash']):
+                    # the hashing parameters changed since this one was stored
+                    cur.execute("UPDATE users SET password_hash=%s WHERE id=%s AND password_hash=%s",
+                                (password_hasher.hash(password), user['id'], user['password_hash']))
+                    commit_db(conn)
                 session['user'] = {'id': user['id'], 'username': user['username']}
                 return redirect(url_for('dashboard'))
             else:
+                login_throttle.failed(ip, email)
                 flash('Invalid credentials', 'error')
+        except HashPoolBusy:
+            raise
         except Exception as e:
+            conn.rollback()
             flash('Login error: ' + str(e), 'error')
         finally:
-            cur.close(); conn.close()
+            cur.close()
     return render_template('auth.html', mode='login')
 
 
@@ -105,31 +746,32 @@ def logout():
 
 # ---------- DASHBOARD ----------
 @app.route('/dashboard')
+@replica_reads
 def dashboard():
     if not session.get('user'):
         return redirect(url_for('login'))
     user_id = session['user']['id']
-    conn = get_db_conn(); cur = conn.cursor(cursor_factory=RealDictCursor)
-    try:
-        # Boards user owns
-        cur.execute("SELECT * FROM boards WHERE owner_id=%s ORDER BY created_at DESC", (user_id,))
-        owned = cur.fetchall()
-        # Boards user joined (exclude ones they own to avoid duplication)
-        cur.execute("""
-            SELECT b.*, u.username AS owner_name
-            FROM boards b
-            JOIN users u ON b.owner_id = u.id
-            JOIN user_boards ub ON ub.board_id = b.id
-            WHERE ub.user_id = %s AND b.owner_id != %s
-            ORDER BY b.created_at DESC
-        """, (user_id, user_id))
-        joined = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
-    return render_template('dashboard.html', user=session['user'], owned_boards=owned, joined_boards=joined)
+    # read the version before the boards: a change landing in between only
+    # costs the next request a full render, never a stale 304
+    etag = f"{user_id}-{dashboard_versions.token(user_id)}"
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        boards = dal.dashboard_boards(get_db_conn(), user_id)
+        owned = [b for b in boards if b.owner_id == user_id]
+        joined = [b for b in boards if b.owner_id != user_id]
+        resp = make_response(render_template('dashboard.html', user=session['user'],
+                                             owned_boards=owned, joined_boards=joined))
+    # a lagging replica may not have the change behind the current version
+    # yet, so only a render from the primary may stand for it
+    if 'replica_conn' not in g:
+        resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
 
 # ---------- CREATE BOARD ----------
 @app.route('/add_board', methods=['POST'])
+@admission()
 def add_board():
     if not session.get('user'):
         return redirect(url_for('login'))
@@ -143,20 +785,24 @@ def add_board():
     try:
         cur.execute("INSERT INTO boards (name, description, board_code, owner_id) VALUES (%s,%s,%s,%s)",
                     (name, description, code, owner_id))
-        conn.commit()
+        commit_db(conn)
         # auto add owner as member too (optional, but helpful)
-        cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s, currval('boards_id_seq'))", (owner_id,))
-        conn.commit()
+        cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s, currval('boards_id_seq')) RETURNING board_id", (owner_id,))
+        board_id = cur.fetchone()[0]
+        invalidate_board_role(board_id, owner_id)
+        commit_db(conn)
         flash(f'Board created. Code: {code}', 'success')
-        socketio.emit('board_update')
+        # the creator's other tabs; nobody else can see the board yet
+        emit_board_update('added', dashboard_board(board_id), [owner_id])
     except Exception as e:
         conn.rollback(); flash('Create board error: ' + str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('dashboard'))
 
 # ---------- JOIN BOARD ----------
 @app.route('/join_board', methods=['POST'])
+@admission()
 def join_board():
     if not session.get('user'):
         return redirect(url_for('login'))
@@ -172,81 +818,205 @@ def join_board():
             flash('Invalid board code', 'error')
         else:
             board_id = row[0]
-            # check existing
-            cur.execute("SELECT id FROM user_boards WHERE user_id=%s AND board_id=%s", (user_id, board_id))
-            if cur.fetchone():
+            cur.execute("""
+                INSERT INTO user_boards (user_id, board_id) VALUES (%s,%s)
+                ON CONFLICT (user_id, board_id) DO NOTHING
+            """, (user_id, board_id))
+            if cur.rowcount == 0:
                 flash('Already joined', 'info')
             else:
-                cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s,%s)", (user_id, board_id))
-                conn.commit()
+                bump_meta_seq(board_id)
+                commit_db(conn)
+                invalidate_board_role(board_id, user_id)
                 flash('Joined board', 'success')
+                emit_board_update('added', dashboard_board(board_id), [user_id])
+                refresh_dashboards(board_id, exclude=[user_id])
     except Exception as e:
         conn.rollback(); flash('Join error: ' + str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('dashboard'))
 
 # ---------- OPEN BOARD VIEW ----------
+# The board page is assembled from fragments cached under the board version
+# they were rendered from: task_seq for the task grid (and the task state the
+# client starts from), meta_seq for the header and member list. Mutations
+# bump those versions, so stale entries are never served, just left to age
+# out of the LRU. Filtered and searched views render their grid uncached.
+BOARD_FRAGMENTS = ('header', 'members', 'tasks', 'task_state')
+fragment_cache = FragmentCache(max_bytes=FRAGMENT_CACHE_BYTES)
+
+def _fragment_templates_digest():
+    digest = hashlib.sha1()
+    for name in ('board_header.html', 'board_members.html', 'board_tasks.html'):
+        with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+# part of every fragment ETag, so a deploy that changes the markup doesn't
+# 304 browsers onto the old one; the same in every worker
+FRAGMENT_ETAG_PREFIX = _fragment_templates_digest()
+
+def fragment_key(name, board, is_owner):
+    if name in ('tasks', 'task_state'):
+        return (name, board.id, board.task_seq)
+    if name == 'members':
+        return (name, board.id, board.meta_seq, is_owner)   # owners get the invite/remove controls
+    return (name, board.id, board.meta_seq)
+
+def render_fragment(name, board, is_owner, members=None, tasks=None):
+    if name == 'header':
+        return render_template('board_header.html', board=board)
+    if name == 'members':
+        return render_template('board_members.html', board=board, members=members, is_owner=is_owner)
+    if name == 'tasks':
+        return render_template('board_tasks.html', tasks=tasks)
+    # what the template's |tojson would produce
+    return str(htmlsafe_json_dumps([row_json(t) for t in tasks], dumps=app.json.dumps))
+
+# boards whose opening this process recorded lately (last_opened_at is what
+# keeps a board from being archived, so hourly is plenty)
+board_opened = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=3600)
+
+def mark_board_opened(board_id):
+    """Record that the board was opened, restoring its tasks and history
+    first if it was archived. Both are writes, so the rest of the request
+    runs on the primary."""
+    g.replica_reads = False
+    conn = get_db_conn(); cur = conn.cursor()
+    try:
+        cur.execute("UPDATE boards SET last_opened_at = CURRENT_TIMESTAMP WHERE id = %s "
+                    "RETURNING archived_at IS NOT NULL", (board_id,))
+        row = cur.fetchone()
+        restored = archive.restore_board(conn, board_id) if row and row[0] else None
+        commit_db(conn)
+    finally:
+        cur.close()
+    board_opened.set(board_id, True)
+    if restored:
+        app.logger.info('restored archived board %s: %d tasks, %d history entries', board_id, *restored)
+        refresh_dashboards(board_id)   # no longer archived
+
+def board_fragments(conn, board, is_owner, names=BOARD_FRAGMENTS, members=None):
+    """{name: Markup} for the requested fragments, rendering (and caching)
+    only the ones whose version isn't cached yet. Rows are loaded once, and
+    only if something they feed missed."""
+    out = {}
+    tasks = None
+    for name in names:
+        key = fragment_key(name, board, is_owner)
+        html = fragment_cache.get(key)
+        if html is None:
+            if name == 'members' and members is None:
+                members = dal.board_members(conn, board.id)
+            if name in ('tasks', 'task_state') and tasks is None:
+                tasks = dal.board_tasks(conn, board.id)
+            html = render_fragment(name, board, is_owner, members, tasks)
+            fragment_cache.set(key, html)
+        out[name] = Markup(html)
+    return out
+
 @app.route('/board/<int:board_id>')
+@board_access()
+@replica_reads
 def board_view(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
-    user_id = session['user']['id']
-    search = request.args.get('search', '').strip().lower()
+    search = request.args.get('search', '').strip()
     filter_user = request.args.get('filter', '')
+    is_owner = g.board_role == 'owner'
 
-    conn = get_db_conn(); cur = conn.cursor(cursor_factory=RealDictCursor)
-    try:
-        cur.execute("SELECT b.*, u.username AS owner_name FROM boards b JOIN users u ON b.owner_id=u.id WHERE b.id=%s", (board_id,))
-        board = cur.fetchone()
-        if not board:
-            flash('Board not found', 'error'); return redirect(url_for('dashboard'))
+    # the board row carries the versions the fragments are keyed on; read
+    # it first, so a write racing this request can only make them newer
+    board = dal.board(get_db_conn(), board_id)
+    if not board:
+        flash('Board not found', 'error'); return redirect(url_for('dashboard'))
+    if board.archived_at or board_opened.get(board_id) is None:
+        mark_board_opened(board_id)
+        board = dal.board(get_db_conn(), board_id)
+    conn = get_db_conn()
+    # the filter and task form selects need the members either way
+    members = dal.board_members(conn, board_id)
+    if search or filter_user:
+        fragments = board_fragments(conn, board, is_owner, ('header', 'members'), members)
+        tasks = dal.board_tasks(conn, board_id, search, filter_user)
+        fragments.update({name: Markup(render_fragment(name, board, is_owner, tasks=tasks))
+                          for name in ('tasks', 'task_state')})
+    else:
+        fragments = board_fragments(conn, board, is_owner, members=members)
 
-        cur.execute("SELECT 1 FROM user_boards WHERE board_id=%s AND user_id=%s", (board_id, user_id))
-        if not cur.fetchone():
-            flash('You are not a member of this board', 'error'); return redirect(url_for('dashboard'))
+    return render_template('board.html', board=board, members=members, fragments=fragments,
+                           has_tasks=fragments['task_state'] != '[]',
+                           user=session['user'], search=search, filter_user=filter_user)
 
-        # members
-        cur.execute("""
-            SELECT u.id, u.username
-            FROM users u
-            JOIN user_boards ub ON ub.user_id = u.id
-            WHERE ub.board_id = %s
-            ORDER BY u.username
-        """, (board_id,))
-        members = cur.fetchall()
+@app.route('/restore_board/<int:board_id>', methods=['POST'])
+@board_access()
+@admission()
+def restore_board(board_id):
+    """Bring an archived board's tasks back (the dashboard and My Tasks
+    offer this for the boards they can't list tasks from), then go back."""
+    mark_board_opened(board_id)
+    return redirect(request.referrer or url_for('dashboard'))
 
-        # tasks with optional search/filter
-        query = """
-            SELECT t.*, u.username AS assigned_name
-            FROM tasks t
-            LEFT JOIN users u ON t.assigned_to = u.id
-            WHERE t.board_id=%s
-        """
-        params = [board_id]
-
-        if search:
-            query += " AND LOWER(t.name) LIKE %s"
-            params.append(f"%{search}%")
-        if filter_user:
-            query += " AND t.assigned_to=%s"
-            params.append(filter_user)
-
-        query += " ORDER BY t.position ASC"
-        cur.execute(query, tuple(params))
-        tasks = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
+@app.route('/board/<int:board_id>/fragment/<name>')
+@board_access(api=True)
+def board_fragment_view(board_id, name):
+    """One cached piece of the board page (header, members or tasks), for
+    clients refreshing a single panel. The ETag is the fragment's version."""
+    if name not in ('header', 'members', 'tasks'):
+        return jsonify(error='Unknown fragment'), 404
+    is_owner = g.board_role == 'owner'
+    conn = get_db_conn()
+    board = dal.board(conn, board_id)
+    if not board:
+        return jsonify(error='Not found'), 404
+    if board.archived_at:
+        # a page left open since before the board was archived
+        mark_board_opened(board_id)
+        board = dal.board(conn, board_id)
+    etag = '-'.join(str(part) for part in (FRAGMENT_ETAG_PREFIX,) + fragment_key(name, board, is_owner))
+    if request.if_none_match.contains(etag):
+        resp = make_response('', 304)
+    else:
+        resp = make_response(board_fragments(conn, board, is_owner, (name,))[name])
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    if name == 'tasks':
+        resp.headers['X-Board-Seq'] = str(board.task_seq)
+    return resp
 
-    return render_template('board.html', board=board, members=members, tasks=tasks,
-                           user=session['user'], search=search, filter_user=filter_user)
+@app.route('/api/board/<int:board_id>/tasks')
+@board_access(api=True)
+def board_tasks_api(board_id):
+    """Task rows changed since ?since=<seq> (all tasks when omitted), plus the
+    ids deleted since then, for clients patching the board in place. When
+    the tombstones after `since` have been pruned, every task comes back
+    with full=true and clients drop the cards that aren't in it."""
+    since = request.args.get('since', 0, type=int)
+    conn = get_db_conn(); cur = conn.cursor()
+    try:
+        cur.execute("SELECT task_seq FROM boards WHERE id = %s", (board_id,))
+        row = cur.fetchone()
+        if not row:
+            return jsonify(error='Not found'), 404
+        # read the sequence before the rows: a write racing this request shows up
+        # here and again in its own event, which clients apply idempotently
+        seq = row[0]
+        tasks, deleted = task_delta(board_id, since)
+        if since:
+            # read after the tombstones, so a prune that committed meanwhile shows here
+            cur.execute("SELECT tombstone_seq FROM boards WHERE id = %s", (board_id,))
+            if since < (cur.fetchone() or (0,))[0]:
+                tasks, _ = task_delta(board_id, 0)
+                return jsonify(board_id=board_id, seq=seq, tasks=tasks, deleted=[], full=True)
+    finally:
+        cur.close()
+    return jsonify(board_id=board_id, seq=seq, tasks=tasks, deleted=deleted)
 
 
 # ---------- ADD TASK ----------
 @app.route('/add_task/<int:board_id>', methods=['POST'])
+@board_access()
+@admission()
 def add_task(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
     name = request.form.get('name','').strip()
     description = request.form.get('description','').strip()
     assigned_to = request.form.get('assigned_to') or None
@@ -264,25 +1034,36 @@ def add_task(board_id):
     conn = get_db_conn(); cur = conn.cursor()
     try:
         progress_percent = int(request.form.get('progress_percent', 0))
+        seq = bump_task_seq(board_id)
+        if seq is None:
+            flash('Board not found', 'error'); return redirect(url_for('dashboard'))
+        # new cards go on top, where the old position DEFAULT 0 put them
         cur.execute(
-            "INSERT INTO tasks (name, description, board_id, assigned_to, comments, due_date, progress_percent) VALUES (%s,%s,%s,%s,%s,%s,%s)",
-            (name, description, board_id, assigned_to, comments, dt_due, progress_percent)
+            """INSERT INTO tasks (name, description, board_id, assigned_to, comments, due_date, progress_percent, version, position)
+               VALUES (%s,%s,%s,%s,%s,%s,%s,%s,
+                       (SELECT COALESCE(MIN(position), %s) - %s FROM tasks WHERE board_id=%s))""",
+            (name, description, board_id, assigned_to, comments, dt_due, progress_percent, seq,
+             POSITION_STEP, POSITION_STEP, board_id)
         )
         log_action(board_id, session['user']['id'], f"Created task '{name}'")
-        conn.commit(); flash('Task added', 'success')
-        socketio.emit('task_update', {'board_id': board_id}, room=f'board_{board_id}')
+        changed, _ = task_delta(board_id, seq - 1)
+        commit_db(conn); flash('Task added', 'success')
+        emit_task_delta(board_id, seq, changed)
+        refresh_dashboards(board_id)   # task count
     except Exception as e:
         conn.rollback(); flash('Add task error: ' + str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('board_view', board_id=board_id))
 
 # ---------- EDIT TASK ----------
 @app.route('/edit_task/<int:task_id>', methods=['GET', 'POST'])
+@board_access(resolve=task_board)
+@admission()
+@replica_reads
 def edit_task(task_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
-    conn = get_db_conn(); cur = conn.cursor(cursor_factory=RealDictCursor)
+    board_id = g.board_id
+    conn = get_db_conn(); cur = conn.cursor()
     try:
         if request.method == 'POST':
             name = request.form.get('name').strip()
@@ -298,184 +1079,281 @@ def edit_task(task_id):
                 except:
                     flash('Invalid due date', 'error')
                     return redirect(request.referrer)
-            cur.execute("SELECT board_id FROM tasks WHERE id=%s", (task_id,))
-            task_row = cur.fetchone()
-            if not task_row:
-                flash('Task not found', 'error'); return redirect(url_for('dashboard'))
-            board_id = task_row['board_id']
-            # check membership
-            user_id = session['user']['id']
-            cur.execute("SELECT 1 FROM user_boards WHERE user_id=%s AND board_id=%s", (user_id, board_id))
-            if not cur.fetchone():
-                flash('Not authorized', 'error'); return redirect(url_for('dashboard'))
+            seq = bump_task_seq(board_id)
             cur.execute("""
                 UPDATE tasks
-                SET name=%s, description=%s, assigned_to=%s, comments=%s, due_date=%s, progress_percent=%s
+                SET name=%s, description=%s, assigned_to=%s, comments=%s, due_date=%s, progress_percent=%s, version=%s
                 WHERE id=%s
-            """, (name, description, assigned_to, comments, dt_due, progress_percent, task_id))
-            conn.commit()
+            """, (name, description, assigned_to, comments, dt_due, progress_percent, seq, task_id))
+            if cur.rowcount == 0:
+                conn.rollback()
+                flash('Task not found', 'error'); return redirect(url_for('board_view', board_id=board_id))
             log_action(board_id, session['user']['id'], f"Edited task '{name}'")
+            changed, _ = task_delta(board_id, seq - 1)
+            commit_db(conn)
             flash('Task updated', 'success')
-            socketio.emit('task_update', {'board_id': board_id}, room=f'board_{board_id}')
+            emit_task_delta(board_id, seq, changed)
             return redirect(url_for('board_view', board_id=board_id))
         # GET: show form
-        cur.execute("SELECT * FROM tasks WHERE id=%s", (task_id,))
-        task = cur.fetchone()
+        task = dal.task(conn, task_id)
         if not task:
             flash('Task not found', 'error'); return redirect(url_for('dashboard'))
-        board_id = task['board_id']
         # load members for select
-        cur.execute("""
-            SELECT u.id, u.username
-            FROM users u
-            JOIN user_boards ub ON ub.user_id = u.id
-            WHERE ub.board_id = %s
-            ORDER BY u.username
-        """, (board_id,))
-        members = cur.fetchall()
+        members = dal.board_members(conn, board_id)
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return render_template('edit_task.html', task=task, members=members)
 
 # ---------- DELETE TASK ----------
 @app.route('/delete_task/<int:task_id>')
+@board_access(resolve=task_board)
+@admission(methods=('GET',))
 def delete_task(task_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
+    board_id = g.board_id
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        cur.execute("SELECT board_id FROM tasks WHERE id=%s", (task_id,))
-        row = cur.fetchone()
-        if not row:
-            flash('Task not found', 'error'); return redirect(url_for('dashboard'))
-        board_id = row[0]
-        # verify membership
-        user_id = session['user']['id']
-        cur.execute("SELECT 1 FROM user_boards WHERE user_id=%s AND board_id=%s", (user_id, board_id))
-        if not cur.fetchone():
-            flash('Not authorized', 'error'); return redirect(url_for('dashboard'))
+        seq = bump_task_seq(board_id)
         cur.execute("DELETE FROM tasks WHERE id=%s", (task_id,))
+        if cur.rowcount == 0:
+            conn.rollback()
+            flash('Task not found', 'error'); return redirect(url_for('board_view', board_id=board_id))
+        task_board_cache.discard(task_id)
+        cur.execute("INSERT INTO task_deletions (board_id, task_id, version) VALUES (%s,%s,%s)",
+                    (board_id, task_id, seq))
         log_action(board_id, session['user']['id'], f"Deleted a task (ID {task_id})")
-        conn.commit(); flash('Task deleted', 'success')
-        socketio.emit('task_update', {'board_id': board_id}, room=f'board_{board_id}')
+        commit_db(conn); flash('Task deleted', 'success')
+        emit_task_delta(board_id, seq, [], [task_id])
+        refresh_dashboards(board_id)   # task count
     except Exception as e:
         conn.rollback(); flash('Delete task error: '+str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('board_view', board_id=board_id))
 
+# ---------- BOARD STATISTICS ----------
+# Task count and progress sum per (board, assignee) live in board_member_stats,
+# kept current by a trigger on tasks (migrations/0006). Overdue counts depend
+# on the clock, so they are counted here from the open tasks only, through
+# tasks_open_due_idx.
+OVERDUE_SQL = """
+    SELECT COALESCE(assigned_to, 0), COUNT(*) FROM tasks
+    WHERE board_id=%s AND progress_percent < 100 AND due_date < LOCALTIMESTAMP
+    GROUP BY 1
+"""
+
+def overdue_counts(conn, board_id):
+    """{assignee id (0 = unassigned): open tasks past their due date}"""
+    with conn.cursor() as cur:
+        cur.execute(OVERDUE_SQL, (board_id,))
+        return dict(cur.fetchall())
+
+def reconcile_board_stats(conn, board_id=None, fix=True):
+    """Recompute board_member_stats from tasks and return the rows that had
+    drifted as (board_id, user_id, stored (count, sum), actual (count, sum)).
+    With fix, the stored rows are rewritten while task writes are blocked."""
+    where, params = ("AND board_id=%s", (board_id,)) if board_id else ("", ())
+    cur = conn.cursor()
+    try:
+        if fix:
+            cur.execute("LOCK TABLE tasks IN SHARE MODE")
+        cur.execute(f"""
+            WITH actual AS (
+                SELECT board_id, COALESCE(assigned_to, 0) AS user_id, COUNT(*) AS task_count,
+                       COALESCE(SUM(progress_percent), 0) AS progress_sum
+                FROM tasks WHERE board_id IS NOT NULL {where}
+                GROUP BY 1, 2
+            ), stored AS (
+                SELECT board_id, user_id, task_count, progress_sum
+                FROM board_member_stats WHERE TRUE {where}
+            )
+            SELECT board_id, user_id,
+                   COALESCE(s.task_count, 0), COALESCE(s.progress_sum, 0),
+                   COALESCE(a.task_count, 0), COALESCE(a.progress_sum, 0)
+            FROM actual a FULL JOIN stored s USING (board_id, user_id)
+            WHERE COALESCE(s.task_count, 0) <> COALESCE(a.task_count, 0)
+               OR COALESCE(s.progress_sum, 0) <> COALESCE(a.progress_sum, 0)
+            ORDER BY board_id, user_id
+        """, params * 2)
+        drift = [(b, u, (sc, ss), (ac, as_)) for b, u, sc, ss, ac, as_ in cur.fetchall()]
+        if fix:
+            cur.execute(f"DELETE FROM board_member_stats WHERE TRUE {where}", params)
+            cur.execute(f"""
+                INSERT INTO board_member_stats (board_id, user_id, task_count, progress_sum)
+                SELECT board_id, COALESCE(assigned_to, 0), COUNT(*), COALESCE(SUM(progress_percent), 0)
+                FROM tasks WHERE board_id IS NOT NULL {where}
+                GROUP BY 1, 2
+            """, params)
+            conn.commit()
+        else:
+            conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return drift
+
 # ---------- PERFORMANCE ----------
 @app.route('/performance/<int:board_id>')
+@board_access()
+@replica_reads
 def performance(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
-    conn = get_db_conn(); cur = conn.cursor(cursor_factory=RealDictCursor)
-    try:
-        cur.execute("""
-            SELECT u.username, COALESCE(AVG(t.progress_percent),0) AS avg_progress
-            FROM users u
-            JOIN user_boards ub ON ub.user_id = u.id
-            LEFT JOIN tasks t ON t.assigned_to = u.id AND t.board_id = %s
-            WHERE ub.board_id = %s
-            GROUP BY u.username
-            ORDER BY avg_progress DESC
-        """, (board_id, board_id))
-        data = cur.fetchall()
-    finally:
-        cur.close(); conn.close()
-    return render_template('performance.html', data=data)
+    conn = get_db_conn()
+    members = dal.member_stats(conn, board_id)
+    overdue = overdue_counts(conn, board_id)
+    return jsonify(members=[{'username': m.username, 'task_count': m.task_count,
+                             'avg_progress': m.avg_progress, 'overdue': overdue.get(m.id, 0)}
+                            for m in members])
 
 # ---------- PROJECT STATUS ----------
 @app.route('/status/<int:board_id>')
+@board_access()
+@replica_reads
 def project_status(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        cur.execute("SELECT COALESCE(AVG(progress_percent),0) FROM tasks WHERE board_id=%s", (board_id,))
-        percent = cur.fetchone()[0]
+        cur.execute("""
+            SELECT COALESCE(SUM(task_count), 0), COALESCE(SUM(progress_sum), 0)
+            FROM board_member_stats WHERE board_id=%s
+        """, (board_id,))
+        task_count, progress_sum = cur.fetchone()
+        overdue = sum(overdue_counts(conn, board_id).values())
     finally:
-        cur.close(); conn.close()
-    return render_template('status.html', percent=percent)
+        cur.close()
+    percent = round(float(progress_sum) / task_count, 1) if task_count else 0
+    return jsonify(percent=percent, task_count=int(task_count), overdue=overdue)
+
+# Cards are spaced POSITION_STEP apart so a move only rewrites the moved card
+# (midpoint of its new neighbours); the board is renumbered, in one statement,
+# only once a gap has been split down to nothing.
+POSITION_STEP = 1024
+
+def renumber_positions(cur, board_id, seq, skip_id=None):
+    cur.execute("""
+        UPDATE tasks t SET position = r.rn * %s, version = %s
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY position, id) AS rn
+            FROM tasks WHERE board_id = %s AND id IS DISTINCT FROM %s
+        ) r
+        WHERE t.id = r.id AND t.position IS DISTINCT FROM r.rn * %s
+    """, (POSITION_STEP, seq, board_id, skip_id, POSITION_STEP))
+
+def move_task(cur, board_id, seq, task_id, prev_id, next_id):
+    """Place task_id between its new neighbours (either may be None at the ends).
+    Returns False if the task isn't on this board."""
+    for attempt in range(2):
+        cur.execute("SELECT id, position FROM tasks WHERE board_id=%s AND id = ANY(%s)",
+                    (board_id, [i for i in (prev_id, next_id) if i is not None]))
+        found = dict(cur.fetchall())
+        prev_pos, next_pos = found.get(prev_id), found.get(next_id)
+        if prev_pos is None and next_pos is None:
+            new_pos = None
+        elif next_pos is None:
+            new_pos = prev_pos + POSITION_STEP
+        elif prev_pos is None:
+            new_pos = next_pos - POSITION_STEP
+        elif next_pos - prev_pos > 1:
+            new_pos = (prev_pos + next_pos) // 2
+        elif attempt == 0:
+            renumber_positions(cur, board_id, seq, skip_id=task_id)
+            continue
+        else:
+            new_pos = None
+        break
+    cur.execute("UPDATE tasks SET position = COALESCE(%s, position), version=%s WHERE id=%s AND board_id=%s",
+                (new_pos, seq, task_id, board_id))
+    return cur.rowcount == 1
 
 @app.route('/update_task_order/<int:board_id>', methods=['POST'])
+@board_access(api=True)
+@admission(api=True)
 def update_task_order(board_id):
-    if not session.get('user'):
-        return "Unauthorized", 403
-    data = request.get_json()
-    ordered_ids = data.get('ordered_ids', [])
-    if not ordered_ids:
+    """Reorder tasks. Preferred body: {"task_id", "prev_id", "next_id"} for a
+    single moved card; {"ordered_ids": [...]} renumbers the listed cards in one
+    set-based UPDATE."""
+    data = request.get_json(silent=True) or {}
+    try:
+        task_id = int(data['task_id']) if data.get('task_id') is not None else None
+        prev_id = int(data['prev_id']) if data.get('prev_id') is not None else None
+        next_id = int(data['next_id']) if data.get('next_id') is not None else None
+        ordered_ids = [int(i) for i in data.get('ordered_ids') or []]
+    except (TypeError, ValueError):
+        return "Invalid task ids", 400
+    if task_id is None and not ordered_ids:
         return "No order provided", 400
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        for position, task_id in enumerate(ordered_ids):
-            cur.execute("UPDATE tasks SET position=%s WHERE id=%s AND board_id=%s", (position, task_id, board_id))
-        conn.commit()
-        socketio.emit('task_update', {'board_id': board_id}, room=f'board_{board_id}')
+        seq = bump_task_seq(board_id)
+        if seq is None:
+            return "Board not found", 404
+        if task_id is not None:
+            if not move_task(cur, board_id, seq, task_id, prev_id, next_id):
+                conn.rollback()
+                return "Task not found", 404
+        else:
+            cur.execute("""
+                UPDATE tasks t SET position = v.ord * %s, version = %s
+                FROM unnest(%s::int[]) WITH ORDINALITY AS v(id, ord)
+                WHERE t.id = v.id AND t.board_id = %s AND t.position IS DISTINCT FROM v.ord * %s
+            """, (POSITION_STEP, seq, ordered_ids, board_id, POSITION_STEP))
+        changed, _ = task_delta(board_id, seq - 1)
+        commit_db(conn)
+        emit_task_delta(board_id, seq, changed)
         return "Order updated", 200
     except Exception as e:
         conn.rollback()
         return str(e), 500
     finally:
-        cur.close(); conn.close()
+        cur.close()
 
 # ---------- EDIT BOARD ----------
 @app.route('/edit_board/<int:board_id>', methods=['GET','POST'])
+@board_access('owner', denied='Only owner can edit board')
+@admission()
 def edit_board(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
     conn = get_db_conn(); cur = conn.cursor(cursor_factory=RealDictCursor)
     try:
         cur.execute("SELECT * FROM boards WHERE id=%s", (board_id,))
         board = cur.fetchone()
         if not board:
             flash('Not found', 'error'); return redirect(url_for('dashboard'))
-        if session['user']['id'] != board['owner_id']:
-            flash('Only owner can edit board', 'error'); return redirect(url_for('dashboard'))
         if request.method == 'POST':
             name = request.form.get('name').strip()
             desc = request.form.get('description','').strip()
-            cur.execute("UPDATE boards SET name=%s, description=%s WHERE id=%s", (name, desc, board_id))
-            conn.commit(); flash('Board updated', 'success'); return redirect(url_for('dashboard'))
-            socketio.emit('board_update')
+            cur.execute("UPDATE boards SET name=%s, description=%s, meta_seq = meta_seq + 1 WHERE id=%s",
+                        (name, desc, board_id))
+            commit_db(conn); flash('Board updated', 'success')
+            refresh_dashboards(board_id)
+            return redirect(url_for('dashboard'))
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return render_template('edit_board.html', board=board)
 
 # ---------- DELETE BOARD ----------
 @app.route('/delete_board/<int:board_id>')
+@board_access('owner', denied='Only owner can delete')
+@admission(methods=('GET',))
 def delete_board(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
+    board = dashboard_board(board_id)
+    audience = board_audience(board_id)   # membership rows go with the board
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        cur.execute("SELECT owner_id FROM boards WHERE id=%s", (board_id,))
-        r = cur.fetchone()
-        if not r:
-            flash('Board not found', 'error'); return redirect(url_for('dashboard'))
-        if r[0] != session['user']['id']:
-            flash('Only owner can delete', 'error'); return redirect(url_for('dashboard'))
         cur.execute("DELETE FROM boards WHERE id=%s", (board_id,))
-        conn.commit(); flash('Board deleted', 'success')
-        socketio.emit('board_update')
+        commit_db(conn); flash('Board deleted', 'success')
+        invalidate_board_role(board_id)
+        emit_board_update('removed', board, audience)
     except Exception as e:
         conn.rollback(); flash('Delete board error: '+str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('dashboard'))
 
 @app.route('/invite_member/<int:board_id>', methods=['POST'])
+@board_access('owner', denied='Only owner can invite members.')
+@admission()
 def invite_member(board_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        cur.execute("SELECT owner_id FROM boards WHERE id=%s", (board_id,))
-        row = cur.fetchone()
-        if not row:
-            flash('Board not found.', 'error'); return redirect(url_for('dashboard'))
-        if session['user']['id'] != row[0]:
-            flash('Only owner can invite members.', 'error'); return redirect(url_for('board_view', board_id=board_id))
         email = request.form.get('email','').strip().lower()
         if not email:
             flash('Email required', 'error'); return redirect(url_for('board_view', board_id=board_id))
@@ -484,83 +1362,530 @@ def invite_member(board_id):
         if not user:
             flash('User not found, ask them to register.', 'error'); return redirect(url_for('board_view', board_id=board_id))
         user_id = user[0]
-        cur.execute("SELECT 1 FROM user_boards WHERE user_id=%s AND board_id=%s", (user_id, board_id))
-        if cur.fetchone():
+        cur.execute("""
+            INSERT INTO user_boards (user_id, board_id) VALUES (%s,%s)
+            ON CONFLICT (user_id, board_id) DO NOTHING
+        """, (user_id, board_id))
+        if cur.rowcount == 0:
             flash('User already a member.', 'info'); return redirect(url_for('board_view', board_id=board_id))
-        cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s,%s)", (user_id, board_id))
-        conn.commit(); flash('Member invited successfully!', 'success')
+        bump_meta_seq(board_id)
+        commit_db(conn); flash('Member invited successfully!', 'success')
+        invalidate_board_role(board_id, user_id)
         socketio.emit('member_update', {'board_id': board_id}, room=f'board_{board_id}')
+        emit_board_update('added', dashboard_board(board_id), [user_id])
+        refresh_dashboards(board_id, exclude=[user_id])
     except Exception as e:
         conn.rollback(); flash('Invite error: '+str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('board_view', board_id=board_id))
 
 @app.route('/remove_member/<int:board_id>/<int:user_id>')
+@board_access('owner', denied='Only owner can remove members.')
+@admission(methods=('GET',))
 def remove_member(board_id, user_id):
-    if not session.get('user'):
-        return redirect(url_for('login'))
     conn = get_db_conn(); cur = conn.cursor()
     try:
-        cur.execute("SELECT owner_id FROM boards WHERE id=%s", (board_id,))
-        row = cur.fetchone()
-        if not row:
-            flash('Board not found.', 'error'); return redirect(url_for('dashboard'))
-        if session['user']['id'] != row[0]:
-            flash('Only owner can remove members.', 'error'); return redirect(url_for('board_view', board_id=board_id))
-        if user_id == row[0]:
+        if user_id == session['user']['id']:
             flash('Owner cannot remove themselves.', 'error'); return redirect(url_for('board_view', board_id=board_id))
         cur.execute("DELETE FROM user_boards WHERE user_id=%s AND board_id=%s", (user_id, board_id))
-        conn.commit(); flash('Member removed successfully.', 'success')
+        bump_meta_seq(board_id)
+        commit_db(conn); flash('Member removed successfully.', 'success')
+        invalidate_board_role(board_id, user_id)
         socketio.emit('member_update', {'board_id': board_id}, room=f'board_{board_id}')
+        emit_board_update('removed', dashboard_board(board_id), [user_id])
+        refresh_dashboards(board_id)
     except Exception as e:
         conn.rollback(); flash('Remove member error: '+str(e), 'error')
     finally:
-        cur.close(); conn.close()
+        cur.close()
     return redirect(url_for('board_view', board_id=board_id))
 
-@app.route('/history/<int:board_id>')
-def board_history(board_id):
+# ---------- BULK IMPORT / EXPORT ----------
+# Imports validate and spool the upload through bulk.py with no transaction
+# open, then COPY the spool in one statement, so a 50k-card backlog costs
+# one statement, one history entry and one task_update, and the board's lock
+# is only held for the COPY. Exports page a server-side cursor into a
+# streamed response.
+
+def board_member_lookup(board_id):
+    """Resolver for an import's assigned_to: a member's id, email or
+    username -> their user id (None if not on the board)."""
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("""
+            SELECT u.id, u.email, u.username FROM users u
+            WHERE u.id IN (SELECT user_id FROM user_boards WHERE board_id=%s
+                           UNION SELECT owner_id FROM boards WHERE id=%s)
+        """, (board_id, board_id))
+        members = cur.fetchall()
+    finally:
+        cur.close()
+    lookup = {}
+    for user_id, email, username in members:
+        lookup[str(user_id)] = user_id
+        lookup[email.lower()] = user_id
+        lookup.setdefault(username, user_id)
+    return lambda value: lookup.get(value) or lookup.get(value.lower())
+
+def open_import(stream, fmt):
+    """(record number, record) pairs read lazily from a binary stream."""
+    text = codecs.getreader('utf-8-sig')(stream)
+    return bulk.read_csv(text) if fmt == 'csv' else bulk.read_json(text)
+
+def spool_import(board_id, records):
+    """Validate and spool the records (see bulk.spool_tasks). The request's
+    connection goes back to the pool first, so a slow upload holds none."""
+    resolve_user = board_member_lookup(board_id)
+    release_db_conn(None)
+    return bulk.spool_tasks(records, resolve_user, IMPORT_MAX_ROWS)
+
+def import_tasks(board_id, user_id, spool, total):
+    """COPY the spooled tasks into the board as one task version, appended
+    below the existing cards in file order. Returns how many were imported."""
+    if not total:
+        return 0
+    conn = get_db_conn(); cur = conn.cursor()
+    try:
+        seq = bump_task_seq(board_id)
+        if seq is None:
+            raise bulk.BulkImportError(0, 'board not found')
+        cur.execute("SELECT COALESCE(MAX(position), 0) FROM tasks WHERE board_id=%s", (board_id,))
+        first = cur.fetchone()[0] + POSITION_STEP
+        count = bulk.copy_tasks(cur, bulk.task_rows(spool, board_id, seq, first, POSITION_STEP))
+        log_action(board_id, user_id, f"Imported {count} task{'s' if count != 1 else ''}")
+        # past the inline limit clients fetch the delta themselves
+        changed = task_delta(board_id, seq - 1)[0] if count <= TASK_DELTA_INLINE_MAX else None
+        commit_db(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    emit_task_delta(board_id, seq, changed or [], resync=changed is None)
+    refresh_dashboards(board_id)   # task count
+    return count
+
+@app.route('/import/<int:board_id>', methods=['POST'])
+@board_access(api=True)
+@admission(api=True, hold_slot=False)
+def import_tasks_api(board_id):
+    """Import tasks from CSV or JSON, sent as the raw body or as a multipart
+    'file'. The format comes from ?format=, the file name or Content-Type.
+    CSV needs a header row; columns/keys: name (required), description,
+    comments, assigned_to (member id, email or username), due_date (ISO),
+    progress_percent."""
+    upload = request.files.get('file')
+    if upload:
+        fmt = bulk.detect_format(request.args.get('format'), upload.mimetype, upload.filename)
+        stream = upload.stream
+    else:
+        fmt = bulk.detect_format(request.args.get('format'), request.mimetype)
+        stream = request.stream
+    if fmt is None:
+        return jsonify(error='Unknown format; use ?format=csv or ?format=json'), 415
+    try:
+        spool, total = spool_import(board_id, open_import(stream, fmt))
+    except bulk.BulkImportError as e:
+        return jsonify(error=str(e), record=e.record), 400
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify(error=f'Unreadable {fmt}: {e}'), 400
+    with spool:
+        if not db_work_slots.acquire():
+            return "Too many requests, please slow down", 429, {'Retry-After': '1'}
+        try:
+            count = import_tasks(board_id, session['user']['id'], spool, total)
+        except bulk.BulkImportError as e:
+            return jsonify(error=str(e), record=e.record), 400
+        finally:
+            db_work_slots.release()
+    return jsonify(imported=count)
+
+EXPORTS = {
+    'tasks': ("""
+        SELECT t.id, t.name, t.description, t.comments, t.assigned_to, u.username AS assigned_name,
+               t.due_date, t.progress_percent, t.position, t.created_at
+        FROM tasks t LEFT JOIN users u ON u.id = t.assigned_to
+        WHERE t.board_id = %s ORDER BY t.position, t.id
+    """, ('id', 'name', 'description', 'comments', 'assigned_to', 'assigned_name',
+          'due_date', 'progress_percent', 'position', 'created_at')),
+    'history': ("""
+        SELECT h.id, h.user_id, u.username, h.action, h.timestamp
+        FROM history h LEFT JOIN users u ON u.id = h.user_id
+        WHERE h.board_id = %s ORDER BY h.timestamp, h.id
+    """, ('id', 'user_id', 'username', 'action', 'timestamp')),
+}
+
+def export_rows(board_id, sql):
+    """Rows of an export query, fetched EXPORT_FETCH_SIZE at a time from a
+    server-side cursor that lives as long as the streamed response."""
+    cur = get_db_conn().cursor(name=f'export_{board_id}')
+    cur.itersize = EXPORT_FETCH_SIZE
+    try:
+        cur.execute(sql, (board_id,))
+        yield from cur
+    finally:
+        cur.close()
+
+@app.route('/export/<int:board_id>')
+@board_access(api=True)
+def export_board(board_id):
+    """?what=tasks|history, ?format=csv|json; streamed as a download."""
+    what = request.args.get('what', 'tasks')
+    fmt = request.args.get('format', 'csv')
+    if what not in EXPORTS or fmt not in bulk.FORMATS:
+        return jsonify(error='what must be tasks or history, format csv or json'), 400
+    sql, columns = EXPORTS[what]
+    mark_board_opened(board_id)   # an export counts as use, and needs the tasks back
+    writer = bulk.stream_csv if fmt == 'csv' else bulk.stream_json
+    body = stream_with_context(writer(columns, export_rows(board_id, sql)))
+    return Response(body, mimetype='text/csv' if fmt == 'csv' else 'application/json', headers={
+        'Content-Disposition': f'attachment; filename="board-{board_id}-{what}.{fmt}"',
+    })
+
+# ---------- TASK SEARCH ----------
+# tasks.search_vector is a generated tsvector over name, description and
+# comments with a GIN index (migrations/0007). Queries use web-search syntax:
+# words, "quoted phrases", or, -excluded.
+SEARCH_CONFIG = dal.SEARCH_CONFIG   # the board page's ?search= uses it too
+
+def search_sql(one_board=False):
+    """The search query; params q, user_id, candidates, limit, offset and,
+    with one_board, board_id."""
+    board_filter = "AND t.board_id = %(board_id)s" if one_board else ""
+    # take the newest matches (a backwards primary key walk that stops early
+    # for broad terms), rank those, then build headlines for the page only
+    return f"""
+        SELECT m.id, m.board_id, b.name AS board_name, m.name, m.progress_percent, m.due_date,
+               u.username AS assigned_name, m.rank,
+               ts_headline('{SEARCH_CONFIG}', COALESCE(m.description, '') || ' ' || COALESCE(m.comments, ''),
+                           m.query, 'MaxWords=25, MinWords=8, MaxFragments=1') AS snippet
+        FROM (
+            SELECT c.*, ts_rank(c.search_vector, c.query) AS rank
+            FROM (
+                SELECT t.id, t.board_id, t.name, t.description, t.comments, t.progress_percent,
+                       t.due_date, t.assigned_to, t.search_vector, q.query
+                FROM tasks t, websearch_to_tsquery('{SEARCH_CONFIG}', %(q)s) AS q(query)
+                WHERE t.search_vector @@ q.query
+                  AND t.board_id IN (SELECT id FROM boards WHERE owner_id = %(user_id)s
+                                     UNION SELECT board_id FROM user_boards WHERE user_id = %(user_id)s)
+                  {board_filter}
+                ORDER BY t.id DESC
+                LIMIT %(candidates)s
+            ) c
+            ORDER BY rank DESC, c.id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        ) m
+        JOIN boards b ON b.id = m.board_id
+        LEFT JOIN users u ON u.id = m.assigned_to
+        ORDER BY m.rank DESC, m.id DESC
+    """
+
+def search_tasks(user_id, q, board_id=None, page=1, limit=None):
+    """(rows, more) for one page of the user's tasks matching q, best first.
+    Covers every board the user owns or belongs to, or just board_id."""
+    limit = limit or SEARCH_PAGE_SIZE
+    params = {'q': q, 'user_id': user_id, 'board_id': board_id, 'candidates': SEARCH_MAX_CANDIDATES,
+              'limit': limit + 1, 'offset': (page - 1) * limit}
+    cur = get_db_conn().cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(search_sql(bool(board_id)), params)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+    return rows[:limit], len(rows) > limit
+
+@app.route('/api/search')
+def search_api():
+    """?q=<terms>[&board=<id>][&page=<n>] -> ranked task matches as JSON."""
+    if not session.get('user'):
+        return jsonify(error='Unauthorized'), 403
+    q = request.args.get('q', '').strip()
+    try:
+        board_id = int(request.args['board']) if request.args.get('board') else None
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify(error='Bad board or page'), 400
+    if not q:
+        return jsonify(results=[], page=page, more=False)
+    rows, more = search_tasks(session['user']['id'], q, board_id=board_id, page=page)
+    # archived boards' tasks aren't searched; say which boards those are
+    archived = []
+    if page == 1:
+        archived = [row_json(b) for b in dal.archived_boards(get_db_conn(), session['user']['id'])
+                    if board_id is None or b.id == board_id]
+    return jsonify(results=[row_json(r) for r in rows], page=page, more=more, archived_boards=archived)
+
+# ---------- MY TASKS ----------
+# The tasks assigned to a user on every board they own or belong to, sorted by
+# one of MY_TASK_SORTS (empty values last, either direction) and then id.
+# Pages are keyset-paginated on (sort value, id), so each is a range scan of
+# tasks_assigned_due_idx or tasks_assigned_progress_idx from the cursor on
+# (migrations/0012).
+# A cursor is "<value>_<id>" of the last task shown; the value is empty for a
+# task without one.
+MY_TASK_SORTS = ('due_date', 'progress_percent')
+
+def my_task_cursor(sort, row):
+    value = row[sort]
+    if value is None:
+        value = ''
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return f"{value}_{row['id']}"
+
+def parse_my_task_cursor(sort, value):
+    try:
+        key, task_id = value.rsplit('_', 1)
+        if not key:
+            return None, int(task_id)
+        return (datetime.fromisoformat(key) if sort == 'due_date' else int(key)), int(task_id)
+    except (AttributeError, ValueError):
+        return None
+
+def my_tasks_query(user_id, sort, desc, after, limit):
+    """(sql, params) for the page after cursor `after` plus one row."""
+    op, direction = ('<', 'DESC') if desc else ('>', 'ASC')
+    branch = """
+        SELECT t.id, t.name, t.board_id, t.due_date, t.progress_percent, t.version
+        FROM tasks t
+        WHERE t.assigned_to = %(user_id)s
+          AND t.board_id IN (SELECT id FROM boards WHERE owner_id = %(user_id)s
+                             UNION SELECT board_id FROM user_boards WHERE user_id = %(user_id)s)
+    """
+    params = {'user_id': user_id, 'limit': limit + 1}
+    # tasks with a value and tasks without are two index ranges, walked in
+    # turn; a cursor among the empty ones is past every valued task
+    valued = branch + f" AND t.{sort} IS NOT NULL"
+    empty = branch + f" AND t.{sort} IS NULL"
+    if after:
+        params['after_value'], params['after_id'] = after
+        if after[0] is None:
+            valued = None
+            empty += f" AND t.id {op} %(after_id)s"
+        else:
+            valued += f" AND (t.{sort}, t.id) {op} (%(after_value)s, %(after_id)s)"
+    parts = [f"({empty} ORDER BY t.id {direction} LIMIT %(limit)s)"]
+    if valued:
+        parts.insert(0, f"({valued} ORDER BY t.{sort} {direction}, t.id {direction} LIMIT %(limit)s)")
+    return f"""
+        SELECT p.*, b.name AS board_name
+        FROM ({' UNION ALL '.join(parts)}) p
+        JOIN boards b ON b.id = p.board_id
+        ORDER BY p.{sort} IS NULL, p.{sort} {direction}, p.id {direction}
+        LIMIT %(limit)s
+    """, params
+
+def my_task_rows(user_id, sort='due_date', desc=False, after=None, limit=MY_TASKS_PAGE_SIZE):
+    """The page after cursor `after` plus one row (there is a next page if it
+    comes), fetched from a server-side cursor as the caller iterates."""
+    sql, params = my_tasks_query(user_id, sort, desc, after, limit)
+    cur = get_db_conn().cursor(name=f'my_tasks_{user_id}', cursor_factory=RealDictCursor)
+    try:
+        cur.execute(sql, params)
+        yield from cur
+    finally:
+        cur.close()
+
+def my_tasks_args():
+    """(sort, desc, after, limit) from ?sort=&order=&after=&limit=, or None if
+    they don't make sense."""
+    sort = request.args.get('sort', 'due_date')
+    if sort not in MY_TASK_SORTS or request.args.get('order', 'asc') not in ('asc', 'desc'):
+        return None
+    after = None
+    if request.args.get('after'):
+        after = parse_my_task_cursor(sort, request.args['after'])
+        if after is None:
+            return None
+    limit = max(1, min(request.args.get('limit', MY_TASKS_PAGE_SIZE, type=int), 200))
+    return sort, request.args.get('order') == 'desc', after, limit
+
+def archived_assigned_boards(user_id):
+    """The user's archived boards holding tasks assigned to them, which My
+    Tasks can't list until the board is restored."""
+    return [b for b in dal.archived_boards(get_db_conn(), user_id) if b.assigned_count]
+
+def stream_my_tasks(rows, sort, limit, archived=()):
+    """{"tasks": [...], "next": <cursor or null>, "archived_boards": [...]},
+    one chunk per task."""
+    yield '{"tasks": ['
+    next_cursor, last = None, None
+    for n, row in enumerate(rows):
+        if n == limit:      # the extra row: there is a next page
+            next_cursor = my_task_cursor(sort, last)
+            continue
+        yield ('' if last is None else ',\n') + app.json.dumps(row_json(row))
+        last = row
+    yield ('], "next": ' + app.json.dumps(next_cursor)
+           + ', "archived_boards": ' + app.json.dumps([row_json(b) for b in archived]) + '}\n')
+
+@app.route('/my_tasks')
+@replica_reads
+def my_tasks():
     if not session.get('user'):
         return redirect(url_for('login'))
-    conn = get_db_conn()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    args = my_tasks_args()
+    if args is None:
+        return redirect(url_for('my_tasks'))
+    sort, desc, after, limit = args
+    tasks = []
+    next_cursor = None
+    for row in my_task_rows(session['user']['id'], sort, desc, after, limit):
+        if len(tasks) == limit:
+            next_cursor = my_task_cursor(sort, tasks[-1])
+            continue
+        tasks.append(row)
+    archived = [] if after else archived_assigned_boards(session['user']['id'])
+    return render_template('my_tasks.html', user=session['user'], tasks=tasks, sort=sort,
+                           order='desc' if desc else 'asc', next_cursor=next_cursor,
+                           paged=bool(after), archived_boards=archived, now=datetime.now())
+
+@app.route('/api/my_tasks')
+@replica_reads
+def my_tasks_api():
+    """?sort=due_date|progress_percent[&order=asc|desc][&after=<cursor>][&limit=<n>]
+    -> one page of the user's assigned tasks, streamed as JSON."""
+    if not session.get('user'):
+        return jsonify(error='Unauthorized'), 403
+    args = my_tasks_args()
+    if args is None:
+        return jsonify(error='sort must be due_date or progress_percent, order asc or desc, '
+                             'after a cursor from this sort'), 400
+    sort, desc, after, limit = args
+    archived = [] if after else archived_assigned_boards(session['user']['id'])
+    rows = my_task_rows(session['user']['id'], sort, desc, after, limit)
+    return Response(stream_with_context(stream_my_tasks(rows, sort, limit, archived)),
+                    mimetype='application/json')
+
+# ---------- HISTORY FEED ----------
+# Pages are keyset-paginated on (timestamp, id) so every page is an index range
+# scan on history_board_timestamp_idx, however long the board has lived.
+# A cursor is "<iso timestamp>_<id>" of the entry it points at.
+def history_cursor(row):
+    return f"{row.timestamp.isoformat()}_{row.id}"
+
+def parse_history_cursor(value):
     try:
-        cur.execute("""
-            SELECT h.*, u.username
-            FROM history h
-            LEFT JOIN users u ON h.user_id = u.id
-            WHERE h.board_id = %s
-            ORDER BY h.timestamp DESC
-        """, (board_id,))
-        logs = cur.fetchall()
+        ts, log_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(ts), int(log_id)
+    except (AttributeError, ValueError):
+        return None
+
+def compact_history(conn, cutoff, board_id=None, batch=5000):
+    """Fold raw history older than `cutoff` into per-board, per-day, per-user
+    counts in history_rollup, in batches of `batch` rows per transaction.
+    Returns {board_id: rows compacted}."""
+    compacted = {}
+    cur = conn.cursor()
+    try:
+        if board_id is None:
+            cur.execute("SELECT id FROM boards ORDER BY id")
+            board_ids = [r[0] for r in cur.fetchall()]
+        else:
+            board_ids = [board_id]
+        for bid in board_ids:
+            while True:
+                cur.execute("""
+                    WITH doomed AS (
+                        DELETE FROM history WHERE (id, timestamp) IN (
+                            SELECT id, timestamp FROM history
+                            WHERE board_id = %s AND timestamp < %s
+                            ORDER BY timestamp, id
+                            LIMIT %s
+                        )
+                        RETURNING board_id, user_id, timestamp
+                    ), rolled AS (
+                        INSERT INTO history_rollup (board_id, day, user_id, action_count)
+                        SELECT board_id, timestamp::date, user_id, COUNT(*)
+                        FROM doomed GROUP BY 1, 2, 3
+                        ON CONFLICT (board_id, day, (COALESCE(user_id, 0)))
+                        DO UPDATE SET action_count = history_rollup.action_count + EXCLUDED.action_count
+                    )
+                    SELECT COUNT(*) FROM doomed
+                """, (bid, cutoff, batch))
+                n = cur.fetchone()[0]
+                conn.commit()
+                if not n:
+                    break
+                compacted[bid] = compacted.get(bid, 0) + n
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cur.close()
-        conn.close()
-    return render_template('history.html', logs=logs)
+    return compacted
+
+@app.route('/history/<int:board_id>')
+@board_access(api=True)
+@replica_reads
+def board_history(board_id):
+    """HTML fragment for the board's History panel: the newest page, the page
+    older than ?before=<cursor>, or the entries newer than ?after=<cursor>
+    (X-History-More tells the client when that gap was too big for one page)."""
+    before = parse_history_cursor(request.args.get('before'))
+    after = parse_history_cursor(request.args.get('after'))
+    if after:
+        # answering a history_update: the new entries must be there
+        g.replica_reads = False
+    logs, more = dal.history_page(get_db_conn(), board_id, before=before, after=after,
+                                  limit=HISTORY_PAGE_SIZE)
+    next_cursor = history_cursor(logs[-1]) if more and not after else None
+    resp = app.make_response(render_template('history.html', logs=logs, next_cursor=next_cursor,
+                                             partial=bool(before or after)))
+    resp.headers['X-History-More'] = '1' if more else '0'
+    return resp
+
+@app.route('/api/board/<int:board_id>/history')
+@board_access(api=True)
+@replica_reads
+def board_history_api(board_id):
+    """JSON history feed, newest first. ?after=<cursor> returns only entries
+    newer than the cursor; ?before=<cursor> pages backwards."""
+    limit = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 200))
+    before = parse_history_cursor(request.args.get('before'))
+    after = parse_history_cursor(request.args.get('after'))
+    if after:
+        g.replica_reads = False     # polling for new entries: read the primary
+    logs, more = dal.history_page(get_db_conn(), board_id, before=before, after=after, limit=limit)
+    entries = [{'id': h.id, 'user_id': h.user_id, 'username': h.username, 'action': h.action,
+                'timestamp': h.timestamp.isoformat(), 'cursor': history_cursor(h)} for h in logs]
+    return jsonify(board_id=board_id, entries=entries, more=more,
+                   latest=entries[0]['cursor'] if entries else request.args.get('after'),
+                   next_before=entries[-1]['cursor'] if more and entries and not after else None)
 
 @app.route('/delete_history/<int:log_id>', methods=['POST'])
+@board_access(resolve=history_board, api=True)
+@admission(api=True)
 def delete_history(log_id):
-    if not session.get('user'):
-        return "Unauthorized", 403
     conn = get_db_conn()
     cur = conn.cursor()
     try:
         cur.execute("DELETE FROM history WHERE id=%s", (log_id,))
-        conn.commit()
+        commit_db(conn)
         return "Deleted", 200
     except Exception:
         conn.rollback()
         return "Error", 500
     finally:
         cur.close()
-        conn.close()
 
 # ---------- SOCKET.IO EVENTS ----------
+@socketio.on('connect')
+def handle_connect(auth=None):
+    user = session.get('user')
+    if user:
+        join_room(user_room(user['id']))
+
 @socketio.on('join_board')
+@socket_admission('join_board')
 def handle_join_board(data):
-    board_id = data.get('board_id')
-    if board_id:
+    try:
+        board_id = int(data.get('board_id'))
+    except (TypeError, ValueError):
+        return
+    user = session.get('user')
+    if user and board_role(user['id'], board_id):
         join_room(f'board_{board_id}')
 
 @socketio.on('leave_board')
@@ -569,11 +1894,198 @@ def handle_leave_board(data):
     if board_id:
         leave_room(f'board_{board_id}')
 
-@socketio.on('join_dashboard')
-def join_dashboard():
-    join_room('dashboard')
 
+# ---------- CLI ----------
+def hot_queries():
+    """migrate.HOT_QUERIES plus the hot SQL that lives in this module, built
+    by the same code the routes use."""
+    search = {'q': 'term', 'user_id': 1, 'board_id': 1, 'candidates': SEARCH_MAX_CANDIDATES,
+              'limit': SEARCH_PAGE_SIZE + 1, 'offset': 0}
+    return migrate.HOT_QUERIES + [
+        ('role check', ROLE_SQL, (1, 1, 1), ('boards', 'user_boards')),
+        ('task search', search_sql(), search, 'tasks'),
+        ('task search on one board', search_sql(one_board=True), search, 'tasks'),
+        ('my tasks by due date', *my_tasks_query(1, 'due_date', False, (datetime(2000, 1, 1), 1),
+                                                 MY_TASKS_PAGE_SIZE), 'tasks'),
+        ('my tasks by progress', *my_tasks_query(1, 'progress_percent', True, None, MY_TASKS_PAGE_SIZE),
+         'tasks'),
+        ('overdue tasks', OVERDUE_SQL, (1,), 'tasks'),
+    ]
+
+@app.cli.command('migrate')
+@click.option('--check', is_flag=True, help='EXPLAIN the hot queries and fail if one misses its index.')
+def migrate_command(check):
+    """Apply pending schema migrations from migrations/."""
+    with db_pool.connection() as conn:
+        ran = migrate.migrate(conn, log=click.echo)
+        click.echo(f'{len(ran)} migration(s) applied' if ran else 'schema up to date')
+        if not check:
+            return
+        failed = False
+        for desc, tables, used, ok in migrate.check_indexes(conn, hot_queries()):
+            click.echo(f"{'ok  ' if ok else 'FAIL'} {desc}: {', '.join(tables)} via "
+                       f"{', '.join(used) or 'sequential scan'}")
+            failed = failed or not ok
+        if failed:
+            raise SystemExit(1)
+
+@app.cli.command('replica-status')
+def replica_status_command():
+    """Probe each read replica in DB_REPLICAS and print its state."""
+    if not db_router:
+        click.echo('No read replicas configured (DB_REPLICAS).')
+        return
+    for replica in db_router.replicas:
+        db_router.probe(replica)
+        if replica.up:
+            usable = 'in use' if replica.lag <= db_router.max_lag else 'skipped: too far behind'
+            click.echo(f'{replica.name}: up, {replica.lag:.1f}s behind, {usable}')
+        else:
+            click.echo(f'{replica.name}: down ({replica.error})')
+    db_router.closeall()
+
+@app.cli.command('build-assets')
+@click.option('--no-fetch', is_flag=True, help="Don't download missing vendored libraries.")
+@click.option('--pin-vendor', is_flag=True, help='Record the sha256 of vendor files not yet in the lock.')
+@click.option('--prune', is_flag=True, help='Delete files left in static/dist/ by earlier builds.')
+def build_assets_command(no_fetch, pin_vendor, prune):
+    """Vendor third-party scripts, then write hashed, precompressed copies of
+    the static files to static/dist/."""
+    if not no_fetch:
+        try:
+            fetch_vendor(app.static_folder, echo=click.echo, pin=pin_vendor)
+        except (OSError, RuntimeError) as e:
+            raise click.ClickException(f'fetching vendor files failed: {e}')
+    missing = missing_vendor(app.static_folder)
+    if missing:
+        raise click.ClickException(f"missing from static/: {', '.join(missing)}"
+                                   + (' (run without --no-fetch)' if no_fetch else ''))
+    unverified = unverified_vendor(app.static_folder)
+    if unverified:
+        raise click.ClickException(f"not matching static/{VENDOR_LOCK}: {', '.join(unverified)}")
+    manifest = build_assets(app.static_folder, echo=click.echo, prune=prune)
+    click.echo(f'{len(manifest)} asset(s) in static/dist/manifest.json')
+
+def echo_dropped_history(dropped):
+    for name, n in dropped.items():
+        # history_default stays; only its expired rows go
+        done = 'rolled up' if name == 'history_default' else 'dropped the partition after rolling up'
+        click.echo(f'{name}: {done} {n} row(s)')
+
+@app.cli.command('compact-history')
+@click.option('--days', type=int, default=None, help='Keep this many days of raw history (default: HISTORY_RETENTION_DAYS).')
+@click.option('--board', 'board_id', type=int, default=None, help='Only compact this board.')
+@click.option('--batch', type=int, default=5000, show_default=True, help='Rows moved per transaction.')
+def compact_history_command(days, board_id, batch):
+    """Roll old history rows up into daily per-user counts."""
+    days = days or HISTORY_RETENTION_DAYS
+    if not days:
+        raise click.UsageError('set --days or HISTORY_RETENTION_DAYS')
+    cutoff = datetime.now() - timedelta(days=days)
+    with db_pool.connection() as conn:
+        if board_id is None:
+            # whole months go at once; compact_history then handles the rest
+            echo_dropped_history(archive.drop_expired_history_partitions(conn, cutoff))
+        compacted = compact_history(conn, cutoff, board_id=board_id, batch=batch)
+    for bid, n in sorted(compacted.items()):
+        click.echo(f'board {bid}: compacted {n} row(s)')
+    click.echo(f'{sum(compacted.values())} history row(s) older than {cutoff:%Y-%m-%d} compacted')
+
+@app.cli.command('maintain-history')
+@click.option('--ahead', type=int, default=None, help='Months of partitions to create ahead (default: HISTORY_PARTITIONS_AHEAD).')
+def maintain_history_command(ahead):
+    """Create upcoming history partitions, drop (after rolling up) the months
+    older than HISTORY_RETENTION_DAYS and prune old task tombstones."""
+    with db_pool.connection() as conn:
+        created = archive.ensure_history_partitions(
+            conn, HISTORY_PARTITIONS_AHEAD if ahead is None else ahead)
+        click.echo(f"created {', '.join(created)}" if created else 'history partitions up to date')
+        if HISTORY_RETENTION_DAYS:
+            cutoff = datetime.now() - timedelta(days=HISTORY_RETENTION_DAYS)
+            echo_dropped_history(archive.drop_expired_history_partitions(conn, cutoff))
+        if TASK_TOMBSTONE_VERSIONS:
+            pruned = archive.prune_task_tombstones(conn, TASK_TOMBSTONE_VERSIONS)
+            click.echo(f'pruned {pruned} task tombstone(s)')
+
+@app.cli.command('archive-boards')
+@click.option('--days', type=int, default=None, help='Archive boards inactive this many days (default: BOARD_ARCHIVE_DAYS).')
+@click.option('--board', 'board_id', type=int, default=None, help='Archive this board now, however recently it was used.')
+@click.option('--limit', type=int, default=1000, show_default=True, help='Most boards to archive in one run.')
+def archive_boards_command(days, board_id, limit):
+    """Move the tasks and history of inactive boards to board_archives."""
+    days = days or BOARD_ARCHIVE_DAYS
+    if board_id is None and not days:
+        raise click.UsageError('set --days, --board or BOARD_ARCHIVE_DAYS')
+    cutoff = None if board_id is not None else datetime.now() - timedelta(days=days)
+    with db_pool.connection() as conn:
+        board_ids = [board_id] if board_id is not None else archive.inactive_boards(conn, cutoff, limit)
+        for bid in board_ids:
+            moved = archive.archive_board(conn, bid, cutoff)
+            conn.commit()
+            if moved:
+                click.echo(f'board {bid}: archived {moved[0]} task(s), {moved[1]} history entries')
+            elif board_id is not None:
+                click.echo(f'board {bid}: not found or already archived')
+
+@app.cli.command('restore-board')
+@click.argument('board_id', type=int)
+def restore_board_command(board_id):
+    """Bring an archived board's tasks and history back now (opening the
+    board does this too)."""
+    with db_pool.connection() as conn:
+        restored = archive.restore_board(conn, board_id)
+        conn.commit()
+    if restored:
+        click.echo(f'board {board_id}: restored {restored[0]} task(s), {restored[1]} history entries')
+    else:
+        click.echo(f'board {board_id} is not archived')
+
+@app.cli.command('reconcile-stats')
+@click.option('--board', 'board_id', type=int, default=None, help='Only reconcile this board.')
+@click.option('--check', is_flag=True, help='Report drift without rewriting; exit 1 if any.')
+def reconcile_stats_command(board_id, check):
+    """Rebuild board_member_stats from tasks and report any drift."""
+    with db_pool.connection() as conn:
+        drift = reconcile_board_stats(conn, board_id=board_id, fix=not check)
+    for bid, uid, (stored_count, stored_sum), (count, total) in drift:
+        who = f'user {uid}' if uid else 'unassigned'
+        click.echo(f'board {bid} {who}: stored {stored_count} task(s)/{stored_sum}% '
+                   f'actual {count} task(s)/{total}%')
+    if not drift:
+        click.echo('board stats match tasks')
+    elif check:
+        raise SystemExit(1)
+    else:
+        click.echo(f'{len(drift)} drifted row(s) rebuilt')
+
+@app.cli.command('import-tasks')
+@click.argument('board_id', type=int)
+@click.argument('source', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--user', 'email', required=True, help='Email of the board member recorded as the importer.')
+def import_tasks_command(board_id, source, fmt, email):
+    """Bulk-import tasks into a board from a CSV or JSON file ('-' for stdin)."""
+    fmt = bulk.detect_format(fmt, filename=source.name)
+    if fmt is None:
+        raise click.UsageError('cannot tell the format from the file name; pass --format')
+    cur = get_db_conn().cursor()
+    try:
+        cur.execute("SELECT id FROM users WHERE email=%s", (email.strip().lower(),))
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    if not row or not board_role(row[0], board_id):
+        raise click.UsageError(f'{email} is not a member of board {board_id}')
+    try:
+        spool, total = spool_import(board_id, open_import(source, fmt))
+        with spool:
+            count = import_tasks(board_id, row[0], spool, total)
+    except (bulk.BulkImportError, UnicodeDecodeError, csv.Error) as e:
+        raise click.ClickException(f'nothing imported: {e}')
+    click.echo(f'{count} task(s) imported into board {board_id}')
 
 if __name__ == '__main__':
+    # development server only; production runs wsgi.py under gunicorn
     socketio.run(app, debug=True)
 
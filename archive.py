@@ -0,0 +1,361 @@
+"""Cold data: history partitions and archived boards.
+
+history is range-partitioned by month (migrations/0010). Partitions for the
+coming months are created ahead of time. Months that fall entirely before
+the retention cutoff are rolled up into history_rollup and dropped whole,
+with no row-by-row DELETE and nothing left for vacuum.
+
+Boards nobody has opened or changed for a while are archived: their tasks
+and history move into one board_archives row (migrations/0011) and come back
+when the board is opened again (see mark_board_opened in app.py).
+
+Task tombstones (task_deletions) far enough behind their board's task_seq
+are pruned; boards.tombstone_seq records how far, and clients further behind
+than that get the whole task list (see board_tasks_api in app.py).
+
+Maintenance runs both in the background of the app; the CLI commands in
+app.py call the same functions.
+"""
+import logging
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+
+from psycopg2 import sql
+
+log = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r'^history_y(\d{4})m(\d{2})$')
+# pg_advisory_lock key so only one worker runs a maintenance round at a time
+MAINTENANCE_LOCK_KEY = 0x4E584221
+
+# the tasks columns an archive keeps (search_vector is generated)
+ARCHIVED_TASK_COLUMNS = ('id', 'name', 'description', 'board_id', 'assigned_to', 'comments', 'due_date',
+                         'created_at', 'position', 'progress_percent', 'version')
+
+
+# ---------- history partitions ----------
+def ensure_history_partitions(conn, months_ahead=2):
+    """Create any missing partition for this month and the next
+    `months_ahead`. Returns the names created."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT m::date
+            FROM generate_series(date_trunc('month', LOCALTIMESTAMP),
+                                 date_trunc('month', LOCALTIMESTAMP) + make_interval(months => %s),
+                                 INTERVAL '1 month') m
+            WHERE history_ensure_partition(m::date)
+        """, (months_ahead,))
+        created = [f'history_y{m:%Y}m{m:%m}' for m, in cur.fetchall()]
+    conn.commit()
+    return created
+
+
+def history_partitions(conn):
+    """[(name, first day, first day after)] of the monthly partitions, oldest first."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'history'::regclass
+        """)
+        names = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    parts = []
+    for name in names:
+        m = PARTITION_NAME.match(name)
+        if m:
+            first = date(int(m.group(1)), int(m.group(2)), 1)
+            parts.append((name, first, date(first.year + first.month // 12, first.month % 12 + 1, 1)))
+    return sorted(parts, key=lambda p: p[1])
+
+
+ROLLUP_SQL = """
+    INSERT INTO history_rollup (board_id, day, user_id, action_count)
+    SELECT board_id, timestamp::date, user_id, COUNT(*)
+    FROM {} GROUP BY 1, 2, 3
+    ON CONFLICT (board_id, day, (COALESCE(user_id, 0)))
+    DO UPDATE SET action_count = history_rollup.action_count + EXCLUDED.action_count
+"""
+
+
+def drop_expired_history_partitions(conn, cutoff):
+    """Fold each monthly partition that ends before `cutoff` into
+    history_rollup (as compact_history does row by row) and drop it, one
+    transaction per partition. Expired rows in history_default (restored or
+    backdated entries for months without a partition) are rolled up too.
+    Returns {partition name: rows rolled up}."""
+    dropped = {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("WITH expired AS ("
+                                "DELETE FROM history_default WHERE timestamp < %s "
+                                "RETURNING board_id, user_id, timestamp), "
+                                "rolled AS ({}) SELECT COUNT(*) FROM expired")
+                        .format(sql.SQL(ROLLUP_SQL).format(sql.Identifier('expired'))), (cutoff,))
+            n = cur.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if n:
+        dropped['history_default'] = n
+    for name, _, end in history_partitions(conn):
+        if datetime.combine(end, time()) > cutoff:
+            break
+        part = sql.Identifier(name)
+        try:
+            with conn.cursor() as cur:
+                # SHARE: a board restore can't add rows to it meanwhile
+                cur.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(part))
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(part))
+                n = cur.fetchone()[0]
+                cur.execute(sql.SQL(ROLLUP_SQL).format(part))
+                cur.execute(sql.SQL("ALTER TABLE history DETACH PARTITION {}").format(part))
+                cur.execute(sql.SQL("DROP TABLE {}").format(part))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        dropped[name] = n
+    return dropped
+
+
+# ---------- board archival ----------
+def inactive_boards(conn, cutoff, limit=100):
+    """Ids of unarchived boards not opened since `cutoff` and without
+    history since then, least recently opened first."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT b.id FROM boards b
+            WHERE b.archived_at IS NULL AND b.last_opened_at < %s
+              AND NOT EXISTS (SELECT 1 FROM history h WHERE h.board_id = b.id AND h.timestamp >= %s)
+            ORDER BY b.last_opened_at
+            LIMIT %s
+        """, (cutoff, cutoff, limit))
+        ids = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    return ids
+
+
+def archive_board(conn, board_id, cutoff=None):
+    """Move a board's tasks and history into board_archives and mark it
+    archived, in the caller's transaction. With `cutoff`, only if it is still
+    inactive (see inactive_boards). Returns (tasks, history entries) moved,
+    or None if the board was skipped.
+
+    task_seq is left alone: a restore brings back the same rows with the
+    same versions, so fragments cached before the archive stay correct.
+    """
+    with conn.cursor() as cur:
+        # the row lock also makes task writes (bump_task_seq) wait for us
+        cur.execute("""
+            SELECT 1 FROM boards b
+            WHERE b.id = %(board)s AND b.archived_at IS NULL
+              AND (%(cutoff)s::timestamp IS NULL OR (
+                   b.last_opened_at < %(cutoff)s
+                   AND NOT EXISTS (SELECT 1 FROM history h
+                                   WHERE h.board_id = b.id AND h.timestamp >= %(cutoff)s)))
+            FOR UPDATE
+        """, {'board': board_id, 'cutoff': cutoff})
+        if cur.fetchone() is None:
+            return None
+        cur.execute("""
+            INSERT INTO board_archives (board_id, task_count, history_count, tasks, history)
+            SELECT %(board)s, t.n, h.n, t.rows, h.rows
+            FROM (SELECT COUNT(*) AS n,
+                         COALESCE(jsonb_agg(to_jsonb(t) - 'search_vector' ORDER BY t.id), '[]') AS rows
+                  FROM tasks t WHERE t.board_id = %(board)s) t,
+                 (SELECT COUNT(*) AS n,
+                         COALESCE(jsonb_agg(to_jsonb(h) ORDER BY h.timestamp, h.id), '[]') AS rows
+                  FROM history h WHERE h.board_id = %(board)s) h
+            RETURNING task_count, history_count
+        """, {'board': board_id})
+        moved = cur.fetchone()
+        cur.execute("DELETE FROM tasks WHERE board_id = %s", (board_id,))
+        cur.execute("DELETE FROM history WHERE board_id = %s", (board_id,))
+        cur.execute("UPDATE boards SET archived_at = CURRENT_TIMESTAMP WHERE id = %s", (board_id,))
+    return moved
+
+
+def restore_board(conn, board_id):
+    """Put an archived board's tasks and history back and clear its archived
+    mark, in the caller's transaction. Returns (tasks, history entries)
+    restored, or None if it wasn't archived (or another request restored it
+    first). Assignees and authors deleted in the meantime come back as NULL.
+    """
+    columns = sql.SQL(', ').join(map(sql.Identifier, ARCHIVED_TASK_COLUMNS))
+    restored_task = sql.SQL(', ').join(
+        sql.SQL('u.id') if c == 'assigned_to' else sql.SQL('r.{}').format(sql.Identifier(c))
+        for c in ARCHIVED_TASK_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("""
+            WITH a AS (
+                DELETE FROM board_archives WHERE board_id = %(board)s RETURNING tasks, history
+            ), t AS (
+                INSERT INTO tasks ({columns})
+                SELECT {restored_task}
+                FROM a, jsonb_populate_recordset(NULL::tasks, a.tasks) r
+                LEFT JOIN users u ON u.id = r.assigned_to
+                RETURNING 1
+            ), h AS (
+                INSERT INTO history (id, board_id, user_id, action, timestamp)
+                SELECT r.id, r.board_id, u.id, r.action, r.timestamp
+                FROM a, jsonb_populate_recordset(NULL::history, a.history) r
+                LEFT JOIN users u ON u.id = r.user_id
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM a), (SELECT COUNT(*) FROM t), (SELECT COUNT(*) FROM h)
+        """).format(columns=columns, restored_task=restored_task), {'board': board_id})
+        found, tasks, history = cur.fetchone()
+        if not found:
+            return None
+        cur.execute("UPDATE boards SET archived_at = NULL, last_opened_at = CURRENT_TIMESTAMP WHERE id = %s",
+                    (board_id,))
+    return tasks, history
+
+
+# ---------- task tombstones ----------
+def prune_task_tombstones(conn, keep_versions, batch=100):
+    """Delete the task_deletions rows more than `keep_versions` versions
+    behind their board's task_seq and move the boards' tombstone_seq up to
+    match, `batch` boards per transaction. Boards busy with a task write are
+    left for the next round. Returns how many tombstones were deleted."""
+    pruned = 0
+    while True:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    WITH b AS (
+                        SELECT id, task_seq - %(keep)s AS horizon FROM boards
+                        WHERE task_seq - %(keep)s > tombstone_seq
+                          AND EXISTS (SELECT 1 FROM task_deletions d
+                                      WHERE d.board_id = boards.id AND d.version <= task_seq - %(keep)s)
+                        ORDER BY id
+                        LIMIT %(batch)s
+                        FOR UPDATE SKIP LOCKED
+                    ), d AS (
+                        DELETE FROM task_deletions d USING b
+                        WHERE d.board_id = b.id AND d.version <= b.horizon
+                        RETURNING 1
+                    ), u AS (
+                        UPDATE boards SET tombstone_seq = b.horizon FROM b WHERE boards.id = b.id
+                        RETURNING 1
+                    )
+                    SELECT (SELECT COUNT(*) FROM u), (SELECT COUNT(*) FROM d)
+                """, {'keep': keep_versions, 'batch': batch})
+                boards, n = cur.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        pruned += n
+        if boards < batch:
+            return pruned
+
+
+# ---------- background maintenance ----------
+class Maintenance:
+    """Runs history partition upkeep, and optionally board archival, every
+    ``interval`` seconds in the background.
+
+    Each round creates the partitions for the next ``months_ahead`` months,
+    drops the ones older than ``retention_days`` (if set), and archives up to
+    ``archive_batch`` boards inactive for ``archive_days`` (if set), and
+    prunes task tombstones older than ``tombstone_versions`` (if set). With
+    several workers, an advisory lock lets one of them run a given round.
+    """
+
+    def __init__(self, pool, interval=3600.0, months_ahead=2, retention_days=None,
+                 archive_days=None, archive_batch=100, tombstone_versions=None, spawn=None):
+        self.pool = pool
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.retention_days = retention_days
+        self.archive_days = archive_days
+        self.archive_batch = archive_batch
+        self.tombstone_versions = tombstone_versions
+        self.spawn = spawn or self._spawn_thread
+        self._lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+        self.rounds = 0
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+        self.boards_archived = 0
+        self.tombstones_pruned = 0
+        self.failed = 0
+
+    @staticmethod
+    def _spawn_thread(target):
+        t = threading.Thread(target=target, name='history-maintenance', daemon=True)
+        t.start()
+        return t
+
+    def ensure_started(self):
+        if self._started or not self.interval:
+            return
+        with self._lock:
+            if not self._started:
+                self._started = True
+                self.spawn(self._run)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                self.failed += 1
+                log.exception('history maintenance failed')
+            self._stop.wait(self.interval)
+
+    def run_once(self, now=None):
+        """One round; returns what it did, or None if another worker holds the lock."""
+        now = now or datetime.now()
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (MAINTENANCE_LOCK_KEY,))
+                locked = cur.fetchone()[0]
+            conn.commit()
+            if not locked:
+                return None
+            try:
+                report = {'created': ensure_history_partitions(conn, self.months_ahead),
+                          'dropped': {}, 'archived': [], 'tombstones': 0}
+                if self.retention_days:
+                    cutoff = now - timedelta(days=self.retention_days)
+                    report['dropped'] = drop_expired_history_partitions(conn, cutoff)
+                if self.archive_days:
+                    cutoff = now - timedelta(days=self.archive_days)
+                    for board_id in inactive_boards(conn, cutoff, self.archive_batch):
+                        try:
+                            if archive_board(conn, board_id, cutoff) is not None:
+                                report['archived'].append(board_id)
+                            conn.commit()
+                        except Exception:
+                            conn.rollback()
+                            raise
+                if self.tombstone_versions:
+                    report['tombstones'] = prune_task_tombstones(conn, self.tombstone_versions)
+            finally:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK_KEY,))
+                conn.commit()
+        self.rounds += 1
+        self.partitions_created += len(report['created'])
+        self.partitions_dropped += len(report['dropped'])
+        self.boards_archived += len(report['archived'])
+        self.tombstones_pruned += report['tombstones']
+        return report
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'rounds': self.rounds,
+            'partitions_created': self.partitions_created,
+            'partitions_dropped': self.partitions_dropped,
+            'boards_archived': self.boards_archived,
+            'tombstones_pruned': self.tombstones_pruned,
+            'failed': self.failed,
+        }
@@ -0,0 +1,236 @@
+"""Static asset pipeline: vendored libraries, content-hashed names and
+precompressed copies.
+
+``flask --app app build-assets`` checks the third-party scripts in
+static/vendor/ (committed, with their sha256 in static/vendor/lock.json)
+and downloads any that are missing, refusing one whose hash isn't pinned
+in the lock. It then
+writes every .css/.js file under static/ to static/dist/ as
+``name.<hash>.ext``, with .gz and (when the ``brotli`` package is installed)
+.br copies, plus a manifest.json mapping logical names to hashed ones.
+
+Templates link files with ``asset_url('board.css')``. With a manifest that
+resolves to /assets/board.<hash>.css, which is served with a one-year
+immutable Cache-Control and the smallest encoding the browser accepts.
+Without one (a fresh checkout, or debug mode), plain /static URLs are used.
+There is no CDN fallback: a missing vendor file fails the build and (through
+Assets.check_vendor, called by wsgi.py) a production start.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import urllib.request
+
+from flask import current_app, request, send_from_directory, url_for
+
+# third-party scripts served from static/vendor/ instead of their CDNs
+VENDOR = {
+    'vendor/Sortable.min.js': 'https://cdn.jsdelivr.net/npm/sortablejs@1.15.0/Sortable.min.js',
+    'vendor/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+    'vendor/socket.io.min.js': 'https://cdn.socket.io/4.7.2/socket.io.min.js',
+}
+# committed sha256 of each vendored file; downloads and the files on disk
+# must match it, and only build-assets --pin-vendor adds or changes a pin
+VENDOR_LOCK = 'vendor/lock.json'
+BUILD_SUFFIXES = ('.css', '.js')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESS_MIN_BYTES = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_lock(static_dir):
+    lock_path = os.path.join(static_dir, VENDOR_LOCK)
+    if not os.path.exists(lock_path):
+        return {}
+    with open(lock_path) as f:
+        return json.load(f)
+
+
+def missing_vendor(static_dir):
+    """The VENDOR files not present under static_dir."""
+    return [name for name in VENDOR if not os.path.exists(os.path.join(static_dir, name))]
+
+
+def unverified_vendor(static_dir):
+    """The VENDOR files present under static_dir whose sha256 isn't the one
+    pinned for their URL in the lock file (including unpinned ones)."""
+    lock = _read_lock(static_dir)
+    bad = []
+    for name, url in VENDOR.items():
+        path = os.path.join(static_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            digest = _sha256(f.read())
+        if lock.get(name) != {'url': url, 'sha256': digest}:
+            bad.append(name)
+    return bad
+
+
+def fetch_vendor(static_dir, echo=print, timeout=30, pin=False):
+    """Download the VENDOR files that are missing and check them against the
+    lock file. A file without a pin for its URL is refused unless pin is
+    set, in which case its hash is recorded (review and commit the result).
+    Returns the names fetched."""
+    lock = _read_lock(static_dir)
+    fetched = []
+    for name, url in VENDOR.items():
+        path = os.path.join(static_dir, name)
+        if os.path.exists(path):
+            continue
+        pinned = lock.get(name, {})
+        if pinned.get('url') != url and not pin:
+            raise RuntimeError(f'{name}: {url} has no sha256 in {VENDOR_LOCK}; '
+                               'run build-assets --pin-vendor, review the file and commit static/vendor/')
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            data = resp.read()
+        digest = _sha256(data)
+        if pinned.get('url') == url and pinned['sha256'] != digest:
+            raise RuntimeError(f'{name}: {url} no longer matches the sha256 in {VENDOR_LOCK}')
+        _write_atomic(path, data)
+        lock[name] = {'url': url, 'sha256': digest}
+        fetched.append(name)
+        echo(f'vendored {name} ({len(data)} bytes) from {url}')
+    if fetched:
+        _write_atomic(os.path.join(static_dir, VENDOR_LOCK),
+                      (json.dumps(lock, indent=2, sort_keys=True) + '\n').encode())
+    return fetched
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    try:
+        import brotli   # optional; without it only .gz copies are written
+    except ImportError:
+        return
+    yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+def build(static_dir, echo=print, prune=False):
+    """Write hashed, precompressed copies of static/**/*.css|js to
+    static/dist/ and its manifest. Returns the manifest.
+
+    Files from earlier builds are kept (pages rendered before a deploy may
+    still reference them) unless prune=True.
+    """
+    dist = os.path.join(static_dir, DIST_DIR)
+    compressors = list(_compressors())
+    if not any(ext == '.br' for ext, _ in compressors):
+        echo('brotli not installed: writing .gz copies only')
+    manifest, written = {}, set()
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir):
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        for filename in sorted(files):
+            if not filename.endswith(BUILD_SUFFIXES):
+                continue
+            src = os.path.join(root, filename)
+            logical = os.path.relpath(src, static_dir).replace(os.sep, '/')
+            with open(src, 'rb') as f:
+                data = f.read()
+            stem, ext = os.path.splitext(logical)
+            hashed = f'{stem}.{_sha256(data)[:12]}{ext}'
+            manifest[logical] = hashed
+            out = os.path.join(dist, hashed)
+            written.add(hashed)
+            # content-addressed, so anything already written is current
+            sizes = []
+            if not os.path.exists(out):
+                _write_atomic(out, data)
+                sizes.append(f'{len(data)}')
+            if len(data) >= COMPRESS_MIN_BYTES:
+                for suffix, compress in compressors:
+                    if os.path.exists(out + suffix):
+                        continue
+                    packed = compress(data)
+                    if len(packed) < len(data):
+                        _write_atomic(out + suffix, packed)
+                        sizes.append(f'{suffix[1:]} {len(packed)}')
+            if sizes:
+                echo(f'{logical} -> {hashed} ({", ".join(sizes)} bytes)')
+    _write_atomic(os.path.join(dist, MANIFEST),
+                  (json.dumps(manifest, indent=2, sort_keys=True) + '\n').encode())
+    if prune:
+        for root, _, files in os.walk(dist):
+            for filename in files:
+                rel = os.path.relpath(os.path.join(root, filename), dist).replace(os.sep, '/')
+                base = rel[:-3] if rel.endswith(('.gz', '.br')) else rel
+                if rel != MANIFEST and base not in written:
+                    os.remove(os.path.join(root, filename))
+                    echo(f'pruned {rel}')
+    return manifest
+
+
+class Assets:
+    """Resolves logical asset names for templates and serves the build."""
+
+    def __init__(self, app=None, url_path='/assets'):
+        self.url_path = url_path
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_dir = app.static_folder
+        self.dist_dir = os.path.join(self.static_dir, DIST_DIR)
+        self.load_manifest()
+        app.add_url_rule(f'{self.url_path}/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+
+    def load_manifest(self):
+        path = os.path.join(self.dist_dir, MANIFEST)
+        try:
+            with open(path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def check_vendor(self):
+        """Raise RuntimeError if any VENDOR file is missing from static/ or
+        doesn't match its sha256 in the lock file."""
+        missing = missing_vendor(self.static_dir)
+        if missing:
+            raise RuntimeError(f"vendor files missing from {self.static_dir}: {', '.join(missing)}; "
+                               "run 'flask --app app build-assets' (and commit static/vendor/)")
+        unverified = unverified_vendor(self.static_dir)
+        if unverified:
+            raise RuntimeError(f"vendor files not matching {VENDOR_LOCK}: {', '.join(unverified)}")
+
+    def url(self, filename):
+        hashed = self.manifest.get(filename)
+        if hashed and not current_app.debug:
+            return url_for('assets', filename=hashed)
+        return url_for('static', filename=filename)
+
+    def serve(self, filename):
+        accepted = request.accept_encodings
+        encoding = None
+        for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+            if accepted[name] and os.path.isfile(os.path.join(self.dist_dir, filename + suffix)):
+                encoding = name
+                filename += suffix
+                break
+        mimetype = mimetypes.guess_type(filename[:-3] if encoding else filename)[0]
+        resp = send_from_directory(self.dist_dir, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            resp.headers['Content-Encoding'] = encoding
+        resp.headers['Vary'] = 'Accept-Encoding'
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
@@ -0,0 +1,210 @@
+"""Background writer for board history (audit) entries.
+
+Requests hand committed history entries to an AuditWriter instead of
+inserting them inline. A single background task drains the queue, writes a
+batch with one multi-row INSERT once it has ``max_batch`` entries or the
+oldest has waited ``flush_interval`` seconds, and then calls ``notify`` once
+with the set of boards that batch touched.
+
+Each entry carries the time it was submitted, so a batch written late (or
+retried) still records when the action happened. A batch that fails because
+the database or the pool is unavailable is kept and written again, with
+backoff, once it is back.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db import PoolTimeout
+
+log = logging.getLogger(__name__)
+
+# failures that say nothing about the entries themselves
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+
+class AuditWriter:
+    def __init__(self, pool, notify=None, spawn=None, max_batch=500, flush_interval=0.5,
+                 max_queue=10000, put_timeout=1.0, retry_delay=0.5, max_retry_delay=30.0,
+                 stop_retries=3):
+        """pool: db.ConnectionPool to write with.
+        notify: called with the set of board ids after each batch is written.
+        spawn: starts the drain loop in the background, e.g.
+        socketio.start_background_task; a daemon thread by default.
+        retry_delay, max_retry_delay: backoff between attempts at a batch
+        that failed on a transient error; once close() has been called a
+        batch gets stop_retries attempts.
+        """
+        self.pool = pool
+        self.notify = notify
+        self.spawn = spawn or self._spawn_thread
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stop_retries = stop_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+        self._stopped = threading.Event()
+        self.written = 0
+        self.batches = 0
+        self.inline_writes = 0   # entries written by the caller because the queue was full
+        self.retries = 0
+        self.failed = 0
+
+    @staticmethod
+    def _spawn_thread(target):
+        t = threading.Thread(target=target, name='audit-writer', daemon=True)
+        t.start()
+        return t
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if not self._started:
+                self._started = True
+                self.spawn(self._run)
+
+    def submit(self, board_id, user_id, action, at=None, conn=None):
+        """Queue one entry that happened at ``at`` (now by default).
+
+        When the queue stays full for put_timeout seconds the caller writes
+        the entry itself, so a stalled writer slows producers down instead of
+        losing history or growing memory. Callers that hold a connection
+        pass it as ``conn`` and the entry is written on it, committed, rather
+        than on a second connection from the pool (which, with every request
+        doing the same, may never come free).
+        """
+        entry = (board_id, user_id, action, at or datetime.now(timezone.utc))
+        if not self._stopping:
+            self._ensure_started()
+            try:
+                self._queue.put(entry, timeout=self.put_timeout)
+                return
+            except queue.Full:
+                self.inline_writes += 1
+        if conn is None:
+            self._done(self._flush([entry]))
+            return
+        try:
+            self._insert(conn, [entry])
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            self.failed += 1
+            log.exception('dropped a history entry for board %s', board_id)
+            return
+        self._done([entry])
+
+    def _run(self):
+        try:
+            while not (self._stopping and self._queue.empty()):
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        # wait for more until the deadline, then only take what's already queued
+                        if remaining > 0:
+                            batch.append(self._queue.get(timeout=remaining))
+                        else:
+                            batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._done(self._flush(batch))
+        finally:
+            self._stopped.set()
+
+    @staticmethod
+    def _insert(conn, batch):
+        with conn.cursor() as cur:
+            # entries for a board deleted since they were queued are dropped
+            # here rather than failing the whole batch on the FK; a deleted
+            # author becomes NULL as ON DELETE SET NULL would have made it
+            execute_values(cur, """
+                INSERT INTO history (board_id, user_id, action, timestamp)
+                SELECT e.board_id, u.id, e.action, e.at
+                FROM (VALUES %s) AS e (board_id, user_id, action, at)
+                JOIN boards b ON b.id = e.board_id
+                LEFT JOIN users u ON u.id = e.user_id
+            """, batch, template='(%s::int, %s::int, %s::text, %s::timestamptz)', page_size=len(batch))
+        conn.commit()
+
+    def _flush(self, batch):
+        """Write batch with a pooled connection and return the entries
+        written. Transient failures are retried with backoff, holding the
+        batch meanwhile; any other failure is retried entry by entry, so only
+        the entries the database rejects are lost."""
+        delay = self.retry_delay
+        attempts = 0
+        while True:
+            try:
+                with self.pool.connection() as conn:
+                    self._insert(conn, batch)
+                return batch
+            except TRANSIENT_ERRORS as e:
+                attempts += 1
+                if self._stopping and attempts >= self.stop_retries:
+                    self.failed += len(batch)
+                    log.error('dropped %d history entries: %s', len(batch), e)
+                    return []
+                self.retries += 1
+                log.warning('writing %d history entries failed, retrying in %.1fs: %s', len(batch), delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+            except Exception:
+                if len(batch) == 1:
+                    self.failed += 1
+                    log.exception('dropped history entry %r', batch[0])
+                    return []
+                return [entry for one in batch for entry in self._flush([one])]
+
+    def _done(self, written):
+        if not written:
+            return
+        self.written += len(written)
+        self.batches += 1
+        if self.notify:
+            try:
+                self.notify({entry[0] for entry in written})
+            except Exception:
+                log.exception('history notification failed')
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the background task (used at exit)."""
+        self._stopping = True
+        if self._started:
+            self._stopped.wait(timeout)
+        # anything the loop didn't get to (never started, or timed out)
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._done(self._flush(leftover))
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'inline_writes': self.inline_writes,
+            'retries': self.retries,
+            'failed': self.failed,
+        }
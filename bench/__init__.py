@@ -0,0 +1 @@
+"""Load and latency benchmarks for NexusBoard; see bench/run.py."""
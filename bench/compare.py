@@ -0,0 +1,77 @@
+"""Compare two bench.run result files.
+
+    python -m bench.compare before.json after.json [--fail-over 10]
+
+Prints each scenario's latency percentiles, throughput and queries per
+request side by side with the relative change. With --fail-over, exits 1
+when any p95, or the fan-out p95, got worse by more than that percentage.
+"""
+import argparse
+import json
+import sys
+
+METRICS = [
+    ('p50 ms', lambda r: r['latency_ms']['p50'], False),
+    ('p95 ms', lambda r: r['latency_ms']['p95'], False),
+    ('p99 ms', lambda r: r['latency_ms']['p99'], False),
+    ('req/s', lambda r: r.get('throughput_rps'), True),
+    ('queries/req', lambda r: r.get('queries_per_request'), False),
+    ('throttled', lambda r: r.get('throttled'), False),
+]
+
+
+def change(old, new, higher_is_better):
+    """Relative change in percent, signed so that positive means worse."""
+    if old in (None, 0) or new is None:
+        return None
+    pct = (new - old) / old * 100
+    return (-pct if higher_is_better else pct) + 0.0   # no -0.0
+
+
+def fmt(v):
+    return '-' if v is None else f'{v:g}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--fail-over', type=float, default=None, metavar='PCT',
+                        help='exit 1 if a p95 regressed by more than PCT percent')
+    args = parser.parse_args(argv)
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    rows = []
+    for name in before['scenarios']:
+        if name in after['scenarios']:
+            rows.append((name, before['scenarios'][name], after['scenarios'][name]))
+    fan_old, fan_new = before.get('socket_fanout') or {}, after.get('socket_fanout') or {}
+    if 'latency_ms' in fan_old and 'latency_ms' in fan_new:
+        rows.append(('socket_fanout', fan_old, fan_new))
+
+    print(f"{'scenario':<20}{'metric':<13}{'before':>12}{'after':>12}{'change':>10}")
+    regressions = []
+    for name, old, new in rows:
+        for label, get, higher_is_better in METRICS:
+            try:
+                a, b = get(old), get(new)
+            except KeyError:
+                continue
+            if a is None and b is None:
+                continue
+            worse = change(a, b, higher_is_better)
+            shown = '' if worse is None else f'{worse:+.1f}%'
+            print(f'{name:<20}{label:<13}{fmt(a):>12}{fmt(b):>12}{shown:>10}')
+            if (label == 'p95 ms' and args.fail_over is not None and worse is not None
+                    and worse > args.fail_over):
+                regressions.append(f'{name} p95 {fmt(a)} -> {fmt(b)} ms')
+    if regressions:
+        print('\nregressed: ' + '; '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Micro-benchmark for dal.py's prepared statements and namedtuple rows.
+
+    python -m bench.queries [--tasks 5000] [--repeat 50] [--out queries.json]
+
+Seeds one tagged board through the same DB_* environment variables as
+app.py, then runs each of dal's page queries three ways on one connection:
+
+    dicts     plain statement, RealDictCursor rows (what the routes did
+              before dal.py)
+    tuples    plain statement, namedtuple rows
+    prepared  EXECUTE of the prepared statement, namedtuple rows (dal as
+              the app runs it)
+
+It reports median and p95 latency per call. It also reports the memory the
+result holds and the peak while it is built, measured with tracemalloc in
+a separate, untimed run. The seeded data is removed again unless you pass
+--keep.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from psycopg2.extras import RealDictCursor
+
+import dal
+from bench import seed as seeding
+from bench.run import connect, percentile
+
+VARIANTS = ('dicts', 'tuples', 'prepared')
+
+
+def cases(board_id, owner_id, task_id):
+    """(name, dal.Query, params) for the queries the pages run."""
+    return [
+        ('board', dal.BOARD, (board_id,)),
+        ('board_members', dal.BOARD_MEMBERS, (board_id,)),
+        ('board_tasks', dal.BOARD_TASKS[False, False], (board_id,)),
+        ('board_tasks_search', dal.BOARD_TASKS[True, False], (board_id, 'fix')),
+        ('task', dal.TASK, (task_id,)),
+        ('dashboard', dal.DASHBOARD_BOARDS, (owner_id,)),
+        ('member_stats', dal.MEMBER_STATS, (board_id,)),
+        ('history_page', dal.HISTORY_PAGES[False, False], (board_id, 51)),
+    ]
+
+
+def run_query(conn, variant, query, params):
+    if variant == 'dicts':
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query._plain, {f'p{i}': v for i, v in enumerate(params, 1)})
+            return cur.fetchall()
+    dal.PREPARED_STATEMENTS = variant == 'prepared'
+    return query.all(conn, *params)
+
+
+def measure(conn, variant, query, params, repeat):
+    run_query(conn, variant, query, params)   # warm up (and PREPARE)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run_query(conn, variant, query, params)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        rows = run_query(conn, variant, query, params)
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'rows': len(rows),
+        'median_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'result_bytes': held - base,
+        'peak_bytes': peak - base,
+    }
+
+
+def pct(old, new):
+    return f'{(new - old) / old * 100:+.0f}%' if old else '-'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--out', help='also write results JSON here')
+    parser.add_argument('--tag', default=None, help='data tag (default: random); at most 12 characters')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the data')
+    parser.add_argument('--members', type=int, default=10, help='members of the board')
+    parser.add_argument('--tasks', type=int, default=5000, help='tasks on the board')
+    parser.add_argument('--history', type=int, default=1000, help='history rows on the board')
+    parser.add_argument('--repeat', type=int, default=50, help='timed calls per query and variant')
+    parser.add_argument('--keep', action='store_true', help="don't delete the seeded data afterwards")
+    args = parser.parse_args(argv)
+    tag = args.tag or f'{random.randrange(16 ** 8):08x}'
+    if len(tag) > 12:
+        parser.error('--tag must be at most 12 characters')
+
+    conn = connect()
+    log = lambda msg: print(msg, file=sys.stderr, flush=True)
+    log(f'seeding tag {tag}: one board, {args.tasks} tasks / {args.history} history rows')
+    data = seeding.seed(conn, tag, users=args.members, boards=1, members=args.members,
+                        tasks=args.tasks, history=args.history, seed=args.seed)
+    board = data['boards'][0]
+    conn.autocommit = True
+    results = {}
+    try:
+        for name, query, params in cases(board['id'], board['owner'], board['tasks'][0]):
+            log(f'running {name}')
+            results[name] = {variant: measure(conn, variant, query, params, args.repeat)
+                             for variant in VARIANTS}
+    finally:
+        dal.PREPARED_STATEMENTS = True
+        conn.autocommit = False
+        if not args.keep:
+            seeding.drop(conn, tag)
+        conn.close()
+
+    print(f"{'query':<20}{'rows':>6}" + ''.join(f'{v + " ms":>13}' for v in VARIANTS)
+          + f"{'latency':>9}{'dicts KiB':>11}{'tuples KiB':>12}{'memory':>8}")
+    for name, r in results.items():
+        d, t, p = (r[v] for v in VARIANTS)
+        print(f"{name:<20}{d['rows']:>6}" + ''.join(f"{r[v]['median_ms']:>13.3f}" for v in VARIANTS)
+              + f"{pct(d['median_ms'], p['median_ms']):>9}"
+              + f"{d['result_bytes'] / 1024:>11.1f}{p['result_bytes'] / 1024:>12.1f}"
+              + f"{pct(d['result_bytes'], p['result_bytes']):>8}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'tag': tag, 'scale': {k: getattr(args, k) for k in ('members', 'tasks', 'history')},
+                                'repeat': args.repeat, 'queries': results}, indent=2) + '\n')
+        log(f'results written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
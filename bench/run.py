@@ -0,0 +1,433 @@
+"""Load and latency benchmark for NexusBoard.
+
+Start the app against a database (``python app.py``, or gunicorn with
+wsgi.py), then from the project directory:
+
+    python -m bench.run --url http://127.0.0.1:5000 --out before.json
+    python -m bench.run --url http://127.0.0.1:5000 --out after.json
+    python -m bench.compare before.json after.json
+
+Each run seeds its own tagged users/boards/tasks/history through the DB_*
+environment variables the app uses, drives every scenario with concurrent
+clients, measures task_update delivery to the members of one board's room,
+and removes its data again (--keep to leave it). Queries per request come
+from pg_stat_statements when the extension is installed in the database.
+Otherwise they come from the server's own /metrics statement counts, which
+cover a single worker and only statements issued on the request path
+(METRICS_TOKEN is sent if set). With neither available they are null.
+
+Start the server with RATE_LIMIT_USER_RATE=0 RATE_LIMIT_BOARD_RATE=0
+RATE_LIMIT_SOCKET_RATE=0, or let the bench start it with them
+(``--server "gunicorn ... wsgi:app"``): with the default limits most of a run's
+writes would be turned away. Requests that are turned away anyway (a 429, or
+a form redirect marked X-RateLimited) are counted as throttled and left out
+of the latencies.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+import requests
+
+from bench import seed as seeding
+
+SCENARIOS = ['login', 'dashboard', 'board_view', 'add_task', 'edit_task',
+             'update_task_order', 'board_history']
+# what --server starts the app with: rate limits off, or most writes from a
+# run's concurrent clients are turned away rather than served
+SERVER_ENV = {'RATE_LIMIT_USER_RATE': '0', 'RATE_LIMIT_BOARD_RATE': '0', 'RATE_LIMIT_SOCKET_RATE': '0'}
+
+
+def connect():
+    """A connection with the same DB_* settings as app.py."""
+    return psycopg2.connect(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        database=os.environ.get('DB_NAME', 'nexusboard'),
+        user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASS', 'Abhi2002'),
+        port=os.environ.get('DB_PORT', '5432'),
+    )
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    k = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values) + 0.5)) - 1))
+    return values[k]
+
+
+def latency_summary(samples):
+    samples = sorted(samples)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        'p50': ms(percentile(samples, 50)),
+        'p95': ms(percentile(samples, 95)),
+        'p99': ms(percentile(samples, 99)),
+        'mean': ms(sum(samples) / len(samples)) if samples else None,
+        'max': ms(samples[-1]) if samples else None,
+    }
+
+
+class QueryCounter:
+    """Statements executed in the benchmark database, via pg_stat_statements
+    or, failing that, the app's /metrics endpoint."""
+
+    def __init__(self, conn, url):
+        self.conn = conn
+        self.url = url
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            self.available = cur.fetchone() is not None
+        conn.rollback()
+        self.source = 'pg_stat_statements' if self.available else None
+        if not self.available and self._from_metrics() is not None:
+            self.available, self.source = True, 'metrics'
+
+    def _from_metrics(self):
+        text = metrics_text(self.url)
+        if text is None:
+            return None
+        return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+                   if line.startswith('nexusboard_request_queries_sum'))
+
+    def total(self):
+        if not self.available:
+            return None
+        if self.source == 'metrics':
+            return self._from_metrics()
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COALESCE(SUM(calls), 0) FROM pg_stat_statements
+                    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                """)
+                total = int(cur.fetchone()[0])
+            self.conn.rollback()
+            return total
+        except psycopg2.Error:   # e.g. not in shared_preload_libraries
+            self.conn.rollback()
+            self.available = self._from_metrics() is not None
+            self.source = 'metrics' if self.available else None
+            return None
+
+
+class Client:
+    """One simulated user: a logged-in HTTP session on one of their boards."""
+
+    def __init__(self, base, email, board, rng):
+        self.base = base.rstrip('/')
+        self.email = email
+        self.board = board
+        self.rng = rng
+        self.http = requests.Session()
+
+    def login(self):
+        return self.http.post(self.base + '/login', allow_redirects=False,
+                              data={'email': self.email, 'password': seeding.PASSWORD})
+
+    def request(self, scenario):
+        board_id = self.board['id']
+        tasks = self.board['tasks']
+        if scenario == 'login':
+            return self.login()
+        if scenario == 'dashboard':
+            return self.http.get(self.base + '/dashboard')
+        if scenario == 'board_view':
+            return self.http.get(f'{self.base}/board/{board_id}')
+        if scenario == 'add_task':
+            return self.http.post(f'{self.base}/add_task/{board_id}', allow_redirects=False, data={
+                'name': f'bench task {self.rng.randrange(10**6)}', 'description': 'load test',
+                'progress_percent': self.rng.randint(0, 100)})
+        if scenario == 'edit_task':
+            return self.http.post(f'{self.base}/edit_task/{self.rng.choice(tasks)}', allow_redirects=False, data={
+                'name': f'bench edit {self.rng.randrange(10**6)}', 'description': 'load test',
+                'comments': '', 'progress_percent': self.rng.randint(0, 100)})
+        if scenario == 'update_task_order':
+            i = self.rng.randrange(len(tasks) - 2)
+            # drop a card between two neighbours from the seeded order
+            return self.http.post(f'{self.base}/update_task_order/{board_id}', json={
+                'task_id': tasks[i + 2], 'prev_id': tasks[i], 'next_id': tasks[i + 1]})
+        if scenario == 'board_history':
+            return self.http.get(f'{self.base}/history/{board_id}')
+        raise ValueError(scenario)
+
+
+def throttled(resp):
+    """Whether the server turned the request away (rate limits, login
+    throttling, DB work slots) instead of serving it. Page forms get a
+    redirect marked X-RateLimited rather than a 429."""
+    return resp.status_code == 429 or 'X-RateLimited' in resp.headers
+
+
+def run_scenario(scenario, clients, requests_per_client, counter):
+    """Every client issues its requests back to back, all clients at once.
+    Requests the server turned away are counted under `throttled` and left
+    out of the latencies and throughput."""
+    latencies, errors, turned_away = [], [], []
+    lock = threading.Lock()
+
+    def worker(client):
+        mine, failed, limited = [], 0, 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                resp = client.request(scenario)
+            except requests.RequestException:
+                resp = None
+            elapsed = time.perf_counter() - start
+            if resp is not None and throttled(resp):
+                limited += 1
+                continue
+            mine.append(elapsed)
+            if resp is None or resp.status_code >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+            turned_away.append(limited)
+
+    before = counter.total()
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    after = counter.total()
+
+    total = len(latencies)
+    sent = total + sum(turned_away)
+    queries = None
+    if before is not None and after is not None and sent:
+        # a pg_stat_statements "after" snapshot counts the "before" one;
+        # the /metrics scrape is itself a request without queries
+        own = 1 if counter.source == 'pg_stat_statements' else 0
+        queries = round((after - before - own) / sent, 2)
+    return {
+        'requests': total,
+        'errors': sum(errors),
+        'throttled': sum(turned_away),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+        'latency_ms': latency_summary(latencies),
+        'queries_per_request': queries,
+    }
+
+
+def socket_fanout(base, board, emails_by_id, listeners, rounds, timeout=5.0):
+    """Time from starting an add_task request to task_update arriving at each
+    of `listeners` sockets in the board's room."""
+    try:
+        import socketio
+    except ImportError:
+        return {'skipped': 'python-socketio client not installed (pip install -r bench/requirements.txt)'}
+
+    members = board['members']
+    sockets, received = [], []
+    for i in range(listeners):
+        client = Client(base, emails_by_id[members[i % len(members)]], board, random.Random(i))
+        client.login()
+        cookie = '; '.join(f'{k}={v}' for k, v in client.http.cookies.items())
+        slot = {'event': threading.Event(), 'at': None}
+        sio = socketio.Client(reconnection=False)
+
+        def on_task_update(data, slot=slot):
+            if data.get('board_id') == board['id'] and not slot['event'].is_set():
+                slot['at'] = time.perf_counter()
+                slot['event'].set()
+
+        sio.on('task_update', on_task_update)
+        sio.connect(base, headers={'Cookie': cookie}, transports=['websocket'], wait_timeout=timeout)
+        sio.emit('join_board', {'board_id': board['id']})
+        sockets.append(sio)
+        received.append(slot)
+    time.sleep(0.5)   # let the joins land before the first emit
+
+    driver = Client(base, emails_by_id[board['owner']], board, random.Random(0))
+    driver.login()
+    latencies, missed = [], 0
+    try:
+        for _ in range(rounds):
+            for slot in received:
+                slot['event'].clear()
+                slot['at'] = None
+            start = time.perf_counter()
+            driver.request('add_task')
+            deadline = start + timeout
+            for slot in received:
+                if slot['event'].wait(max(0.0, deadline - time.perf_counter())):
+                    latencies.append(slot['at'] - start)
+                else:
+                    missed += 1
+    finally:
+        for sio in sockets:
+            sio.disconnect()
+    return {
+        'listeners': listeners,
+        'rounds': rounds,
+        'deliveries': len(latencies),
+        'missed': missed,
+        'latency_ms': latency_summary(latencies),
+    }
+
+
+def metrics_text(url):
+    """The server's /metrics page, or None if it can't be read."""
+    token = os.environ.get('METRICS_TOKEN')
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    try:
+        resp = requests.get(url.rstrip('/') + '/metrics', headers=headers, timeout=5)
+    except requests.RequestException:
+        return None
+    return resp.text if resp.status_code == 200 else None
+
+
+def rate_limit_scopes(url):
+    """The token buckets (user, board, socket) the server has turned on,
+    from its nexusboard_admission gauge; None if /metrics can't be read."""
+    text = metrics_text(url)
+    if text is None:
+        return None
+    return sorted(set(re.findall(r'^nexusboard_admission\{scope="(\w+)"', text, re.M)) - {'db_work'})
+
+
+def start_server(command, url, timeout=30.0):
+    """Run the server under test with SERVER_ENV and wait until it answers."""
+    proc = subprocess.Popen(shlex.split(command), env={**os.environ, **SERVER_ENV})
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f'server exited with status {proc.returncode}')
+        try:
+            requests.get(url.rstrip('/') + '/login', timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f'server did not answer on {url} within {timeout:g}s')
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='running NexusBoard server')
+    parser.add_argument('--server', metavar='COMMAND',
+                        help='start the server with this command (rate limits off) and stop it afterwards')
+    parser.add_argument('--out', help='write results JSON here (default: stdout)')
+    parser.add_argument('--tag', default=None, help='data tag (default: random); at most 12 characters')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and requests')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--boards', type=int, default=10)
+    parser.add_argument('--members', type=int, default=10, help='members per board')
+    parser.add_argument('--tasks', type=int, default=1000, help='tasks per board')
+    parser.add_argument('--history', type=int, default=1000, help='history rows per board')
+    parser.add_argument('--concurrency', type=int, default=10, help='simulated clients per scenario')
+    parser.add_argument('--requests', type=int, default=50, help='requests per client per scenario')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--listeners', type=int, default=50, help='sockets in the fan-out room (0 to skip)')
+    parser.add_argument('--rounds', type=int, default=20, help='task_update emits to time')
+    parser.add_argument('--keep', action='store_true', help="don't delete the seeded data afterwards")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenario(s): ' + ', '.join(sorted(unknown)))
+    tag = args.tag or f'{random.randrange(16 ** 8):08x}'
+    if len(tag) > 12:
+        parser.error('--tag must be at most 12 characters')
+
+    log = lambda msg: print(msg, file=sys.stderr, flush=True)
+    server = start_server(args.server, args.url) if args.server else None
+    limited = rate_limit_scopes(args.url)
+    if limited:
+        log(f"warning: the server rate-limits per {', '.join(limited)}; start it with "
+            f"{' '.join(f'{k}=0' for k in SERVER_ENV)} (or use --server). Turned away "
+            "requests are reported as throttled, not timed.")
+    conn = connect()
+    log(f'seeding tag {tag}: {args.users} users, {args.boards} boards x '
+        f'{args.tasks} tasks / {args.history} history rows')
+    t0 = time.perf_counter()
+    data = seeding.seed(conn, tag, users=args.users, boards=args.boards, members=args.members,
+                        tasks=args.tasks, history=args.history, seed=args.seed)
+    seed_seconds = time.perf_counter() - t0
+    emails_by_id = dict(data['users'])
+    counter = QueryCounter(conn, args.url)
+    try:
+        # each client is a member of the board it works on
+        rng = random.Random(args.seed)
+        clients = []
+        for i in range(args.concurrency):
+            board = data['boards'][i % len(data['boards'])]
+            member = board['members'][(i // len(data['boards'])) % len(board['members'])]
+            client = Client(args.url, emails_by_id[member], board, random.Random(rng.random()))
+            if client.login().status_code >= 400:
+                raise SystemExit(f'login failed against {args.url}')
+            clients.append(client)
+
+        results = {}
+        for scenario in scenarios:
+            log(f'running {scenario}')
+            results[scenario] = run_scenario(scenario, clients, args.requests, counter)
+
+        fanout = None
+        if args.listeners:
+            log(f'timing task_update delivery to {args.listeners} sockets')
+            fanout = socket_fanout(args.url, data['boards'][0], emails_by_id, args.listeners, args.rounds)
+    finally:
+        if not args.keep:
+            seeding.drop(conn, tag)
+        conn.close()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'url': args.url,
+            'tag': tag,
+            'seed': args.seed,
+            'scale': {k: getattr(args, k) for k in ('users', 'boards', 'members', 'tasks', 'history')},
+            'concurrency': args.concurrency,
+            'requests_per_client': args.requests,
+            'seed_seconds': round(seed_seconds, 2),
+            'queries_counted_by': counter.source,
+            'rate_limits': limited,
+        },
+        'scenarios': results,
+        'socket_fanout': fanout,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        log(f'results written to {args.out}')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
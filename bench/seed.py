@@ -0,0 +1,100 @@
+"""Synthetic data for the benchmarks.
+
+Everything created here is tagged with the run tag in user emails and board
+codes so it can be removed again with ``drop(conn, tag)``. Data is
+deterministic for a given ``seed``.
+"""
+import random
+
+from psycopg2.extras import execute_values
+from werkzeug.security import generate_password_hash
+
+PASSWORD = 'bench-password'
+POSITION_STEP = 1024   # app.POSITION_STEP
+
+WORDS = ("login api bug fix deploy database migration report design review dashboard "
+         "socket chart performance cache index search user admin billing invoice payment "
+         "email notification mobile layout responsive header footer sidebar export import "
+         "backup restore security token session password reset onboarding analytics "
+         "metrics alert monitor queue worker release hotfix sprint planning retro").split()
+
+
+def _text(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def user_email(tag, i):
+    return f'bench-{tag}-{i}@example.com'
+
+
+def board_code(tag, i):
+    return f'BN{tag}-{i}'   # boards.board_code is VARCHAR(20); keep tags short
+
+
+def seed(conn, tag, users=50, boards=10, members=10, tasks=1000, history=1000, seed=1):
+    """Create users, boards (each with `members` members, the first being the
+    owner), `tasks` tasks and `history` history rows per board.
+
+    Returns {'users': [(id, email)], 'boards': [{'id', 'owner', 'members',
+    'tasks'}]} for the load generator.
+    """
+    rng = random.Random(seed)
+    members = min(members, users)
+    # one hash for everyone: hashing is deliberately slow and the login
+    # scenario still verifies it per request
+    pw_hash = generate_password_hash(PASSWORD)
+    with conn.cursor() as cur:
+        rows = execute_values(cur, """
+            INSERT INTO users (username, email, password_hash) VALUES %s RETURNING id, email
+        """, [(f'bench{i}', user_email(tag, i), pw_hash) for i in range(users)],
+            page_size=1000, fetch=True)
+        by_email = {email: uid for uid, email in rows}
+        user_ids = [by_email[user_email(tag, i)] for i in range(users)]
+
+        created = []
+        for b in range(boards):
+            board_members = [user_ids[(b * members + k) % users] for k in range(members)]
+            owner = board_members[0]
+            cur.execute("""
+                INSERT INTO boards (name, description, board_code, owner_id)
+                VALUES (%s, %s, %s, %s) RETURNING id
+            """, (f'Bench board {b}', _text(rng, 8), board_code(tag, b), owner))
+            board_id = cur.fetchone()[0]
+            execute_values(cur, "INSERT INTO user_boards (user_id, board_id) VALUES %s",
+                           [(uid, board_id) for uid in board_members])
+
+            task_rows = [(_text(rng, 3), _text(rng, 20), _text(rng, 6), board_id,
+                          rng.choice(board_members + [None]), rng.randint(0, 100),
+                          (i + 1) * POSITION_STEP) for i in range(tasks)]
+            task_ids = [r[0] for r in execute_values(cur, """
+                INSERT INTO tasks (name, description, comments, board_id, assigned_to,
+                                   progress_percent, position)
+                VALUES %s RETURNING id
+            """, task_rows, page_size=1000, fetch=True)]
+
+            execute_values(cur, """
+                INSERT INTO history (board_id, user_id, action, timestamp)
+                VALUES %s
+            """, [(board_id, rng.choice(board_members), f'Bench action {_text(rng, 3)}',
+                   f'-{i} minutes') for i in range(history)],
+                template="(%s, %s, %s, NOW() + %s::interval)", page_size=1000)
+            created.append({'id': board_id, 'owner': owner, 'members': board_members,
+                            'tasks': task_ids})
+    conn.commit()
+    return {'users': [(uid, user_email(tag, i)) for i, uid in enumerate(user_ids)],
+            'boards': created}
+
+
+def drop(conn, tag):
+    """Remove everything seed() created for this tag."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE email LIKE %s", (f'bench-{tag}-%',))
+        user_ids = [r[0] for r in cur.fetchall()]
+        if user_ids:
+            # users cascade to their boards (and those to tasks and history)
+            # and memberships; tasks.assigned_to has no ON DELETE action
+            cur.execute("DELETE FROM boards WHERE owner_id = ANY(%s)", (user_ids,))
+            cur.execute("UPDATE tasks SET assigned_to = NULL WHERE assigned_to = ANY(%s)", (user_ids,))
+            cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+    conn.commit()
+    return len(user_ids)
@@ -0,0 +1,258 @@
+"""Streaming bulk import and export of board tasks.
+
+Imports read CSV or JSON (a top-level array, or one object per line) from a
+file-like object a chunk at a time. Every record is validated and spooled to
+a temporary file (in memory while it is small, on disk after that) before
+anything is written, so a slow or bad upload never holds a transaction or a
+board's lock; the spool then feeds COPY through a file-like adapter. Exports turn a row iterator (a
+server-side cursor in app.py) into CSV or JSON text chunks for a streamed
+response.
+"""
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime
+
+# fields an import record may carry; only name is required
+IMPORT_FIELDS = ('name', 'description', 'comments', 'assigned_to', 'due_date', 'progress_percent')
+COPY_COLUMNS = ('name', 'description', 'comments', 'assigned_to', 'due_date', 'progress_percent',
+                'board_id', 'position', 'version')
+FORMATS = ('csv', 'json')
+
+
+class BulkImportError(ValueError):
+    """A record couldn't be imported; ``record`` is its 1-based number (the
+    CSV line number for CSV input)."""
+
+    def __init__(self, record, message):
+        super().__init__(f'record {record}: {message}')
+        self.record = record
+
+
+def detect_format(explicit=None, content_type=None, filename=None):
+    """'csv' or 'json' from an explicit choice, the file name or the content
+    type, in that order; None if none of them says."""
+    if explicit:
+        return explicit.lower() if explicit.lower() in FORMATS else None
+    if filename:
+        ext = filename.rsplit('.', 1)[-1].lower()
+        if ext == 'csv':
+            return 'csv'
+        if ext in ('json', 'jsonl', 'ndjson'):
+            return 'json'
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/json', 'application/x-ndjson', 'application/jsonl'):
+        return 'json'
+    return None
+
+
+def read_csv(text):
+    """(line number, record) for each data row of a CSV with a header row."""
+    reader = csv.DictReader(text)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_json(text, chunk_size=64 * 1024, max_record=1024 * 1024):
+    """(record number, record) for each object of a JSON array or of
+    newline/whitespace-separated JSON objects, decoded a chunk at a time.
+
+    A record that doesn't decode is only read further when it failed at the
+    end of what has been read so far (it may continue in the next chunk), and
+    only up to max_record characters; anything else is a BulkImportError.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, n, eof = '', 0, 0, False
+    while True:
+        # skip whatever separates values: whitespace, the array's [ , ]
+        while pos < len(buf) and buf[pos] in ' \t\r\n,[]﻿':
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            buf, pos = text.read(chunk_size), 0
+            eof = not buf
+            continue
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            # an unterminated string reports where the string starts
+            truncated = e.pos >= len(buf) - 16 or e.msg.startswith('Unterminated string')
+            if eof or not truncated:
+                raise BulkImportError(n + 1, f'invalid JSON ({e.msg})')
+            if len(buf) - pos > max_record:
+                raise BulkImportError(n + 1, f'record is longer than {max_record} characters')
+            more = text.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        if end == len(buf) and not eof and not isinstance(value, (dict, list)):
+            # a bare number/literal may continue in the next chunk
+            more = text.read(chunk_size)
+            if more:
+                buf, pos = buf[pos:] + more, 0
+                continue
+            eof = True
+        n += 1
+        if not isinstance(value, dict):
+            raise BulkImportError(n, 'expected a JSON object')
+        yield n, value
+        pos = end
+
+
+def _clean(record_no, record, resolve_user):
+    """A validated tuple of IMPORT_FIELDS values."""
+    name = str(record.get('name') or '').strip()
+    if not name:
+        raise BulkImportError(record_no, 'name is required')
+    if len(name) > 200:
+        raise BulkImportError(record_no, 'name is longer than 200 characters')
+    assigned = record.get('assigned_to')
+    assigned_id = None
+    if assigned not in (None, ''):
+        assigned_id = resolve_user(str(assigned).strip())
+        if assigned_id is None:
+            raise BulkImportError(record_no, f'assigned_to {assigned!r} is not a member of this board')
+    due = record.get('due_date')
+    due_at = None
+    if due not in (None, ''):
+        try:
+            due_at = datetime.fromisoformat(str(due).strip())
+        except ValueError:
+            raise BulkImportError(record_no, f'due_date {due!r} is not an ISO date')
+    progress = record.get('progress_percent')
+    try:
+        progress = int(progress) if progress not in (None, '') else 0
+    except (TypeError, ValueError):
+        raise BulkImportError(record_no, f'progress_percent {progress!r} is not a number')
+    if not 0 <= progress <= 100:
+        raise BulkImportError(record_no, 'progress_percent must be between 0 and 100')
+    return (name, str(record.get('description') or ''), str(record.get('comments') or ''),
+            assigned_id, due_at, progress)
+
+
+def spool_tasks(records, resolve_user, max_rows, max_memory=1024 * 1024):
+    """Validate every record and write the tasks, as CSV of IMPORT_FIELDS
+    values, to a temporary file kept in memory up to max_memory bytes.
+    Returns (the file, rewound; how many tasks it holds). Raises
+    BulkImportError on the first bad record."""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory, mode='w+', newline='', encoding='utf-8')
+    count = 0
+    try:
+        writer = csv.writer(spool, lineterminator='\n')
+        for record_no, record in records:
+            if count >= max_rows:
+                raise BulkImportError(record_no, f'more than {max_rows} tasks in one import')
+            writer.writerow(['' if v is None else v.isoformat() if isinstance(v, datetime) else v
+                             for v in _clean(record_no, record, resolve_user)])
+            count += 1
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, count
+
+
+def task_rows(spool, board_id, version, first_position, step):
+    """COPY_COLUMNS rows for the tasks spool_tasks() wrote, numbering
+    positions on the way."""
+    for i, row in enumerate(csv.reader(spool)):
+        yield row + [board_id, first_position + i * step, version]
+
+
+class RowStream(io.TextIOBase):
+    """Read-only file over an iterator of rows, encoded as COPY CSV on
+    demand, for cursor.copy_expert."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buf = ''
+        self._line = io.StringIO()
+        self._writer = csv.writer(self._line, lineterminator='\n')
+        self.count = 0
+        self.error = None   # what the row iterator raised, if anything
+
+    def readable(self):
+        return True
+
+    def _encode(self, row):
+        self._line.seek(0)
+        self._line.truncate()
+        self._writer.writerow(['' if v is None else (v.isoformat() if isinstance(v, (date, datetime)) else v)
+                               for v in row])
+        return self._line.getvalue()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) < size:
+            try:
+                row = next(self._rows, None)
+            except Exception as e:
+                self.error = e
+                raise
+            if row is None:
+                break
+            self.count += 1
+            self._buf += self._encode(row)
+        if size < 0:
+            out, self._buf = self._buf, ''
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+def copy_tasks(cur, rows):
+    """COPY the rows into tasks; returns how many were written.
+
+    Empty fields load as NULL (COPY CSV's default) except for the text
+    columns, where FORCE_NOT_NULL keeps them empty strings.
+    """
+    stream = RowStream(rows)
+    try:
+        cur.copy_expert(
+            f"COPY tasks ({', '.join(COPY_COLUMNS)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NOT_NULL (name, description, comments))",
+            stream)
+    except Exception:
+        # psycopg2 reports a failing read() as QueryCanceled; surface the
+        # validation error itself
+        if stream.error is not None:
+            raise stream.error from None
+        raise
+    return stream.count
+
+
+# ---------- export ----------
+def _export_value(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return v
+
+
+def stream_csv(columns, rows):
+    """CSV text chunks: a header, then one line per row (a sequence)."""
+    line = io.StringIO()
+    writer = csv.writer(line, lineterminator='\n')
+
+    def encode(values):
+        line.seek(0)
+        line.truncate()
+        writer.writerow(['' if v is None else _export_value(v) for v in values])
+        return line.getvalue()
+
+    yield encode(columns)
+    for row in rows:
+        yield encode(row)
+
+
+def stream_json(columns, rows):
+    """A JSON array of objects, one chunk per row."""
+    yield '['
+    first = True
+    for row in rows:
+        item = json.dumps({c: _export_value(v) for c, v in zip(columns, row)})
+        yield item if first else ',\n' + item
+        first = False
+    yield ']\n'
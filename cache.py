@@ -0,0 +1,192 @@
+"""In-process caches shared by the request handlers."""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire ``ttl`` seconds after
+    they were set. Use ``get(key, MISSING)`` when None is a cacheable value."""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value), least recent first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches; O(size), for rare bulk invalidations."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered HTML fragments bounded by total size.
+
+    Keys embed the version of whatever the fragment was rendered from, so
+    entries are never invalidated, only superseded and eventually evicted.
+    Values bigger than ``max_item_bytes`` are not stored at all, so one huge
+    board can't flush everything else.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_item_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or max_bytes // 8
+        self._data = OrderedDict()   # key -> (size, html), least recent first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.oversize = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_item_bytes:
+            self.oversize += 1
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._data[key] = (size, html)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def get_or_render(self, key, render):
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.set(key, html)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'size': len(self._data), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'oversize': self.oversize}
+
+
+class VersionClock:
+    """Per-key version tokens for conditional GETs (ETags), in process.
+
+    bump() stamps keys with the next tick of one shared clock, and keys that
+    were never bumped (or were evicted) report the highest tick evicted so
+    far. Tokens therefore never repeat for a key with different content,
+    even after eviction, and a random boot nonce keeps them from matching
+    ETags handed out before a restart. Only correct with a single worker;
+    use RedisVersionClock when several processes serve the same users.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._nonce = os.urandom(4).hex()
+        self._data = OrderedDict()   # key -> tick of its last bump, least recent first
+        self._clock = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def token(self, key):
+        with self._lock:
+            tick = self._data.get(key)
+            if tick is None:
+                tick = self._floor
+            else:
+                self._data.move_to_end(key)
+            return f'{self._nonce}.{tick}'
+
+    def bump(self, keys):
+        with self._lock:
+            for key in keys:
+                self._clock += 1
+                self._data[key] = self._clock
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                _, tick = self._data.popitem(last=False)
+                self._floor = max(self._floor, tick)
+
+
+class RedisVersionClock:
+    """VersionClock kept in Redis so every worker sees the same tokens.
+
+    Keys are plain counters under ``prefix``; an epoch key, regenerated if the
+    data is flushed, keeps old tokens from matching restarted counters.
+    """
+
+    def __init__(self, url, prefix='nexusboard:version:'):
+        import redis   # only needed when a shared cache is configured
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._epoch_key = prefix + 'epoch'
+
+    def token(self, key):
+        epoch, tick = self._redis.mget(self._epoch_key, f'{self.prefix}{key}')
+        if epoch is None:
+            self._redis.set(self._epoch_key, os.urandom(4).hex(), nx=True)
+            epoch = self._redis.get(self._epoch_key)
+        return f'{epoch.decode()}.{int(tick or 0)}'
+
+    def bump(self, keys):
+        pipe = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(f'{self.prefix}{key}')
+        pipe.execute()
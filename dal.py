@@ -0,0 +1,235 @@
+"""Data access for the pages nearly every visit hits: the board page, the
+dashboard, the task form, the performance panel and the history feed.
+
+Each query is a Query: SQL with $1, $2, ... placeholders plus the namedtuple
+its rows come back as. The first time a connection runs a query it is
+PREPAREd there, and after that only EXECUTEd, so Postgres parses and plans
+it once per connection rather than on every request. Rows are namedtuples
+instead of RealDictCursor dicts: one tuple per row sharing a class, where a
+dict carries its own hash table. Templates read them exactly as before
+(``t.name`` and ``t['name']`` both work in Jinja). Python code uses
+attributes, and ``row._asdict()`` where it needs a dict.
+
+Behind a pooler that hands each transaction a different server session
+(PgBouncer in transaction mode), set PREPARED_STATEMENTS = False and the
+same SQL is sent as plain statements.
+"""
+import re
+import weakref
+from collections import namedtuple
+
+PREPARED_STATEMENTS = True
+SEARCH_CONFIG = 'english'
+
+# the task fields clients see; tasks.search_vector stays server-side
+TASK_COLUMNS = """t.id, t.name, t.description, t.board_id, t.assigned_to, t.comments, t.due_date,
+                  t.created_at, t.position, t.progress_percent, t.version"""
+
+Board = namedtuple('Board', 'id name description board_code owner_id created_at task_seq meta_seq '
+                            'last_opened_at archived_at owner_name')
+Member = namedtuple('Member', 'id username')
+Task = namedtuple('Task', 'id name description board_id assigned_to comments due_date created_at '
+                          'position progress_percent version assigned_name')
+DashboardBoard = namedtuple('DashboardBoard', 'id name description board_code owner_id created_at '
+                                              'owner_name member_count task_count archived_at')
+ArchivedBoard = namedtuple('ArchivedBoard', 'id name archived_at task_count assigned_count')
+MemberStats = namedtuple('MemberStats', 'id username task_count avg_progress')
+HistoryEntry = namedtuple('HistoryEntry', 'id board_id user_id action timestamp username')
+
+# connection -> names of the statements prepared on it; entries go when the
+# pool drops the connection
+_prepared = weakref.WeakKeyDictionary()
+
+
+class Query:
+    """A named statement and its row type. all() and one() take the
+    connection and the $n parameters in order."""
+
+    def __init__(self, name, sql, row):
+        self.name = name
+        self.sql = sql
+        self.row = row
+        self.nparams = max(map(int, re.findall(r'\$(\d+)', sql)), default=0)
+        args = ', '.join(['%s'] * self.nparams)
+        self._execute = f'EXECUTE {name}({args})' if args else f'EXECUTE {name}'
+        self._plain = re.sub(r'\$(\d+)', r'%(p\1)s', sql.replace('%', '%%'))
+
+    def _run(self, cur, params):
+        if not PREPARED_STATEMENTS:
+            cur.execute(self._plain, {f'p{i}': v for i, v in enumerate(params, 1)})
+            return
+        names = _prepared.setdefault(cur.connection, set())
+        if self.name not in names:
+            # a prepared statement outlives the transaction, even a rolled
+            # back one, and lasts as long as the connection
+            cur.execute(f'PREPARE {self.name} AS {self.sql}')
+            names.add(self.name)
+        cur.execute(self._execute, params)
+
+    def all(self, conn, *params):
+        with conn.cursor() as cur:
+            self._run(cur, params)
+            return list(map(self.row._make, cur.fetchall()))
+
+    def one(self, conn, *params):
+        with conn.cursor() as cur:
+            self._run(cur, params)
+            row = cur.fetchone()
+        return self.row._make(row) if row is not None else None
+
+
+BOARD = Query('dal_board', """
+    SELECT b.id, b.name, b.description, b.board_code, b.owner_id, b.created_at, b.task_seq, b.meta_seq,
+           b.last_opened_at, b.archived_at, u.username
+    FROM boards b JOIN users u ON b.owner_id = u.id
+    WHERE b.id = $1
+""", Board)
+
+BOARD_MEMBERS = Query('dal_board_members', """
+    SELECT u.id, u.username
+    FROM users u
+    JOIN user_boards ub ON ub.user_id = u.id
+    WHERE ub.board_id = $1
+    ORDER BY u.username
+""", Member)
+
+
+def _board_tasks_sql(search, filter_user):
+    sql = f"""
+        SELECT {TASK_COLUMNS}, u.username
+        FROM tasks t
+        LEFT JOIN users u ON t.assigned_to = u.id
+        WHERE t.board_id = $1
+    """
+    n = 2
+    if search:
+        # same engine as /api/search; the grid keeps its board order
+        sql += f" AND t.search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', ${n})"
+        n += 1
+    if filter_user:
+        sql += f" AND t.assigned_to = ${n}"
+    return sql + " ORDER BY t.position ASC, t.id ASC"
+
+# one statement per combination of ?search= and ?filter=
+BOARD_TASKS = {(s, f): Query('dal_board_tasks' + '_search' * s + '_filter' * f, _board_tasks_sql(s, f), Task)
+               for s in (False, True) for f in (False, True)}
+
+TASK = Query('dal_task', f"""
+    SELECT {TASK_COLUMNS}, u.username
+    FROM tasks t
+    LEFT JOIN users u ON t.assigned_to = u.id
+    WHERE t.id = $1
+""", Task)
+
+# member and task counts come from user_boards and the maintained
+# board_member_stats, not from tasks; an archived board's from its archive
+_DASHBOARD_BOARD_SELECT = """
+    SELECT b.id, b.name, b.description, b.board_code, b.owner_id, b.created_at,
+           u.username,
+           (SELECT COUNT(*) FROM user_boards m WHERE m.board_id = b.id),
+           CASE WHEN b.archived_at IS NULL
+                THEN (SELECT COALESCE(SUM(s.task_count), 0) FROM board_member_stats s WHERE s.board_id = b.id)
+                ELSE (SELECT COALESCE(SUM(a.task_count), 0) FROM board_archives a WHERE a.board_id = b.id)
+           END,
+           b.archived_at
+    FROM boards b JOIN users u ON b.owner_id = u.id
+"""
+
+DASHBOARD_BOARDS = Query('dal_dashboard_boards', _DASHBOARD_BOARD_SELECT + """
+    WHERE b.id IN (SELECT id FROM boards WHERE owner_id = $1
+                   UNION SELECT board_id FROM user_boards WHERE user_id = $1)
+    ORDER BY b.created_at DESC
+""", DashboardBoard)
+
+DASHBOARD_BOARD = Query('dal_dashboard_board', _DASHBOARD_BOARD_SELECT + " WHERE b.id = $1", DashboardBoard)
+
+# the user's archived boards, with their task counts and how many of those
+# tasks are assigned to the user; these tasks are missing from search and My
+# Tasks until the board is restored
+ARCHIVED_BOARDS = Query('dal_archived_boards', """
+    SELECT b.id, b.name, b.archived_at, a.task_count,
+           (SELECT COUNT(*) FROM jsonb_array_elements(a.tasks) t WHERE (t->>'assigned_to')::int = $1)
+    FROM boards b JOIN board_archives a ON a.board_id = b.id
+    WHERE b.id IN (SELECT id FROM boards WHERE owner_id = $1
+                   UNION SELECT board_id FROM user_boards WHERE user_id = $1)
+    ORDER BY b.name, b.id
+""", ArchivedBoard)
+
+MEMBER_STATS = Query('dal_member_stats', """
+    SELECT u.id, u.username, COALESCE(s.task_count, 0),
+           COALESCE(s.progress_sum::float / NULLIF(s.task_count, 0), 0) AS avg_progress
+    FROM user_boards ub
+    JOIN users u ON u.id = ub.user_id
+    LEFT JOIN board_member_stats s ON s.board_id = ub.board_id AND s.user_id = ub.user_id
+    WHERE ub.board_id = $1
+    ORDER BY avg_progress DESC, u.username
+""", MemberStats)
+
+
+def _history_sql(before, after):
+    sql = """
+        SELECT h.id, h.board_id, h.user_id, h.action, h.timestamp, u.username
+        FROM history h
+        LEFT JOIN users u ON h.user_id = u.id
+        WHERE h.board_id = $1
+    """
+    n = 2
+    # the plain timestamp bounds let Postgres skip the months (partitions)
+    # outside the page; the row comparisons alone don't
+    if before:
+        sql += f" AND h.timestamp <= ${n} AND (h.timestamp, h.id) < (${n}, ${n + 1})"
+        n += 2
+    if after:
+        sql += f" AND h.timestamp >= ${n} AND (h.timestamp, h.id) > (${n}, ${n + 1})"
+        n += 2
+    return sql + f" ORDER BY h.timestamp DESC, h.id DESC LIMIT ${n}"
+
+HISTORY_PAGES = {(b, a): Query('dal_history' + '_before' * b + '_after' * a, _history_sql(b, a), HistoryEntry)
+                 for b in (False, True) for a in (False, True)}
+
+
+def board(conn, board_id):
+    """The board with its owner's name (owner_name), or None."""
+    return BOARD.one(conn, board_id)
+
+
+def board_members(conn, board_id):
+    return BOARD_MEMBERS.all(conn, board_id)
+
+
+def board_tasks(conn, board_id, search='', filter_user=''):
+    """The board's tasks in grid order, optionally searched/filtered."""
+    params = [board_id] + [p for p in (search, filter_user) if p]
+    return BOARD_TASKS[bool(search), bool(filter_user)].all(conn, *params)
+
+
+def task(conn, task_id):
+    return TASK.one(conn, task_id)
+
+
+def dashboard_boards(conn, user_id):
+    """Boards the user owns or belongs to, newest first, with member and
+    task counts."""
+    return DASHBOARD_BOARDS.all(conn, user_id)
+
+
+def dashboard_board(conn, board_id):
+    return DASHBOARD_BOARD.one(conn, board_id)
+
+
+def archived_boards(conn, user_id):
+    return ARCHIVED_BOARDS.all(conn, user_id)
+
+
+def member_stats(conn, board_id):
+    """Each member's task count and average progress, best first."""
+    return MEMBER_STATS.all(conn, board_id)
+
+
+def history_page(conn, board_id, before=None, after=None, limit=50):
+    """Up to `limit` entries, newest first, older than `before` or newer than
+    `after` ((timestamp, id) cursors). Returns (rows, more) where `more`
+    says entries beyond the page exist."""
+    params = [board_id, *(before or ()), *(after or ()), limit + 1]
+    rows = HISTORY_PAGES[bool(before), bool(after)].all(conn, *params)
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,319 @@
+"""PostgreSQL connection pooling for NexusBoard.
+
+app.py keeps one pooled connection per request (see get_db_conn there);
+this module only knows how to hand connections out and take them back, and
+(ReplicaRouter) which read replica, if any, may serve a read-only request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's wait timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe psycopg2 pool.
+
+    Unlike psycopg2.pool.ThreadedConnectionPool, callers wait (up to
+    ``timeout`` seconds) for a free connection instead of failing straight
+    away, and connections that sat idle for ``healthcheck_after`` seconds are
+    pinged before being handed out again.
+    """
+
+    def __init__(self, maxconn, timeout=5.0, healthcheck_after=30.0, **dsn):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._dsn = dsn
+        self._cond = threading.Condition()
+        self._idle = []          # [(conn, returned_at)], most recently used last
+        self._opened = 0         # connections alive, idle or checked out
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        return psycopg2.connect(**self._dsn)
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._opened < self.maxconn:
+                    conn, returned_at = None, None
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f'no database connection free after {self.timeout}s')
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            self._checkouts += 1
+
+        # connect / ping outside the lock so a slow server doesn't block other callers
+        try:
+            if conn is not None and not self._healthy(conn, returned_at):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        keep = not discard and not conn.closed
+        if not keep:
+            self._close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._opened -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection outside of a request (CLI commands, background jobs)."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max': self.maxconn,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+# ---------- read replicas ----------
+def parse_lsn(text):
+    """A WAL position like '16/B374D848' as an int, for comparisons."""
+    hi, _, lo = text.partition('/')
+    return (int(hi, 16) << 32) | int(lo, 16)
+
+
+# how far behind the primary a server is. A replica that has replayed all the
+# WAL it received while its WAL receiver is running is current (its last
+# replay timestamp only says when the primary last wrote). One without a
+# receiver is as stale as its last replay. (Only pg_read_all_stats may see
+# the receiver's status, but anyone sees whether it has a pid.) A server
+# that isn't in recovery is its own primary: that's the single-server stub
+# used for local testing.
+REPLICA_STATE_SQL = """
+    SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_insert_lsn() END::text,
+           CASE WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                     AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE pid IS NOT NULL) THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8,
+                              'Infinity')
+           END
+"""
+
+
+class Replica:
+    """A read replica's pool and what its last probe found."""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.checked_at = None     # monotonic time of the last probe; None = never probed
+        self.checking = False      # a request is probing it right now
+        self.up = False
+        self.lag = None            # seconds behind the primary
+        self.replay_lsn = 0        # WAL position it had replayed up to
+        self.error = None
+        self.reads = 0
+        self.probes = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """Hands out replica connections for read-only requests.
+
+    Replicas are probed lazily: the first request to find a replica's state
+    older than ``check_interval`` seconds runs REPLICA_STATE_SQL on the
+    connection it borrowed (other requests keep using the last result
+    meanwhile). A replica is used while it was reachable at the last probe
+    and at most ``max_lag`` seconds behind. One that failed is retried on the
+    next probe.
+
+    checkout(min_lsn) also skips replicas that haven't replayed the caller's
+    last write yet (re-probing rather than trusting a cached position), which
+    is what gives read-your-writes. When no replica qualifies it returns
+    (None, None) and the caller uses the primary.
+    """
+
+    def __init__(self, replicas=(), max_lag=5.0, check_interval=5.0):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next = 0
+        self.primary_reads = 0     # read-only requests no replica could take
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _usable(self, replica):
+        return replica.up and replica.lag <= self.max_lag
+
+    def _probe(self, replica, conn):
+        replica.probes += 1
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_STATE_SQL)
+            lsn, lag = cur.fetchone()
+        conn.rollback()
+        return parse_lsn(lsn), lag
+
+    def _mark_down(self, replica, error):
+        replica.up, replica.error = False, (str(error).strip().splitlines() or [''])[0]
+        replica.failures += 1
+
+    def checkout(self, min_lsn=0):
+        """(replica, connection) for a read-only request, or (None, None)."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.replicas), 1)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            with self._lock:
+                stale = (replica.checked_at is None
+                         or time.monotonic() - replica.checked_at >= self.check_interval)
+                probing = stale and not replica.checking
+                if probing:
+                    replica.checking = True
+                elif not self._usable(replica):
+                    continue
+            try:
+                conn = self._checkout_one(replica, probing or min_lsn > replica.replay_lsn, probing, min_lsn)
+            finally:
+                if probing:
+                    with self._lock:
+                        replica.checking = False
+            if conn is not None:
+                replica.reads += 1
+                return replica, conn
+        with self._lock:
+            self.primary_reads += 1
+        return None, None
+
+    def _checkout_one(self, replica, probe, probing, min_lsn):
+        try:
+            conn = replica.pool.getconn()
+        except PoolTimeout:
+            return None     # busy, not broken: leave its state alone
+        except psycopg2.Error as e:
+            self._mark_down(replica, e)
+            replica.checked_at = time.monotonic()
+            return None
+        if probe:
+            try:
+                replica.replay_lsn, replica.lag = self._probe(replica, conn)
+            except psycopg2.Error as e:
+                replica.pool.putconn(conn, discard=True)
+                self._mark_down(replica, e)
+                replica.checked_at = time.monotonic()
+                return None
+            replica.up, replica.error = True, None
+            if probing:
+                replica.checked_at = time.monotonic()
+            if not self._usable(replica) or min_lsn > replica.replay_lsn:
+                replica.pool.putconn(conn)
+                return None
+        return conn
+
+    def checkin(self, replica, conn):
+        if conn.closed:
+            # lost mid-request (server gone): stop routing to it until a probe
+            # succeeds, rather than for the rest of check_interval
+            with self._lock:
+                self._mark_down(replica, 'connection lost')
+                replica.checked_at = time.monotonic()
+        replica.pool.putconn(conn)
+
+    def probe(self, replica):
+        """Probe a replica now, outside the request path (CLI, startup)."""
+        conn = self._checkout_one(replica, True, True, 0)
+        if conn is not None:
+            replica.pool.putconn(conn)
+
+    def stats(self):
+        """{replica name: state and pool counters}."""
+        out = {}
+        for r in self.replicas:
+            out[r.name] = {
+                'up': int(r.up), 'lag_seconds': r.lag if r.lag is not None else -1,
+                'reads': r.reads, 'probes': r.probes, 'failures': r.failures,
+                **{f'pool_{k}': v for k, v in r.pool.stats().items()},
+            }
+        return out
+
+    def closeall(self):
+        for r in self.replicas:
+            r.pool.closeall()
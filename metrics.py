@@ -0,0 +1,385 @@
+"""Request, query and Socket.IO instrumentation with Prometheus text output.
+
+A small in-process registry (counters, histograms and callback gauges)
+rendered in the Prometheus text exposition format, plus the hooks app.py
+wires in: timed psycopg2 connections/cursors, per-request timing that can be
+returned as a Server-Timing header, and a wrapper around SocketIO.emit that
+records how many local sockets each emit reached.
+
+Numbers are per process; with several workers, scrape each one.
+"""
+import bisect
+import re
+import threading
+import time
+
+from psycopg2 import extensions
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _num(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_num(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = _labels(self.labelnames, labels, [('le', _num(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_num(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+class GaugeCallback:
+    """Gauges read at scrape time: collect() returns {label values: number}."""
+
+    def __init__(self, name, help, labelnames, collect):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_num(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(GaugeCallback(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+# literals in statement text: psycopg2 interpolates parameters client-side,
+# so what reaches execute() after mogrify (execute_values, cur.mogrify) holds
+# the values themselves
+_STRING = re.compile(r"[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_VALUES = re.compile(r"\bVALUES\s*\((?:[^()]|\([^()]*\))*\)(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))*", re.I)
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def _text(sql):
+    if isinstance(sql, bytes):
+        return sql.decode('utf-8', 'replace')
+    if not isinstance(sql, str):   # psycopg2.sql.Composed and friends
+        return str(sql)
+    return sql
+
+
+class SlowQueries:
+    """The `size` slowest statements seen, keyed by their SQL template.
+
+    String and number literals become ``?``, as do VALUES lists and
+    IN/ARRAY lists, so statements whose values were interpolated client-side
+    (execute_values) group by shape and no request data ends up in the
+    metrics output. ``%s`` and ``$n`` placeholders are kept.
+    """
+
+    def __init__(self, size=20, max_length=300):
+        self.size = size
+        self.max_length = max_length
+        self._worst = {}   # statement -> seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(sql):
+        sql = _STRING.sub('?', _text(sql))
+        sql = _NUMBER.sub('?', sql)
+        sql = _LIST.sub('?', _VALUES.sub('VALUES ?', sql))
+        return re.sub(r'\s+', ' ', sql).strip()
+
+    def record(self, sql, seconds):
+        with self._lock:
+            if len(self._worst) >= self.size and seconds <= min(self._worst.values()):
+                return
+        statement = self.normalize(sql)[:self.max_length]
+        with self._lock:
+            if seconds > self._worst.get(statement, 0):
+                self._worst[statement] = seconds
+            if len(self._worst) > self.size:
+                del self._worst[min(self._worst, key=self._worst.get)]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._worst)
+
+
+# ---------- per-request timing ----------
+_local = threading.local()
+
+
+class RequestTiming:
+    """Time spent in each phase of the current request."""
+    __slots__ = ('started', 'db_connect', 'db', 'queries', 'render', 'emit', 'emits')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_connect = self.db = self.render = self.emit = 0.0
+        self.queries = self.emits = 0
+
+    def server_timing(self):
+        """Value for a Server-Timing response header (durations in ms)."""
+        total = (time.perf_counter() - self.started) * 1000
+        parts = [
+            f'dbconn;dur={self.db_connect * 1000:.2f}',
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'render;dur={self.render * 1000:.2f}',
+            f'emit;dur={self.emit * 1000:.2f};desc="{self.emits} emits"',
+            f'total;dur={total:.2f}',
+        ]
+        return ', '.join(parts)
+
+
+def start_request():
+    _local.timing = RequestTiming()
+    return _local.timing
+
+
+def end_request():
+    timing = getattr(_local, 'timing', None)
+    _local.timing = None
+    return timing
+
+
+def current():
+    return getattr(_local, 'timing', None)
+
+
+class Instrumentation:
+    """The metrics app.py records; one instance per process."""
+
+    def __init__(self, slow_queries=20):
+        self.registry = Registry()
+        r = self.registry
+        self.requests = r.histogram('nexusboard_request_seconds', 'Request latency by route.',
+                                    ['route', 'method', 'status'])
+        self.request_queries = r.histogram('nexusboard_request_queries', 'SQL statements issued per request.',
+                                           ['route'], buckets=COUNT_BUCKETS)
+        self.request_db = r.histogram('nexusboard_request_db_seconds', 'Time per request spent executing SQL.',
+                                      ['route'])
+        self.db_connect = r.histogram('nexusboard_db_connection_seconds',
+                                      'Time to get a pooled connection (wait, health check, connect).')
+        self.queries = r.histogram('nexusboard_db_query_seconds', 'SQL statement duration by verb.', ['verb'])
+        self.query_errors = r.counter('nexusboard_db_query_errors_total', 'SQL statements that raised.', ['verb'])
+        self.render = r.histogram('nexusboard_template_render_seconds', 'Jinja render time by template.',
+                                  ['template'])
+        self.emits = r.histogram('nexusboard_socketio_emit_seconds', 'Time spent in SocketIO.emit.', ['event'])
+        self.fanout = r.histogram('nexusboard_socketio_emit_recipients',
+                                  'Sockets on this process an emit was addressed to, by event and room kind.',
+                                  ['event', 'room'], buckets=COUNT_BUCKETS)
+        self.slow = SlowQueries(size=slow_queries)
+        r.gauge('nexusboard_db_slow_query_seconds',
+                'Slowest statements seen by this process (parameters redacted).',
+                ['statement'], lambda: {(s,): v for s, v in self.slow.snapshot().items()})
+
+    # ----- SQL -----
+    def observe_query(self, sql, seconds, failed=False):
+        m = re.match(r'\s*(\w+)', _text(sql))
+        verb = m.group(1).lower() if m else 'unknown'
+        if verb not in ('select', 'insert', 'update', 'delete', 'with', 'copy'):
+            verb = 'other'
+        self.queries.observe(seconds, verb)
+        if failed:
+            self.query_errors.inc(verb)
+        self.slow.record(sql, seconds)
+        timing = current()
+        if timing is not None:
+            timing.db += seconds
+            timing.queries += 1
+
+    def observe_connect(self, seconds):
+        self.db_connect.observe(seconds)
+        timing = current()
+        if timing is not None:
+            timing.db_connect += seconds
+
+    def connection_factory(self):
+        """A psycopg2 connection class whose cursors time every statement;
+        pass it as ``connection_factory`` to psycopg2.connect."""
+        instrumentation = self
+        cursor_classes = {}
+
+        def timed_cursor_class(base):
+            cls = cursor_classes.get(base)
+            if cls is None:
+                cls = cursor_classes[base] = type('Timed' + base.__name__, (_TimedCursorMixin, base),
+                                                  {'_instrumentation': instrumentation})
+            return cls
+
+        class TimedConnection(extensions.connection):
+            def cursor(self, *args, **kwargs):
+                base = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+                kwargs['cursor_factory'] = timed_cursor_class(base)
+                return super().cursor(*args, **kwargs)
+
+        return TimedConnection
+
+    # ----- templates / Socket.IO -----
+    def observe_render(self, template, seconds):
+        self.render.observe(seconds, template)
+        timing = current()
+        if timing is not None:
+            timing.render += seconds
+
+    def instrument_socketio(self, socketio):
+        """Wrap socketio.emit to time it and count the sockets it targets here."""
+        emit = socketio.emit
+
+        def timed_emit(event, *args, **kwargs):
+            rooms = kwargs.get('to', kwargs.get('room'))
+            room_list = rooms if isinstance(rooms, (list, tuple, set)) else [rooms]
+            start = time.perf_counter()
+            try:
+                return emit(event, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self.emits.observe(seconds, event)
+                self.fanout.observe(_local_recipients(socketio, kwargs.get('namespace') or '/', room_list),
+                                    event, _room_kind(room_list))
+                timing = current()
+                if timing is not None:
+                    timing.emit += seconds
+                    timing.emits += 1
+
+        socketio.emit = timed_emit
+
+    # ----- requests -----
+    def observe_request(self, route, method, status, timing):
+        seconds = time.perf_counter() - timing.started
+        self.requests.observe(seconds, route, method, f'{status // 100}xx')
+        self.request_queries.observe(timing.queries, route)
+        self.request_db.observe(timing.db, route)
+
+
+class _TimedCursorMixin:
+    _instrumentation = None
+
+    def _statement(self, query):
+        # psycopg2.sql objects are rendered against this connection
+        return query.as_string(self) if hasattr(query, 'as_string') else query
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            self._instrumentation.observe_query(self._statement(query), time.perf_counter() - start, failed)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            self._instrumentation.observe_query(self._statement(query), time.perf_counter() - start, failed)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().copy_expert(sql, file, size)
+            failed = False
+            return result
+        finally:
+            self._instrumentation.observe_query(self._statement(sql), time.perf_counter() - start, failed)
+
+
+def _room_kind(rooms):
+    """'board', 'user', ... from room names like board_12; 'all' for broadcasts."""
+    kinds = {('all' if r is None else re.sub(r'_?\d+$', '', str(r)) or 'other') for r in rooms}
+    return ','.join(sorted(kinds))
+
+
+def _local_recipients(socketio, namespace, rooms):
+    server = getattr(socketio, 'server', None)
+    manager = getattr(server, 'manager', None)
+    if manager is None:
+        return 0
+    ns_rooms = manager.rooms.get(namespace, {})
+    sids = set()
+    for room in rooms:
+        sids.update(ns_rooms.get(room, {}))
+    return len(sids)
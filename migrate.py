@@ -0,0 +1,143 @@
+"""Versioned schema migrations for NexusBoard.
+
+Migrations are the numbered files in migrations/ (``0001_initial.sql``, ...).
+Each one runs once, in its own transaction, and is recorded in
+schema_migrations. Run them with ``flask --app app migrate``.
+"""
+import os
+import re
+from datetime import datetime
+
+import dal
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_[\w-]+\.sql$')
+# pg_advisory_lock key so two deploys can't migrate the same database at once
+LOCK_KEY = 0x4E584220
+
+
+def _dal_query(desc, query, params, tables):
+    """A HOT_QUERIES entry for a dal.Query, in the plain form the app runs
+    when prepared statements are off (the plan is the same)."""
+    return desc, query._plain, {f'p{i}': v for i, v in enumerate(params, 1)}, tables
+
+
+# (description, query, params, table or tables that must be read through an
+# index) for the dal.py lookups the pages run on every visit; app.py adds its
+# own (search, my tasks, role check) for `migrate --check`. See check_indexes.
+_CURSOR = (datetime(2000, 1, 1), 1)
+HOT_QUERIES = [
+    _dal_query('board', dal.BOARD, (1,), 'boards'),
+    _dal_query('board members', dal.BOARD_MEMBERS, (1,), 'user_boards'),
+    *(_dal_query('board task grid' + ' searched' * s + ' filtered by member' * f, query,
+                 (1, *(['term'] if s else []), *([1] if f else [])), 'tasks')
+      for (s, f), query in dal.BOARD_TASKS.items()),
+    _dal_query('task', dal.TASK, (1,), 'tasks'),
+    _dal_query('dashboard boards', dal.DASHBOARD_BOARDS, (1,), ('boards', 'user_boards')),
+    _dal_query('performance', dal.MEMBER_STATS, (1,), ('user_boards', 'board_member_stats')),
+    *(_dal_query('board history' + {(False, False): '', (True, False): ' before a cursor',
+                                     (False, True): ' after a cursor', (True, True): ' between cursors'}[b, a],
+                 query,
+                 (1, *(_CURSOR if b else ()), *(_CURSOR if a else ()), 51), 'history')
+      for (b, a), query in dal.HISTORY_PAGES.items()),
+]
+
+
+def available_migrations():
+    """[(version, path)] for every migration file, oldest first."""
+    found = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        m = MIGRATION_FILE.match(name)
+        if m:
+            found.append((m.group(1), os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(found)
+
+
+def applied_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+              version VARCHAR(20) PRIMARY KEY,
+              name TEXT NOT NULL,
+              applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("SELECT version FROM schema_migrations")
+        done = {r[0] for r in cur.fetchall()}
+    conn.commit()
+    return done
+
+
+def migrate(conn, log=print):
+    """Apply pending migrations in order; returns the versions applied."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    conn.commit()
+    ran = []
+    try:
+        done = applied_migrations(conn)
+        for version, path in available_migrations():
+            if version in done:
+                continue
+            name = os.path.basename(path)
+            with open(path, encoding='utf-8') as f:
+                sql = f.read()
+            log(f'applying {name}')
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                                (version, name))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            ran.append(version)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        conn.commit()
+    return ran
+
+
+def _plan_scans(plan):
+    """[(node type, relation, index name)] for every scan node in an EXPLAIN plan."""
+    scans = []
+    if 'Relation Name' in plan or 'Index Name' in plan:
+        scans.append((plan['Node Type'], plan.get('Relation Name'), plan.get('Index Name')))
+    for child in plan.get('Plans', []):
+        scans += _plan_scans(child)
+    return scans
+
+
+def check_indexes(conn, queries=HOT_QUERIES):
+    """EXPLAIN each of `queries` and check its tables are read through an index.
+
+    Sequential scans are disabled for the check: on a near-empty development
+    database the planner rightly prefers them, and the question here is
+    whether a usable index exists for the query shape.
+    Returns [(description, tables, indexes used, ok)].
+    """
+    results = []
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        # a partition's scans and indexes count for its parent (history)
+        cur.execute("""
+            SELECT c.relname, p.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+        """)
+        parent = dict(cur.fetchall())
+        cur.execute("SELECT indexname, tablename FROM pg_indexes WHERE schemaname = current_schema()")
+        index_table = {idx: parent.get(table, table) for idx, table in cur.fetchall()}
+        for desc, query, params, tables in queries:
+            tables = (tables,) if isinstance(tables, str) else tuple(tables)
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            scans = [(node, parent.get(rel, rel), idx)
+                     for node, rel, idx in _plan_scans(cur.fetchone()[0][0]['Plan'])]
+            used = {table: {idx for _, _, idx in scans if idx and index_table.get(idx) == table}
+                    for table in tables}
+            seq = any(node == 'Seq Scan' and rel in tables for node, rel, _ in scans)
+            results.append((desc, tables, sorted(set().union(*used.values())),
+                            all(used.values()) and not seq))
+    conn.rollback()
+    return results
@@ -38,17 +38,6 @@ CREATE TABLE IF NOT EXISTS tasks (
 ALTER TABLE tasks
 ADD COLUMN IF NOT EXISTS position INTEGER DEFAULT 0;
 
-WITH ordered AS (
-  SELECT id, ROW_NUMBER() OVER (PARTITION BY board_id ORDER BY created_at, id) AS rn
-  FROM tasks
-)
-UPDATE tasks
-SET position = ordered.rn
-FROM ordered
-WHERE tasks.id = ordered.id;
-
-select * from tasks;
-
 ALTER TABLE tasks
 ADD COLUMN IF NOT EXISTS progress_percent INTEGER DEFAULT 0;
 
@@ -58,4 +47,4 @@ CREATE TABLE IF NOT EXISTS history (
   user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
   action TEXT NOT NULL,
   timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
@@ -0,0 +1,11 @@
+-- one-time position backfill (used to rerun from create_tables.sql on every
+-- setup). Keeps each board's current order and spaces cards 1024 apart, the
+-- POSITION_STEP that update_task_order moves cards between.
+WITH ordered AS (
+  SELECT id, ROW_NUMBER() OVER (PARTITION BY board_id ORDER BY position, created_at, id) AS rn
+  FROM tasks
+)
+UPDATE tasks
+SET position = ordered.rn * 1024
+FROM ordered
+WHERE tasks.id = ordered.id;
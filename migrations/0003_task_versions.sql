@@ -0,0 +1,17 @@
+-- per-board task versioning: every task mutation bumps boards.task_seq and
+-- stamps the rows it touched, deletes leave a tombstone, so clients can fetch
+-- only what changed since the version they last saw
+ALTER TABLE boards
+ADD COLUMN IF NOT EXISTS task_seq BIGINT NOT NULL DEFAULT 0;
+
+ALTER TABLE tasks
+ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS tasks_board_version_idx ON tasks (board_id, version);
+
+CREATE TABLE IF NOT EXISTS task_deletions (
+  board_id INTEGER REFERENCES boards(id) ON DELETE CASCADE,
+  task_id INTEGER NOT NULL,
+  version BIGINT NOT NULL,
+  PRIMARY KEY (board_id, version, task_id)
+);
@@ -0,0 +1,35 @@
+-- secondary indexes for the queries nearly every route runs
+-- (checked with `flask --app app migrate --check`)
+
+-- membership: one row per (user, board). Drop duplicates left by the old
+-- SELECT-then-INSERT join/invite flow before enforcing it.
+DELETE FROM user_boards a
+USING user_boards b
+WHERE a.user_id = b.user_id AND a.board_id = b.board_id AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS user_boards_user_board_key ON user_boards (user_id, board_id);
+CREATE INDEX IF NOT EXISTS user_boards_board_idx ON user_boards (board_id);
+
+-- dashboard: boards a user owns, newest first
+CREATE INDEX IF NOT EXISTS boards_owner_created_idx ON boards (owner_id, created_at DESC);
+
+-- board_view task grid and the ?filter=<user> / performance per-member lookups
+CREATE INDEX IF NOT EXISTS tasks_board_position_idx ON tasks (board_id, position, id);
+CREATE INDEX IF NOT EXISTS tasks_board_assigned_idx ON tasks (board_id, assigned_to);
+CREATE INDEX IF NOT EXISTS tasks_assigned_idx ON tasks (assigned_to);
+
+-- board_history, newest first
+CREATE INDEX IF NOT EXISTS history_board_timestamp_idx ON history (board_id, timestamp DESC, id DESC);
+
+-- LOWER(t.name) LIKE '%term%' search; pg_trgm ships in postgresql-contrib,
+-- which not every install has
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS tasks_name_trgm_idx ON tasks USING gin (LOWER(name) gin_trgm_ops);
+  ELSE
+    RAISE NOTICE 'pg_trgm not available: task name search will scan the board''s tasks';
+  END IF;
+END
+$$;
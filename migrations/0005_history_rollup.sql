@@ -0,0 +1,12 @@
+-- daily per-user action counts that `flask compact-history` folds raw history
+-- rows into once they are older than HISTORY_RETENTION_DAYS
+CREATE TABLE IF NOT EXISTS history_rollup (
+  id SERIAL PRIMARY KEY,
+  board_id INTEGER REFERENCES boards(id) ON DELETE CASCADE,
+  day DATE NOT NULL,
+  user_id INTEGER,   -- no FK: a deleted user's counts stay, under their old id
+  action_count INTEGER NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS history_rollup_board_day_user_key
+  ON history_rollup (board_id, day, (COALESCE(user_id, 0)));
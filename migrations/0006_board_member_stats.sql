@@ -0,0 +1,62 @@
+-- running per-board, per-assignee task aggregates so the Performance and
+-- % Completion panels read O(members) rows instead of scanning every task.
+-- user_id 0 collects unassigned tasks; board totals are the sum of a board's
+-- rows. Kept current by the trigger below; `flask reconcile-stats` rebuilds
+-- them from tasks and reports any drift.
+CREATE TABLE IF NOT EXISTS board_member_stats (
+  board_id INTEGER NOT NULL REFERENCES boards(id) ON DELETE CASCADE,
+  user_id INTEGER NOT NULL,
+  task_count INTEGER NOT NULL DEFAULT 0,
+  progress_sum BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (board_id, user_id)
+);
+
+CREATE OR REPLACE FUNCTION tasks_maintain_member_stats() RETURNS trigger AS $$
+BEGIN
+  -- take the old row out with a plain UPDATE: when a board delete cascades to
+  -- its tasks the stats rows may already be gone, and an upsert would then
+  -- try to re-insert a row for the board being deleted
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.board_id IS NOT NULL THEN
+    UPDATE board_member_stats
+    SET task_count = task_count - 1,
+        progress_sum = progress_sum - COALESCE(OLD.progress_percent, 0)
+    WHERE board_id = OLD.board_id AND user_id = COALESCE(OLD.assigned_to, 0);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.board_id IS NOT NULL THEN
+    INSERT INTO board_member_stats (board_id, user_id, task_count, progress_sum)
+    VALUES (NEW.board_id, COALESCE(NEW.assigned_to, 0), 1, COALESCE(NEW.progress_percent, 0))
+    ON CONFLICT (board_id, user_id) DO UPDATE
+    SET task_count = board_member_stats.task_count + 1,
+        progress_sum = board_member_stats.progress_sum + EXCLUDED.progress_sum;
+  END IF;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_member_stats_ins_del ON tasks;
+CREATE TRIGGER tasks_member_stats_ins_del
+AFTER INSERT OR DELETE ON tasks
+FOR EACH ROW EXECUTE FUNCTION tasks_maintain_member_stats();
+
+-- reorders (position/version only) don't touch the aggregates
+DROP TRIGGER IF EXISTS tasks_member_stats_upd ON tasks;
+CREATE TRIGGER tasks_member_stats_upd
+AFTER UPDATE OF board_id, assigned_to, progress_percent ON tasks
+FOR EACH ROW
+WHEN (OLD.board_id IS DISTINCT FROM NEW.board_id
+      OR OLD.assigned_to IS DISTINCT FROM NEW.assigned_to
+      OR OLD.progress_percent IS DISTINCT FROM NEW.progress_percent)
+EXECUTE FUNCTION tasks_maintain_member_stats();
+
+INSERT INTO board_member_stats (board_id, user_id, task_count, progress_sum)
+SELECT board_id, COALESCE(assigned_to, 0), COUNT(*), COALESCE(SUM(progress_percent), 0)
+FROM tasks
+WHERE board_id IS NOT NULL
+GROUP BY board_id, COALESCE(assigned_to, 0)
+ON CONFLICT (board_id, user_id) DO UPDATE
+SET task_count = EXCLUDED.task_count, progress_sum = EXCLUDED.progress_sum;
+
+-- overdue counts depend on the clock, so they are counted at read time from
+-- the open tasks only (progress < 100), through this partial index
+CREATE INDEX IF NOT EXISTS tasks_open_due_idx ON tasks (board_id, due_date)
+  INCLUDE (assigned_to) WHERE progress_percent < 100;
@@ -0,0 +1,14 @@
+-- full-text task search over name (weight A), description (B) and comments
+-- (C). The column is maintained by Postgres itself; the 'english' config
+-- must match SEARCH_CONFIG in app.py.
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(name, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(description, '')), 'B') ||
+    setweight(to_tsvector('english', COALESCE(comments, '')), 'C')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS tasks_search_idx ON tasks USING gin (search_vector);
+
+-- the name-only LIKE search it replaces
+DROP INDEX IF EXISTS tasks_name_trgm_idx;
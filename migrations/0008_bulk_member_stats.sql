@@ -0,0 +1,52 @@
+-- maintain board_member_stats once per statement for inserts and deletes.
+-- The row-level trigger from 0006 updated the same (board, assignee) row once
+-- per task, so a bulk COPY of N tasks piled N versions onto a handful of stats
+-- rows and slowed down quadratically. These fold each statement's rows into
+-- one upsert/update per (board, assignee) through transition tables.
+-- Updates keep the row-level trigger: they touch one task at a time.
+CREATE OR REPLACE FUNCTION tasks_member_stats_inserted() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO board_member_stats (board_id, user_id, task_count, progress_sum)
+  SELECT board_id, COALESCE(assigned_to, 0), COUNT(*), COALESCE(SUM(progress_percent), 0)
+  FROM new_tasks
+  WHERE board_id IS NOT NULL
+  GROUP BY board_id, COALESCE(assigned_to, 0)
+  ON CONFLICT (board_id, user_id) DO UPDATE
+  SET task_count = board_member_stats.task_count + EXCLUDED.task_count,
+      progress_sum = board_member_stats.progress_sum + EXCLUDED.progress_sum;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- a plain UPDATE, as in 0006: a board delete cascading to its tasks may have
+-- removed the stats rows already
+CREATE OR REPLACE FUNCTION tasks_member_stats_deleted() RETURNS trigger AS $$
+BEGIN
+  UPDATE board_member_stats s
+  SET task_count = s.task_count - d.task_count,
+      progress_sum = s.progress_sum - d.progress_sum
+  FROM (
+    SELECT board_id, COALESCE(assigned_to, 0) AS user_id,
+           COUNT(*) AS task_count, COALESCE(SUM(progress_percent), 0) AS progress_sum
+    FROM old_tasks
+    WHERE board_id IS NOT NULL
+    GROUP BY board_id, COALESCE(assigned_to, 0)
+  ) d
+  WHERE s.board_id = d.board_id AND s.user_id = d.user_id;
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_member_stats_ins_del ON tasks;
+
+DROP TRIGGER IF EXISTS tasks_member_stats_ins ON tasks;
+CREATE TRIGGER tasks_member_stats_ins
+AFTER INSERT ON tasks
+REFERENCING NEW TABLE AS new_tasks
+FOR EACH STATEMENT EXECUTE FUNCTION tasks_member_stats_inserted();
+
+DROP TRIGGER IF EXISTS tasks_member_stats_del ON tasks;
+CREATE TRIGGER tasks_member_stats_del
+AFTER DELETE ON tasks
+REFERENCING OLD TABLE AS old_tasks
+FOR EACH STATEMENT EXECUTE FUNCTION tasks_member_stats_deleted();
@@ -0,0 +1,4 @@
+-- version of a board's details and membership, bumped by edits, joins,
+-- invites and removals. Cached board page fragments (header, member list)
+-- are keyed on it, the way the task grid is keyed on task_seq.
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS meta_seq BIGINT NOT NULL DEFAULT 0;
@@ -0,0 +1,69 @@
+-- history becomes range-partitioned by month on timestamp, so retention drops
+-- whole partitions instead of DELETEing rows out of one ever-growing heap,
+-- and the board history feed only touches the months it reads.
+-- history_default catches rows for months without a partition (normally
+-- none: partitions are created ahead by archive.ensure_history_partitions).
+ALTER TABLE history RENAME TO history_unpartitioned;
+ALTER INDEX history_pkey RENAME TO history_unpartitioned_pkey;
+ALTER INDEX history_board_timestamp_idx RENAME TO history_unpartitioned_board_timestamp_idx;
+ALTER TABLE history_unpartitioned RENAME CONSTRAINT history_board_id_fkey TO history_unpartitioned_board_id_fkey;
+ALTER TABLE history_unpartitioned RENAME CONSTRAINT history_user_id_fkey TO history_unpartitioned_user_id_fkey;
+
+CREATE TABLE history (
+  id INTEGER NOT NULL DEFAULT nextval('history_id_seq'),
+  board_id INTEGER REFERENCES boards(id) ON DELETE CASCADE,
+  user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+  action TEXT NOT NULL,
+  timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  -- a unique key on a partitioned table must include the partition key;
+  -- ids still come from one sequence
+  PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+ALTER SEQUENCE history_id_seq OWNED BY history.id;
+
+CREATE INDEX history_board_timestamp_idx ON history (board_id, timestamp DESC, id DESC);
+
+CREATE TABLE history_default PARTITION OF history DEFAULT;
+
+-- create the partition for the month containing `month` (history_yYYYYmMM),
+-- first moving any of its rows out of history_default; returns false if it
+-- already existed
+CREATE OR REPLACE FUNCTION history_ensure_partition(month DATE) RETURNS BOOLEAN AS $$
+DECLARE
+  lo TIMESTAMP := date_trunc('month', month);
+  hi TIMESTAMP := date_trunc('month', month) + INTERVAL '1 month';
+  part TEXT := 'history_' || to_char(lo, '"y"YYYY"m"MM');
+BEGIN
+  IF to_regclass(part) IS NOT NULL THEN
+    RETURN FALSE;
+  END IF;
+  EXECUTE format('CREATE TABLE %I (LIKE history INCLUDING DEFAULTS)', part);
+  EXECUTE format('WITH moved AS (DELETE FROM history_default WHERE timestamp >= %L AND timestamp < %L RETURNING *)
+                  INSERT INTO %I SELECT * FROM moved', lo, hi, part);
+  -- a matching CHECK lets ATTACH skip scanning the new table
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (timestamp >= %L AND timestamp < %L)',
+                 part, part || '_range', lo, hi);
+  EXECUTE format('ALTER TABLE history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, lo, hi);
+  EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, part || '_range');
+  RETURN TRUE;
+END
+$$ LANGUAGE plpgsql;
+
+-- a partition for every month that has history, and for this month and the
+-- next two
+SELECT history_ensure_partition(m::date)
+FROM (
+  SELECT DISTINCT date_trunc('month', timestamp) AS m FROM history_unpartitioned WHERE timestamp IS NOT NULL
+  UNION
+  SELECT generate_series(date_trunc('month', LOCALTIMESTAMP),
+                         date_trunc('month', LOCALTIMESTAMP) + INTERVAL '2 months', INTERVAL '1 month')
+) months;
+
+-- rows that never got a timestamp land in history_default, where
+-- compact-history rolls them up like any other old entry
+INSERT INTO history (id, board_id, user_id, action, timestamp)
+SELECT id, board_id, user_id, action, COALESCE(timestamp, 'epoch')
+FROM history_unpartitioned;
+
+DROP TABLE history_unpartitioned;
@@ -0,0 +1,19 @@
+-- archival of inactive boards. A board nobody has opened (last_opened_at)
+-- or changed (history) for BOARD_ARCHIVE_DAYS has its tasks and history
+-- moved into one board_archives row, as jsonb that Postgres compresses
+-- out of line, and gets them back the next time it is opened.
+-- Existing boards count as opened now.
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS last_opened_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP;
+
+-- candidates for archival, oldest first
+CREATE INDEX IF NOT EXISTS boards_last_opened_idx ON boards (last_opened_at) WHERE archived_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS board_archives (
+  board_id INTEGER PRIMARY KEY REFERENCES boards(id) ON DELETE CASCADE,
+  archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  task_count INTEGER NOT NULL,
+  history_count INTEGER NOT NULL,
+  tasks JSONB NOT NULL,      -- tasks rows (without search_vector), by id
+  history JSONB NOT NULL     -- history rows, oldest first
+);
@@ -0,0 +1,7 @@
+-- "My tasks": a user's assigned tasks across all their boards, keyset-paged
+-- by due date or progress. Each sort is one range scan of its index from the
+-- cursor on; the id column makes the order total. These replace the plain
+-- (assigned_to) index, which they cover.
+CREATE INDEX IF NOT EXISTS tasks_assigned_due_idx ON tasks (assigned_to, due_date, id);
+CREATE INDEX IF NOT EXISTS tasks_assigned_progress_idx ON tasks (assigned_to, progress_percent, id);
+DROP INDEX IF EXISTS tasks_assigned_idx;
@@ -0,0 +1,6 @@
+-- task_deletions tombstones more than TASK_TOMBSTONE_VERSIONS versions behind
+-- their board's task_seq are pruned by the maintenance round; tombstone_seq
+-- is the newest version pruned, so a client asking for changes since an
+-- older version gets the full task list instead of a delta with holes
+ALTER TABLE boards
+ADD COLUMN IF NOT EXISTS tombstone_seq BIGINT NOT NULL DEFAULT 0;
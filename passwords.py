@@ -0,0 +1,145 @@
+"""Password hashing off the event loop, and login throttling.
+
+Werkzeug's hashes (scrypt, pbkdf2) are deliberately slow. Run inline under
+gevent or eventlet, one login stalls every request and socket on the
+worker. PasswordHasher runs them on a small pool of native threads. hashlib
+releases the GIL while it hashes, so hashes run in parallel while the
+greenlets keep serving. Callers past ``max_pending`` get HashPoolBusy
+instead of queueing without bound.
+
+LoginThrottle counts failed logins per client IP and per account in fixed
+windows, so a credential-stuffing run is turned away before it costs a hash.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from cache import TTLCache, MISSING
+
+
+class HashPoolBusy(Exception):
+    """Too many password hashes are already running or waiting."""
+
+
+def native_runner(async_mode, workers):
+    """call(fn, *args) running fn on one of ``workers`` OS threads while
+    only the calling greenlet/thread waits."""
+    if async_mode == 'gevent':
+        from gevent.threadpool import ThreadPool
+        pool = ThreadPool(workers)
+        return lambda fn, *args: pool.apply(fn, args)
+    if async_mode == 'eventlet':
+        from eventlet import tpool   # sized by EVENTLET_THREADPOOL_SIZE
+        return tpool.execute
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return lambda fn, *args: executor.submit(fn, *args).result()
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=2, max_pending=32, async_mode=None):
+        """method: a Werkzeug hash method string ('scrypt',
+        'pbkdf2:sha256:600000', ...). Hashes made with other parameters are
+        reported by needs_rehash().
+        workers: hashes running at once. max_pending: hashes running or
+        waiting before callers get HashPoolBusy.
+        async_mode: the Socket.IO async mode, which decides what kind of
+        thread pool keeps hashing off the event loop.
+        """
+        self.method = method
+        self.workers = workers
+        self._run = native_runner(async_mode, workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._prefix = None     # the method/parameters part of a current hash
+        self._dummy = None      # verified against when the account doesn't exist
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.rejected = 0
+
+    def _call(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+        try:
+            return self._run(fn, *args)
+        finally:
+            self._slots.release()
+            self.hashed += 1
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash. Pass pwhash=None for an
+        unknown account: a throwaway hash is checked instead, so the
+        response takes as long as a real wrong password."""
+        if pwhash is None:
+            pwhash = self._dummy_hash()
+        return self._call(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if pwhash was made with a different method or parameters."""
+        if self._prefix is None:
+            self._prefix = self._dummy_hash().split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def _dummy_hash(self):
+        if self._dummy is None:
+            with self._lock:
+                if self._dummy is None:
+                    self._dummy = self._call(generate_password_hash, 'not a password', self.method)
+        return self._dummy
+
+    def stats(self):
+        return {'hashed': self.hashed, 'rejected': self.rejected}
+
+
+class LoginThrottle:
+    """Fixed-window failure counters per client IP and per account.
+
+    Both limits are checked before a password is hashed. An account's count
+    is cleared by a successful login; an IP's only by its window running
+    out. Counts live in this process, so with N workers an attacker gets up
+    to N times the limit.
+    """
+
+    def __init__(self, window=900.0, max_per_ip=50, max_per_account=10, maxsize=100000):
+        self.window = window
+        self.limits = {'ip': max_per_ip, 'account': max_per_account}
+        self._counts = TTLCache(maxsize=maxsize, ttl=window)   # (kind, key) -> (failures, window end)
+        self._lock = threading.Lock()
+        self.blocked_count = 0
+
+    def _current(self, key, now):
+        entry = self._counts.get(key, MISSING)
+        if entry is MISSING or entry[1] <= now:
+            return 0, now + self.window
+        return entry
+
+    def retry_after(self, ip, account):
+        """Seconds until this IP and account may try again; 0 if they may now."""
+        now = time.monotonic()
+        wait = 0.0
+        for kind, key in (('ip', ip), ('account', account)):
+            if key and self.limits[kind]:
+                failures, ends = self._current((kind, key), now)
+                if failures >= self.limits[kind]:
+                    wait = max(wait, ends - now)
+        if wait:
+            self.blocked_count += 1
+        return wait
+
+    def failed(self, ip, account):
+        now = time.monotonic()
+        with self._lock:
+            for kind, key in (('ip', ip), ('account', account)):
+                if key:
+                    failures, ends = self._current((kind, key), now)
+                    self._counts.set((kind, key), (failures + 1, ends))
+
+    def succeeded(self, account):
+        self._counts.discard(('account', account))
+
+    def stats(self):
+        return {'tracked': len(self._counts), 'blocked': self.blocked_count}
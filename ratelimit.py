@@ -0,0 +1,172 @@
+"""Admission control: token buckets and concurrency caps.
+
+TokenBuckets holds one bucket per key (a user, a board, a socket). A bucket
+holds up to ``burst`` tokens and refills at ``rate`` tokens per second. Each
+admitted action takes a token, so a client gets its burst at once and then
+``rate`` actions a second. Buckets live in this process; RedisTokenBuckets
+keeps them in Redis so every worker draws from the same ones.
+
+ConcurrencyLimit caps how many requests run some piece of work (DB writes)
+at once in this process. Callers past the cap are turned away rather than
+queued behind the connection pool.
+"""
+import logging
+import threading
+import time
+
+from cache import TTLCache, MISSING
+
+log = logging.getLogger(__name__)
+
+
+class TokenBuckets:
+    """Token buckets in this process. A bucket idle long enough to refill
+    completely is dropped (a missing bucket is a full one)."""
+
+    def __init__(self, rate, burst, maxsize=100000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._buckets = TTLCache(maxsize=maxsize, ttl=self.burst / rate)  # key -> (tokens, at)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key, cost=1):
+        """Take ``cost`` tokens from key's bucket. Returns 0 if they were
+        taken, else the seconds until the bucket will hold them (nothing
+        is taken then)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key, MISSING)
+            tokens = self.burst if entry is MISSING else min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+            if tokens >= cost:
+                self._buckets.set(key, (tokens - cost, now))
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+        return (cost - tokens) / self.rate
+
+    def refund(self, key, cost=1):
+        """Give back tokens take() handed out for an action that was then
+        turned away after all (another bucket was empty)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._buckets.get(key, MISSING)
+            if entry is not MISSING:
+                self._buckets.set(key, (min(self.burst, entry[0] + (now - entry[1]) * self.rate + cost), now))
+            self.allowed -= 1
+
+    def stats(self):
+        return {'tracked': len(self._buckets), 'allowed': self.allowed, 'limited': self.limited}
+
+
+# refill, take and store one bucket atomically, on Redis's clock so that
+# workers with skewed clocks agree; the wait is returned as a string because
+# Lua numbers come back from EVAL truncated to integers
+_TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = burst
+if b[1] then
+  tokens = math.min(burst, tonumber(b[1]) + math.max(0, now - tonumber(b[2])) * rate)
+end
+if tokens < cost then
+  return tostring((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return '0'
+"""
+
+# put tokens back into a bucket, refilled up to now and capped at the burst;
+# a bucket that has expired meanwhile is full already
+_REFUND_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+if not b[1] then
+  return 0
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens = math.min(burst, tonumber(b[1]) + math.max(0, now - tonumber(b[2])) * rate + cost)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+return 0
+"""
+
+
+class RedisTokenBuckets:
+    """TokenBuckets kept in Redis, shared by every worker.
+
+    If Redis can't be reached the action is let through (and counted under
+    ``errors``): the limiter protects the database, it shouldn't take the
+    app down with it.
+    """
+
+    def __init__(self, url, rate, burst, prefix='nexusboard:bucket:'):
+        import redis   # only needed when a shared backend is configured
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._refund = self._redis.register_script(_REFUND_SCRIPT)
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.prefix = prefix
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+        self._failing = False   # logged once per outage, not per request
+
+    def take(self, key, cost=1):
+        try:
+            wait = float(self._take(keys=[f'{self.prefix}{key}'], args=[self.rate, self.burst, cost]))
+            self._failing = False
+        except Exception as e:
+            self.errors += 1
+            if not self._failing:
+                self._failing = True
+                log.warning('rate limit backend unavailable, admitting until it is back: %s', e)
+            wait = 0.0
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    def refund(self, key, cost=1):
+        try:
+            self._refund(keys=[f'{self.prefix}{key}'], args=[self.rate, self.burst, cost])
+        except Exception:
+            self.errors += 1   # the token is lost; take() logs the outage
+        self.allowed -= 1
+
+    def stats(self):
+        return {'allowed': self.allowed, 'limited': self.limited, 'errors': self.errors}
+
+
+class ConcurrencyLimit:
+    """At most ``limit`` holders at once in this process (0 = no limit).
+    acquire() never waits: it returns False when every slot is taken."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit) if limit else None
+        self.active = 0
+        self.peak = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            return False
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        return True
+
+    def release(self):
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'peak': self.peak, 'rejected': self.rejected}
@@ -0,0 +1,441 @@
+// Board page: live task grid, stats panels, history and members.
+// Loaded by templates/board.html, which provides data-board-id and
+// data-board-seq on <body>.
+
+// small error logger to capture runtime errors in console
+window.onerror = function(message, source, lineno, colno, err) {
+  console.error('Window.onerror:', message, 'at', source + ':' + lineno + ':' + colno, err);
+};
+
+function toggleSidebar() {
+  const sb = document.getElementById('sidebar');
+  if (sb) sb.classList.toggle('open');
+}
+
+function showSection(id, el) {
+  document.querySelectorAll('.section').forEach(s => s.classList.remove('active'));
+  const sec = document.getElementById(id);
+  if (sec) sec.classList.add('active');
+  document.querySelectorAll('.sidebar a').forEach(a => a.classList.remove('active'));
+  if (el) el.classList.add('active');
+  const sb = document.getElementById('sidebar');
+  if (sb) sb.classList.remove('open');
+  try { localStorage.setItem('lastBoardSection', id); } catch (_) {}
+  if (id === 'performance') loadCharts();
+  if (id === 'status') loadOverall();
+  if (id === 'history') loadHistory();
+}
+
+// safely parse tojson-injected data
+function safeParseJSON(str, fallback) {
+  try {
+    return JSON.parse(str);
+  } catch (e) {
+    return fallback;
+  }
+}
+
+// the board and its task version come from data attributes on <body>
+const boardId = Number(document.body.dataset.boardId);
+
+// ---------- TASK STATE ----------
+// taskState mirrors the board's tasks; task_update events and
+// /api/board/<id>/tasks?since=<seq> patch it and the grid in place.
+const taskState = new Map();
+let boardSeq = Number(document.body.dataset.boardSeq);
+(safeParseJSON(document.getElementById('task-state')?.textContent || '[]', [])).forEach(t => taskState.set(t.id, t));
+
+function escapeHTML(str) {
+  return String(str ?? '').replace(/[&<>"']/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+}
+
+function fmtDate(iso) {
+  return iso ? iso.slice(0, 16).replace('T', ' ') : '';
+}
+
+// must stay in sync with the task card markup in board_tasks.html
+function renderTaskCard(t) {
+  const card = document.createElement('div');
+  card.className = 'task-card';
+  card.dataset.taskId = t.id;
+  card.dataset.member = t.assigned_name || '';
+  card.innerHTML = `
+    <h4>${escapeHTML(t.name)}</h4>
+    <p>${escapeHTML(t.description || 'No description provided.')}</p>
+    <p><strong>Assigned:</strong> ${escapeHTML(t.assigned_name || 'Unassigned')}</p>
+    <p><strong>Progress:</strong> ${t.progress_percent || 0}%</p>
+    <p><strong>Comments:</strong> ${escapeHTML(t.comments || 'No comments')}</p>
+    <small>Created: ${fmtDate(t.created_at)}</small>
+    ${t.due_date ? `<small> • Due: ${fmtDate(t.due_date)}</small>` : ''}
+    <div class="task-actions">
+      <a href="/edit_task/${t.id}" class="btn edit">Edit</a>
+      <a href="/delete_task/${t.id}" class="btn delete" onclick="return confirm('Delete task?')">Delete</a>
+    </div>`;
+  return card;
+}
+
+function applyTaskDelta(tasks, deleted) {
+  const grid = document.getElementById('task-grid');
+  if (!grid) return;
+  (deleted || []).forEach(id => {
+    taskState.delete(id);
+    grid.querySelector(`.task-card[data-task-id="${id}"]`)?.remove();
+  });
+  (tasks || []).forEach(t => {
+    const known = taskState.get(t.id);
+    if (known && known.version > t.version) return;   // already have a newer copy
+    taskState.set(t.id, t);
+    const card = renderTaskCard(t);
+    const old = grid.querySelector(`.task-card[data-task-id="${t.id}"]`);
+    if (old) old.replaceWith(card); else grid.appendChild(card);
+  });
+  // keep DOM order == (position, id), moving only cards that are out of place
+  const ordered = Array.from(taskState.values())
+    .sort((a, b) => (a.position - b.position) || (a.id - b.id));
+  ordered.forEach((t, i) => {
+    const card = grid.querySelector(`.task-card[data-task-id="${t.id}"]`);
+    if (card && grid.children[i] !== card) grid.insertBefore(card, grid.children[i] || null);
+  });
+  const empty = document.getElementById('task-empty');
+  if (empty) empty.hidden = taskState.size > 0;
+  applyFilter();
+}
+
+let resyncing = false, resyncAgain = false;
+async function resyncTasks() {
+  if (resyncing) { resyncAgain = true; return; }
+  resyncing = true;
+  try {
+    const res = await fetch(`/api/board/${boardId}/tasks?since=${boardSeq}`, { credentials: 'same-origin' });
+    if (!res.ok) { console.error('task resync failed', res.status); return; }
+    const data = await res.json();
+    let deleted = data.deleted;
+    if (data.full) {
+      // too far behind for a delta: drop whatever the full list doesn't have
+      const kept = new Set(data.tasks.map(t => t.id));
+      deleted = Array.from(taskState.keys()).filter(id => !kept.has(id));
+    }
+    applyTaskDelta(data.tasks, deleted);
+    boardSeq = Math.max(boardSeq, data.seq);
+    refreshTaskViews();
+  } catch (e) {
+    console.error('task resync error', e);
+  } finally {
+    resyncing = false;
+    if (resyncAgain) { resyncAgain = false; resyncTasks(); }
+  }
+}
+
+function onTaskUpdate(data) {
+  if (data.seq <= boardSeq) return;
+  // missed an event, or one too big to carry its rows (bulk import)
+  if (data.seq !== boardSeq + 1 || resyncing || data.resync) { resyncTasks(); return; }
+  applyTaskDelta(data.tasks, data.deleted);
+  boardSeq = data.seq;
+  refreshTaskViews();
+}
+
+// the panels read the server-side aggregates, so a burst of task updates
+// only refetches whichever panel is open, once
+let statsTimer = null;
+function refreshTaskViews() {
+  clearTimeout(statsTimer);
+  statsTimer = setTimeout(() => {
+    if (document.getElementById('performance')?.classList.contains('active')) loadCharts();
+    if (document.getElementById('status')?.classList.contains('active')) loadOverall();
+  }, 300);
+}
+
+// ----- Search & Filter -----
+function applyFilter() {
+  const search = document.getElementById('taskSearch');
+  const filter = document.getElementById('memberFilter');
+  const tasks = document.querySelectorAll('.task-card');
+  const term = (search?.value || '').toLowerCase();
+  const member = filter?.value || '';
+  tasks.forEach(t => {
+    const h = t.querySelector('h4');
+    const name = h ? h.innerText.toLowerCase() : '';
+    const assigned = t.dataset.member || '';
+    const show = name.includes(term) && (!member || assigned === member);
+    t.style.display = show ? 'block' : 'none';
+  });
+}
+
+
+document.addEventListener('DOMContentLoaded', () => {
+  const last = (() => { try { return localStorage.getItem('lastBoardSection'); } catch (e) { return null; } })();
+  if (last && document.getElementById(last)) {
+    document.querySelectorAll('.section').forEach(s => s.classList.remove('active'));
+    document.getElementById(last).classList.add('active');
+    if (last === 'history') loadHistory();
+  }
+
+  // ----- Search & Filter -----
+  const search = document.getElementById('taskSearch');
+  const filter = document.getElementById('memberFilter');
+  if (search) search.addEventListener('input', applyFilter);
+  if (filter) filter.addEventListener('change', applyFilter);
+
+  // ----- Drag & Drop -----
+  const grid = document.getElementById('task-grid');
+  if (grid && typeof Sortable !== "undefined") {
+    new Sortable(grid, {
+      animation: 150,
+      ghostClass: 'drag-ghost',
+      onEnd: async evt => {
+        try {
+          const item = evt.item;
+          const neighbour = el => el && el.dataset.taskId ? parseInt(el.dataset.taskId) : null;
+          const move = {
+            task_id: neighbour(item),
+            prev_id: neighbour(item.previousElementSibling),
+            next_id: neighbour(item.nextElementSibling)
+          };
+          const movedTask = evt.item?.querySelector('h4')?.innerText || '';
+          if (!confirm(`Move "${movedTask}" to position ${evt.newIndex + 1}?`)) { applyTaskDelta([], []); return; }
+          const res = await fetch(`/update_task_order/${boardId}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(move)
+          });
+          if (res.status === 429) {
+            applyTaskDelta([], []);   // put the card back
+            alert('Too many changes at once — wait a moment and try again.');
+          } else if (!res.ok) {
+            console.error('Order update failed status', res.status);
+            alert('Could not update order — server error. See console.');
+          }
+        } catch (e) {
+          console.error('update order failed', e);
+          alert('Could not update order — check console.');
+        }
+      }
+    });
+  }
+});
+
+// ---------- PERFORMANCE CHART ----------
+async function fetchStats(path) {
+  const res = await fetch(`/${path}/${boardId}`, { credentials: 'same-origin' });
+  if (!res.ok) throw new Error(`${path} fetch failed: ${res.status}`);
+  return res.json();
+}
+
+async function loadCharts() {
+  const ctx = document.getElementById('perfChart');
+  if (!ctx) return;
+
+  let members;
+  try {
+    members = (await fetchStats('performance')).members;
+  } catch (e) { console.error(e); return; }
+
+  const labels = members.map(m => m.username);
+  const avg = members.map(m => m.avg_progress);
+
+  // Destroy previous chart instance if exists to avoid Chart.js errors
+  if (ctx._chartInstance) {
+    try { ctx._chartInstance.destroy(); } catch (_) {}
+  }
+
+  // use a contrasting color inside white card (white background requested)
+  const chart = new Chart(ctx, {
+    type: 'bar',
+    data: {
+      labels: labels,
+      datasets: [{
+        label: 'Avg % Completed',
+        data: avg,
+        backgroundColor: labels.map(() => 'rgba(54,162,235,0.85)'), // inner color
+        borderColor: labels.map(() => '#1976d2'),
+        borderWidth: 1
+      }]
+    },
+    options: {
+      scales: {
+        x: { beginAtZero: true },
+        y: { beginAtZero: true, max:100 }
+      },
+      plugins: { legend: { display: true } }
+    }
+  });
+
+  // keep reference to destroy later if needed
+  ctx._chartInstance = chart;
+}
+
+// ---------- OVERALL COMPLETION ----------
+async function loadOverall() {
+  let stats;
+  try {
+    stats = await fetchStats('status');
+  } catch (e) { console.error(e); return; }
+  const percent = document.getElementById('overallPercent');
+  const bar = document.getElementById('overallBar');
+  if (percent) percent.innerText = stats.percent;
+  if (bar) bar.value = stats.percent;
+  document.getElementById('overallTasks').innerText = stats.task_count;
+  document.getElementById('overallOverdue').innerText = stats.overdue;
+}
+
+// ---------- HISTORY LOADER ----------
+// The panel loads the newest page once; history_update then only fetches
+// entries newer than the top one, and "Load older" pages backwards by cursor.
+let historyLoaded = false;
+
+async function fetchHistory(query) {
+  const res = await fetch('/history/' + boardId + (query || ''), { credentials: 'same-origin' });
+  if (!res.ok) throw new Error('server returned ' + res.status);
+  return { html: await res.text(), more: res.headers.get('X-History-More') === '1' };
+}
+
+async function loadHistory() {
+  const list = document.getElementById('historyList');
+  if (!list) return;
+  list.innerHTML = '<p>Loading...</p>';
+  try {
+    const { html } = await fetchHistory();
+    // server returns the partial HTML fragment from templates/history.html
+    list.innerHTML = html || '<p>No history available.</p>';
+    historyLoaded = true;
+  } catch (err) {
+    console.error('History fetch failed', err);
+    list.innerHTML = '<p class="error">Unable to load history (' + err.message + ').</p>';
+  }
+}
+
+async function loadNewerHistory() {
+  if (!historyLoaded) return;   // panel never opened; it loads fresh when shown
+  const list = document.getElementById('historyList');
+  const top = list?.querySelector('.history-item');
+  if (!top) return loadHistory();
+  try {
+    const { html, more } = await fetchHistory('?after=' + encodeURIComponent(top.dataset.cursor));
+    if (more) return loadHistory();   // fell more than a page behind
+    if (html.trim()) list.insertAdjacentHTML('afterbegin', html);
+  } catch (err) {
+    console.error('History refresh failed', err);
+  }
+}
+
+async function loadOlderHistory(btn) {
+  btn.disabled = true;
+  try {
+    const { html } = await fetchHistory('?before=' + encodeURIComponent(btn.dataset.before));
+    btn.insertAdjacentHTML('beforebegin', html);
+    btn.remove();
+  } catch (err) {
+    console.error('Older history fetch failed', err);
+    btn.disabled = false;
+  }
+}
+
+// one delegated handler covers entries added by any of the loaders above
+document.addEventListener('DOMContentLoaded', () => {
+  const list = document.getElementById('historyList');
+  if (!list) return;
+  list.addEventListener('click', async ev => {
+    const more = ev.target.closest('.load-more-history');
+    if (more) { ev.preventDefault(); loadOlderHistory(more); return; }
+    const btn = ev.target.closest('.delete-history');
+    if (!btn) return;
+    ev.preventDefault();
+    if (!confirm('Delete this history log?')) return;
+    try {
+      const dres = await fetch('/delete_history/' + btn.dataset.id, { method: 'POST', credentials: 'same-origin' });
+      if (dres.ok) {
+        btn.closest('.history-item')?.remove();
+      } else if (dres.status === 429) {
+        alert('Too many changes at once — wait a moment and try again.');
+      } else {
+        alert('Failed to delete history (server error).');
+      }
+    } catch (e) {
+      console.error('Delete history failed', e);
+      alert('Error deleting history.');
+    }
+  });
+});
+
+// ---------- LIVE PARTIAL LOADERS (members) ----------
+// Fetches just the rendered fragment (served from the server's fragment
+// cache) instead of the whole board page.
+async function loadFragment(name, containerId) {
+  const box = document.getElementById(containerId);
+  if (!box) return;
+  try {
+    const res = await fetch(`/board/${boardId}/fragment/${name}`, { credentials: 'same-origin' });
+    if (!res.ok) { console.error(`${name} fragment fetch failed`, res.status); return; }
+    box.innerHTML = await res.text();
+  } catch (e) {
+    console.error(`${name} fragment error`, e);
+  }
+}
+
+function loadMembers() {
+  return loadFragment('members', 'members-fragment');
+}
+
+// ---------- SOCKET.IO ----------
+(function(){
+  try {
+    const socket = io(); // default path
+    // join board-specific room
+    if (socket && typeof socket.emit === 'function') {
+      socket.emit('join_board', { board_id: boardId });
+    }
+    socket.on('connect', () => { console.log('Socket connected'); });
+
+    // the server turned an event away (too many too fast): send it again later
+    socket.on('rate_limited', data => {
+      if (data && data.event === 'join_board') {
+        setTimeout(() => socket.emit('join_board', { board_id: boardId }), (data.retry_after || 1) * 1000);
+      }
+    });
+
+    // history updates (already implemented server-side)
+    socket.on('history_update', data => {
+      try {
+        if (data && data.board_id === boardId) {
+          // realtime update: fetch only the entries newer than the ones shown
+          loadNewerHistory();
+        }
+      } catch (e) { console.error('history_update handler error', e); }
+    });
+
+    // task updates: add/edit/delete/reorder
+    socket.on('task_update', data => {
+      try {
+        if (data && data.board_id === boardId) {
+          // patch the changed cards in place, then refresh whichever stats panel is open
+          onTaskUpdate(data);
+        }
+      } catch (e) { console.error('task_update handler error', e); }
+    });
+
+    // member updates: invite/remove
+    socket.on('member_update', data => {
+      try {
+        if (data && data.board_id === boardId) {
+          loadMembers();
+        }
+      } catch (e) { console.error('member_update handler error', e); }
+    });
+
+    // progress updates: only update charts & overall
+    socket.on('progress_update', data => {
+      try {
+        if (data && data.board_id === boardId) {
+          refreshTaskViews();
+        }
+      } catch (e) { console.error('progress_update handler error', e); }
+    });
+
+    window.addEventListener('beforeunload', () => {
+      try { socket.emit('leave_board', { board_id: boardId }); } catch(_) {}
+    });
+  } catch (e) {
+    console.error('Socket init error', e);
+  }
+})();
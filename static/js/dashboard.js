@@ -0,0 +1,92 @@
+// Dashboard: sidebar sections and live board cards. Loaded by
+// templates/dashboard.html, which provides data-user-id on <body>.
+
+function toggleSidebar() {
+  document.getElementById('sidebar').classList.toggle('open');
+  document.querySelector('.overlay').classList.toggle('show');
+}
+
+function showSection(id, el) {
+  document.querySelectorAll('section').forEach(s => s.classList.remove('active'));
+  document.getElementById(id).classList.add('active');
+  document.querySelectorAll('.sidebar a').forEach(a => a.classList.remove('active'));
+  el.classList.add('active');
+  toggleSidebar();
+  // save the selected section
+  localStorage.setItem('lastDashboardSection', id);
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  const savedSection = localStorage.getItem('lastDashboardSection');
+  if (savedSection && document.getElementById(savedSection)) {
+    document.querySelectorAll('section').forEach(s => s.classList.remove('active'));
+    document.getElementById(savedSection).classList.add('active');
+    document.querySelectorAll('.sidebar a').forEach(a => {
+      if (a.getAttribute('onclick')?.includes(savedSection)) a.classList.add('active');
+    });
+  }
+});
+
+// board_update arrives only for boards on this user's dashboard and carries
+// the board row, so cards are patched in place instead of reloading.
+const currentUserId = Number(document.body.dataset.userId);
+
+function escapeHTML(s) {
+  return String(s ?? '').replace(/[&<>"']/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+}
+
+function renderBoardCard(b) {
+  const created = (b.created_at || '').slice(0, 16).replace('T', ' ');
+  const owned = b.owner_id === currentUserId;
+  const archived = (b.archived_at || '').slice(0, 10);
+  const card = document.createElement('div');
+  card.className = archived ? 'board-card archived' : 'board-card';
+  card.dataset.boardId = b.id;
+  card.innerHTML = `
+    <h3>${escapeHTML(b.name)}</h3>
+    <p>${escapeHTML(b.description || 'No description')}</p>
+    <small>${owned ? 'Code: ' + escapeHTML(b.board_code) : 'Owner: ' + escapeHTML(b.owner_name)} • Created: ${created}</small>
+    <small class="board-counts">${b.member_count} member(s) • ${b.task_count} task(s)${archived ? ' • Archived ' + archived : ''}</small>
+    <div class="board-actions">
+      <a href="/board/${b.id}">Open</a>${owned ? ` |
+      <a href="/edit_board/${b.id}">Edit</a> |
+      <a href="/delete_board/${b.id}" onclick="return confirm('Delete this board?')">Delete</a>` : ''}${archived ? ` |
+      <form method="POST" action="/restore_board/${b.id}" class="inline-form"><button type="submit" class="link-button">Restore</button></form>` : ''}
+    </div>`;
+  return card;
+}
+
+function syncEmptyState(container) {
+  const empty = container.parentElement.querySelector('.board-empty');
+  if (empty) empty.hidden = container.children.length > 0;
+}
+
+function applyBoardUpdate(data) {
+  const b = data.board;
+  const existing = document.querySelector(`.board-card[data-board-id="${b.id}"]`);
+  const oldContainer = existing && existing.parentElement;
+  if (data.action === 'removed') {
+    if (existing) { existing.remove(); syncEmptyState(oldContainer); }
+    return;
+  }
+  const container = document.getElementById(b.owner_id === currentUserId ? 'created-boards' : 'joined-boards');
+  const card = renderBoardCard(b);
+  if (existing && oldContainer === container) {
+    existing.replaceWith(card);
+  } else {
+    if (existing) { existing.remove(); syncEmptyState(oldContainer); }
+    container.prepend(card);   // newest first, like the server-rendered list
+  }
+  syncEmptyState(container);
+}
+
+try {
+  const socket = io();
+  socket.on('board_update', data => {
+    try {
+      if (data && data.board) applyBoardUpdate(data);
+    } catch (e) { console.error('board_update handler error', e); }
+  });
+} catch (e) {
+  console.warn('Socket.IO not available', e);
+}
@@ -0,0 +1,83 @@
+"""Shared fixtures. Tests that need PostgreSQL use the same DB_* variables as
+app.py and are skipped when that database can't be reached."""
+import os
+import random
+import string
+import sys
+from types import SimpleNamespace
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DSN = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'nexusboard'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASS', 'Abhi2002'),
+    'port': os.environ.get('DB_PORT', '5432'),
+}
+
+
+def connect(**kwargs):
+    try:
+        return psycopg2.connect(**DSN, **kwargs)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f'PostgreSQL not reachable: {e}')
+
+
+@pytest.fixture(scope='session')
+def nexusboard():
+    """The app module, imported against the test database (skipped without
+    one), with background maintenance off."""
+    connect().close()
+    os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+    os.environ.setdefault('HISTORY_MAINTENANCE_INTERVAL', '0')
+    import app
+    return app
+
+
+def random_word():
+    return ''.join(random.choices(string.ascii_lowercase, k=12))
+
+
+def add_user(conn, word, name='owner'):
+    """Insert a user named after `word`; the board fixture deletes it."""
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO users (username, email, password_hash) VALUES (%s, %s, 'x') RETURNING id",
+                    (f'{name}-{word}', f'{name}.{word}@example.test'))
+        return cur.fetchone()[0]
+
+
+def login(client, user_id, word, name='owner'):
+    with client.session_transaction() as session:
+        session['user'] = {'id': user_id, 'username': f'{name}-{word}', 'email': f'{name}.{word}@example.test'}
+    return client
+
+
+@pytest.fixture
+def board(nexusboard):
+    """A fresh, committed board whose owner is its only member: .conn (a
+    connection of its own), .client (logged in as the owner), .user_id, .id
+    and .word. Users added with add_user(conn, board.word) go with it."""
+    word = random_word()
+    conn = connect()
+    try:
+        user_id = add_user(conn, word)
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO boards (name, board_code, owner_id) VALUES (%s, %s, %s) RETURNING id",
+                        (f'Board {word}', f'T{word}', user_id))
+            board_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s, %s)", (user_id, board_id))
+        conn.commit()
+        client = login(nexusboard.app.test_client(), user_id, word)
+        yield SimpleNamespace(conn=conn, client=client, user_id=user_id, id=board_id, word=word)
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            # tasks.assigned_to has no ON DELETE, so the board (and its tasks) goes first
+            cur.execute("DELETE FROM boards WHERE board_code = %s", (f'T{word}',))
+            cur.execute("DELETE FROM users WHERE email LIKE %s", (f'%.{word}@example.test',))
+        conn.commit()
+        conn.close()
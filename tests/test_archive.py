@@ -0,0 +1,74 @@
+import pytest
+
+import archive
+from conftest import connect
+
+
+@pytest.fixture
+def archived_board(board):
+    """(client logged in as the owner, user id, board id, search word) for a
+    fresh board with one task assigned to its owner, archived."""
+    with board.conn.cursor() as cur:
+        cur.execute("INSERT INTO tasks (name, board_id, assigned_to) VALUES (%s, %s, %s)",
+                    (f'Report {board.word}', board.id, board.user_id))
+    assert archive.archive_board(board.conn, board.id) == (1, 0)
+    board.conn.commit()
+    return board.client, board.user_id, board.id, board.word
+
+
+def test_archived_board_is_listed_instead_of_its_tasks(archived_board):
+    client, user_id, board_id, word = archived_board
+
+    data = client.get('/api/my_tasks').get_json()
+    assert data['tasks'] == []
+    assert [(b['id'], b['assigned_count']) for b in data['archived_boards']] == [(board_id, 1)]
+
+    data = client.get(f'/api/search?q={word}').get_json()
+    assert data['results'] == []
+    assert [(b['id'], b['task_count']) for b in data['archived_boards']] == [(board_id, 1)]
+
+    page = client.get('/my_tasks').get_data(as_text=True)
+    assert f'/restore_board/{board_id}' in page
+    page = client.get('/dashboard').get_data(as_text=True)
+    assert f'/restore_board/{board_id}' in page and '1 task(s) • Archived' in page
+
+
+def test_restore_brings_tasks_back(archived_board):
+    client, user_id, board_id, word = archived_board
+
+    resp = client.post(f'/restore_board/{board_id}', headers={'Referer': '/my_tasks'})
+    assert resp.status_code == 302 and resp.headers['Location'].endswith('/my_tasks')
+
+    data = client.get('/api/my_tasks').get_json()
+    assert [t['name'] for t in data['tasks']] == [f'Report {word}']
+    assert data['archived_boards'] == []
+    data = client.get(f'/api/search?q={word}').get_json()
+    assert [r['board_id'] for r in data['results']] == [board_id]
+    assert data['archived_boards'] == []
+
+
+def test_opening_an_archived_board_restores_it_once(nexusboard, archived_board, monkeypatch):
+    client, user_id, board_id, word = archived_board
+    restores, restore = [], archive.restore_board
+
+    def restore_board(conn, board_id):
+        restores.append(board_id)
+        return restore(conn, board_id)
+
+    monkeypatch.setattr(archive, 'restore_board', restore_board)
+    for _ in range(2):
+        resp = client.get(f'/board/{board_id}')
+        assert resp.status_code == 200 and f'Report {word}' in resp.get_data(as_text=True)
+    assert restores == [board_id]
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT archived_at FROM boards WHERE id = %s", (board_id,))
+            assert cur.fetchone() == (None,)
+            cur.execute("SELECT COUNT(*) FROM tasks WHERE board_id = %s", (board_id,))
+            assert cur.fetchone() == (1,)
+            cur.execute("SELECT COUNT(*) FROM board_archives WHERE board_id = %s", (board_id,))
+            assert cur.fetchone() == (0,)
+    finally:
+        conn.close()
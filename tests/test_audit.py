@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+import time
+
+import psycopg2
+import pytest
+
+import audit
+from audit import AuditWriter
+from conftest import DSN, connect
+from db import ConnectionPool
+
+
+class FlakyPool(ConnectionPool):
+    """A real pool whose first `failures` checkouts fail as if the server
+    had gone away."""
+
+    def __init__(self, failures=0):
+        super().__init__(2, **DSN)
+        self.failures = failures
+        self.checkouts = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        if self.failures:
+            self.failures -= 1
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        with super().connection() as conn:
+            yield conn
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(failures=0):
+        pools.append(FlakyPool(failures))
+        return pools[-1]
+
+    yield make
+    for p in pools:
+        p.closeall()
+
+
+def writer(pool, **kwargs):
+    """An AuditWriter whose drain loop never starts on its own (so close()
+    has nothing to wait for), with its notifications in .notified."""
+    notified = []
+    kwargs.setdefault('flush_interval', 0.01)
+    w = AuditWriter(pool, notify=notified.append, spawn=lambda target: None, **kwargs)
+    w.notified = notified
+    return w
+
+
+def actions(board_id):
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT action FROM history WHERE board_id = %s ORDER BY action", (board_id,))
+            return [a for a, in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def test_entries_are_written_in_batches_of_max_batch(board, pool):
+    w = writer(pool(), max_batch=2)
+    for i in range(5):
+        w.submit(board.id, board.user_id, f'action {i}')
+    assert w.stats()['queued'] == 5 and actions(board.id) == []
+
+    w._stopping = True   # drain what is queued, then return
+    w._run()
+    assert actions(board.id) == [f'action {i}' for i in range(5)]
+    assert (w.written, w.batches, w.failed) == (5, 3, 0)
+    assert w.notified == [{board.id}] * 3
+
+
+def test_full_queue_writes_on_the_callers_connection(board, pool):
+    p = pool()
+    w = writer(p, max_queue=1, put_timeout=0.01)
+    w.submit(board.id, board.user_id, 'queued')
+    w.submit(board.id, board.user_id, 'inline', conn=board.conn)
+
+    # committed on the caller's connection, without touching the pool
+    assert actions(board.id) == ['inline']
+    assert p.checkouts == 0
+    assert w.stats() == {'queued': 1, 'written': 1, 'batches': 1, 'inline_writes': 1,
+                         'retries': 0, 'failed': 0}
+    w.close(timeout=0)
+    assert actions(board.id) == ['inline', 'queued']
+
+
+def test_transient_failures_are_retried_with_backoff(board, pool, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(audit, 'time', SimpleNamespace(monotonic=time.monotonic, sleep=sleeps.append))
+    w = writer(pool(failures=3), max_queue=4, put_timeout=0.01, retry_delay=0.1, max_retry_delay=0.3)
+    for i in range(3):
+        w.submit(board.id, board.user_id, f'action {i}')
+
+    w._stopping, w.stop_retries = True, 10
+    w._run()
+    assert sleeps == [0.1, 0.2, 0.3]
+    assert actions(board.id) == ['action 0', 'action 1', 'action 2']
+    assert (w.written, w.batches, w.retries, w.failed) == (3, 1, 3, 0)
+
+
+def test_entries_for_deleted_boards_are_skipped(board, pool):
+    with board.conn.cursor() as cur:
+        cur.execute("INSERT INTO boards (name, board_code, owner_id) VALUES ('Gone', %s, %s) RETURNING id",
+                    (f'G{board.word}', board.user_id))
+        gone = cur.fetchone()[0]
+    board.conn.commit()
+    w = writer(pool())
+    w.submit(gone, board.user_id, 'lost')
+    w.submit(board.id, board.user_id, 'kept')
+    with board.conn.cursor() as cur:
+        cur.execute("DELETE FROM boards WHERE id = %s", (gone,))
+    board.conn.commit()
+
+    w.close(timeout=0)
+    assert actions(board.id) == ['kept'] and actions(gone) == []
+    assert w.failed == 0 and w.batches == 1
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+
+import pytest
+
+import bulk
+from conftest import connect
+
+FIELDS = ('name', 'description', 'comments', 'assigned_to', 'due_date', 'progress_percent')
+
+
+def import_body(board, body, fmt):
+    return board.client.post(f'/import/{board.id}?format={fmt}', data=body.encode(),
+                             content_type='text/csv' if fmt == 'csv' else 'application/json')
+
+
+def export_tasks(board, fmt):
+    resp = board.client.get(f'/export/{board.id}?what=tasks&format={fmt}')
+    assert resp.status_code == 200
+    text = resp.get_data(as_text=True)
+    rows = list(csv.DictReader(io.StringIO(text))) if fmt == 'csv' else json.loads(text)
+    return text, rows
+
+
+def tasks(board):
+    return [(r['name'], r['description'], r['comments'], str(r['assigned_to'] or ''),
+             (r['due_date'] or '')[:10], str(r['progress_percent'])) for r in export_tasks(board, 'json')[1]]
+
+
+@pytest.fixture
+def records(board):
+    """Two tasks to import, in FIELDS order, the first assigned by email."""
+    return [('Write the spec', 'first, with "quotes"', 'line one\nline two',
+             f'owner.{board.word}@example.test', '2026-03-01', '40'),
+            ('Ship it', '', '', '', '', '0')]
+
+
+def expected(board, records):
+    return [(*r[:3], str(board.user_id) if r[3] else '', *r[4:]) for r in records]
+
+
+@pytest.mark.parametrize('fmt', bulk.FORMATS)
+def test_import_then_export_round_trips(board, records, fmt):
+    if fmt == 'csv':
+        out = io.StringIO()
+        csv.writer(out).writerows([FIELDS, *records])
+        body = out.getvalue()
+    else:
+        body = json.dumps([dict(zip(FIELDS, r)) for r in records])
+    resp = import_body(board, body, fmt)
+    assert resp.status_code == 200 and resp.get_json() == {'imported': 2}
+    assert tasks(board) == expected(board, records)
+
+    # an export imports back as the same tasks, appended in order
+    text, rows = export_tasks(board, fmt)
+    assert [r['name'] for r in rows] == [r[0] for r in records]
+    assert import_body(board, text, fmt).get_json() == {'imported': 2}
+    assert tasks(board) == expected(board, records) * 2
+
+
+@pytest.mark.parametrize('fmt, body, record', [
+    ('csv', 'name,progress_percent\nfine,10\nbad,250\n', 3),   # CSV errors give the line
+    ('json', '{"name": "fine"}\n{"name": "bad", "assigned_to": "nobody@example.test"}\n', 2),
+])
+def test_bad_row_rejects_the_whole_import(board, fmt, body, record):
+    resp = import_body(board, body, fmt)
+    assert resp.status_code == 400 and resp.get_json()['record'] == record
+    assert tasks(board) == []
+
+
+def test_json_records_are_buffered_only_up_to_max_record():
+    text = json.dumps([{'name': 'x' * 50}, {'name': 'y' * 50}])
+    records = bulk.read_json(io.StringIO(text), chunk_size=16, max_record=64)
+    assert [r['name'] for _, r in records] == ['x' * 50, 'y' * 50]
+
+    text = json.dumps([{'name': 'short'}, {'name': 'z' * 100}])
+    records = bulk.read_json(io.StringIO(text), chunk_size=16, max_record=64)
+    assert next(records) == (1, {'name': 'short'})
+    with pytest.raises(bulk.BulkImportError, match='longer than 64') as e:
+        next(records)
+    assert e.value.record == 2
+
+
+def test_board_is_locked_only_after_spooling(nexusboard, board):
+    probe = connect()
+    seen = []
+
+    def records():
+        for n in (1, 2):
+            # the request's connection is back in the pool and the board row
+            # is free while the upload is read
+            seen.append('db_conn' in nexusboard.g)
+            with probe.cursor() as cur:
+                cur.execute("SELECT 1 FROM boards WHERE id = %s FOR UPDATE NOWAIT", (board.id,))
+            probe.rollback()
+            yield n, {'name': f'task {n}'}
+
+    try:
+        with nexusboard.app.test_request_context():
+            spool, total = nexusboard.spool_import(board.id, records())
+            with spool:
+                # the board's task version is taken for the COPY
+                with probe.cursor() as cur:
+                    cur.execute("SELECT task_seq FROM boards WHERE id = %s", (board.id,))
+                    seq = cur.fetchone()[0]
+                probe.rollback()
+                assert nexusboard.import_tasks(board.id, board.user_id, spool, total) == 2
+            nexusboard.release_db_conn(None)
+    finally:
+        probe.close()
+    assert seen == [False, False]
+    with board.conn.cursor() as cur:
+        cur.execute("SELECT task_seq FROM boards WHERE id = %s", (board.id,))
+        assert cur.fetchone()[0] == seq + 1
+    board.conn.rollback()
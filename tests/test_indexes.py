@@ -0,0 +1,12 @@
+import migrate
+from conftest import connect
+
+
+def test_hot_queries_use_indexes(nexusboard):
+    conn = connect()
+    try:
+        results = migrate.check_indexes(conn, nexusboard.hot_queries())
+    finally:
+        conn.close()
+    assert results
+    assert [(desc, used) for desc, _, used, ok in results if not ok] == []
@@ -0,0 +1,69 @@
+"""board_member_stats is kept by triggers on tasks (migrations 0006 and
+0008); after any mix of task writes reconcile_board_stats finds no drift."""
+from conftest import add_user
+
+
+def stats(conn, board_id):
+    with conn.cursor() as cur:
+        cur.execute("SELECT user_id, task_count, progress_sum FROM board_member_stats "
+                    "WHERE board_id = %s AND task_count <> 0 ORDER BY user_id", (board_id,))
+        rows = cur.fetchall()
+    conn.rollback()
+    return rows
+
+
+def test_task_writes_leave_no_drift(nexusboard, board):
+    conn, owner = board.conn, board.user_id
+    member = add_user(conn, board.word, 'member')
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO boards (name, board_code, owner_id) VALUES ('Other', %s, %s) RETURNING id",
+                    (f'U{board.word}', owner))
+        other = cur.fetchone()[0]
+    conn.commit()
+
+    def step(sql, params=()):
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+        conn.commit()
+        for board_id in (board.id, other):
+            assert nexusboard.reconcile_board_stats(conn, board_id, fix=False) == [], sql
+
+    try:
+        # one statement, several (board, assignee) groups
+        step("""INSERT INTO tasks (name, board_id, assigned_to, progress_percent, position) VALUES
+                ('a', %(b)s, %(o)s, 10, 1), ('b', %(b)s, %(o)s, 20, 2), ('c', %(b)s, %(m)s, 30, 3),
+                ('d', %(b)s, NULL, 40, 4), ('e', %(x)s, NULL, 50, 1)""",
+             {'b': board.id, 'o': owner, 'm': member, 'x': other})
+        assert stats(conn, board.id) == [(0, 1, 40), (owner, 2, 30), (member, 1, 30)]
+
+        step("UPDATE tasks SET progress_percent = 100 WHERE board_id = %s AND name = 'a'", (board.id,))
+        step("UPDATE tasks SET assigned_to = %s WHERE board_id = %s AND name = 'b'", (member, board.id))
+        step("UPDATE tasks SET assigned_to = NULL, progress_percent = 0 WHERE board_id = %s AND name = 'c'",
+             (board.id,))
+        # a reorder isn't an aggregate change; a move to another board is
+        step("UPDATE tasks SET position = 10, version = version + 1 WHERE board_id = %s AND name = 'd'",
+             (board.id,))
+        step("UPDATE tasks SET board_id = %s WHERE board_id = %s AND name = 'd'", (other, board.id))
+        # the single-row and the statement-level delete paths
+        step("DELETE FROM tasks WHERE board_id = %s AND name = 'a'", (board.id,))
+        step("DELETE FROM tasks WHERE board_id IN (%s, %s) AND name IN ('b', 'e')", (board.id, other))
+        assert stats(conn, board.id) == [(0, 1, 0)]
+        assert stats(conn, other) == [(0, 1, 40)]
+
+        # the app's own writes: a COPY import, a move and a delete
+        resp = board.client.post(f'/import/{board.id}?format=csv', content_type='text/csv',
+                                 data=f'name,assigned_to,progress_percent\nf,{owner},5\ng,,15\n'.encode())
+        assert resp.get_json() == {'imported': 2}
+        with conn.cursor() as cur:
+            cur.execute("SELECT name, id FROM tasks WHERE board_id = %s", (board.id,))
+            ids = dict(cur.fetchall())
+        conn.rollback()
+        board.client.post(f'/update_task_order/{board.id}', json={'task_id': ids['g'], 'next_id': ids['c']})
+        board.client.get(f"/delete_task/{ids['f']}")
+        assert nexusboard.reconcile_board_stats(conn, board.id, fix=False) == []
+        assert stats(conn, board.id) == [(0, 2, 15)]
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM boards WHERE id = %s", (other,))
+        conn.commit()
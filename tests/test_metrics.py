@@ -0,0 +1,35 @@
+from psycopg2.extras import execute_values
+
+import metrics
+from conftest import connect
+
+
+def test_normalize_replaces_literals():
+    normalize = metrics.SlowQueries.normalize
+    assert normalize("SELECT * FROM tasks WHERE name = 'it''s' AND id IN (1, 2, 3) LIMIT 51") == \
+        "SELECT * FROM tasks WHERE name = ? AND id IN (?) LIMIT ?"
+    assert normalize(b"UPDATE tasks SET position = 2048 WHERE id = ANY(ARRAY[4,5,6])") == \
+        "UPDATE tasks SET position = ? WHERE id = ANY(ARRAY[?])"
+    # placeholders and identifiers with digits stay
+    assert normalize("SELECT 1 FROM history_y2026m10 WHERE board_id = $1 AND id = %s") == \
+        "SELECT ? FROM history_y2026m10 WHERE board_id = $1 AND id = %s"
+
+
+def test_execute_values_keeps_values_out_of_slow_query_labels():
+    instrumentation = metrics.Instrumentation()
+    conn = connect(connection_factory=instrumentation.connection_factory())
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE audit_probe (board_id int, user_id int, action text)")
+            execute_values(cur, """
+                INSERT INTO audit_probe (board_id, user_id, action)
+                SELECT e.board_id, e.user_id, e.action
+                FROM (VALUES %s) AS e (board_id, user_id, action)
+            """, [(41, 7, "Created task 'Q3 payroll (draft)'"), (42, None, 'Edited task \\ salaries')],
+                template='(%s::int, %s::int, %s::text)')
+    finally:
+        conn.close()
+    rendered = instrumentation.registry.render()
+    assert 'payroll' not in rendered and 'salaries' not in rendered
+    assert ('INSERT INTO audit_probe (board_id, user_id, action) SELECT e.board_id, e.user_id, e.action '
+            'FROM (VALUES ?) AS e (board_id, user_id, action)') in instrumentation.slow.snapshot()
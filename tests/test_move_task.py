@@ -0,0 +1,71 @@
+import pytest
+
+
+@pytest.fixture
+def cards(nexusboard, board):
+    """(cursor, insert(name, position) -> id, order() -> [names]) on a fresh
+    board; nothing is committed."""
+    cur = board.conn.cursor()
+
+    def insert(name, position):
+        cur.execute("INSERT INTO tasks (name, board_id, position) VALUES (%s, %s, %s) RETURNING id",
+                    (name, board.id, position))
+        return cur.fetchone()[0]
+
+    def order():
+        cur.execute("SELECT name FROM tasks WHERE board_id = %s ORDER BY position, id", (board.id,))
+        return [name for name, in cur.fetchall()]
+
+    yield cur, insert, order
+    cur.close()
+
+
+def positions(cur, *ids):
+    cur.execute("SELECT id, position FROM tasks WHERE id = ANY(%s)", (list(ids),))
+    found = dict(cur.fetchall())
+    return [found[i] for i in ids]
+
+
+def test_move_between_neighbours_and_to_the_ends(nexusboard, board, cards):
+    cur, insert, order = cards
+    step, move = nexusboard.POSITION_STEP, nexusboard.move_task
+    a, b, c = (insert(name, (i + 1) * step) for i, name in enumerate('abc'))
+
+    assert move(cur, board.id, 1, c, a, b)
+    assert positions(cur, a, c, b) == [step, step + step // 2, 2 * step]
+    assert order() == ['a', 'c', 'b']
+
+    assert move(cur, board.id, 2, b, None, a)
+    assert positions(cur, b) == [0]
+    assert order() == ['b', 'a', 'c']
+
+    assert move(cur, board.id, 3, b, c, None)
+    assert positions(cur, b) == [step + step // 2 + step]
+    assert order() == ['a', 'c', 'b']
+
+    # only the moved card is rewritten
+    cur.execute("SELECT name, version FROM tasks WHERE board_id = %s ORDER BY name", (board.id,))
+    assert cur.fetchall() == [('a', 0), ('b', 3), ('c', 1)]
+    assert not move(cur, board.id, 4, 2 ** 31 - 1, a, c)
+
+
+def test_exhausted_gap_renumbers_and_keeps_the_order(nexusboard, board, cards):
+    cur, insert, order = cards
+    step, move = nexusboard.POSITION_STEP, nexusboard.move_task
+    head = insert('head', step)
+    tail = insert('tail', 2 * step)
+    expected, next_id = ['head', 'tail'], tail
+    # keep splitting the gap right after head until nothing is left of it
+    for i in range(step.bit_length() + 2):
+        name = f'm{i:02d}'
+        task_id = insert(name, 100 * step + i)
+        assert move(cur, board.id, i + 1, task_id, head, next_id)
+        expected.insert(1, name)
+        next_id = task_id
+        assert order() == expected
+
+    cur.execute("SELECT position FROM tasks WHERE board_id = %s ORDER BY position", (board.id,))
+    found = [p for p, in cur.fetchall()]
+    assert len(set(found)) == len(found)
+    # the renumbering spread the board out to whole steps again
+    assert positions(cur, head, tail)[1] > 2 * step
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from ratelimit import TokenBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A manual clock for ratelimit: clock.now += seconds."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(ratelimit, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_rejects_once_the_burst_is_spent(clock):
+    buckets = TokenBuckets(rate=2, burst=3)
+    assert [buckets.take('u') for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('u') == pytest.approx(0.5)
+    assert buckets.take('u', cost=3) == pytest.approx(1.5)
+    assert buckets.take('other') == 0   # buckets are per key
+    assert buckets.stats() == {'tracked': 2, 'allowed': 4, 'limited': 2}
+
+
+def test_refills_at_rate_up_to_burst(clock):
+    buckets = TokenBuckets(rate=2, burst=3)
+    for _ in range(3):
+        buckets.take('u')
+    clock.now += 0.25
+    assert buckets.take('u') == pytest.approx(0.25)
+    clock.now += 0.25
+    assert buckets.take('u') == 0
+    assert buckets.take('u') == pytest.approx(0.5)
+
+    # an hour idle refills no more than burst
+    clock.now += 3600
+    assert [buckets.take('u') for _ in range(3)] == [0, 0, 0]
+    assert buckets.take('u') > 0
+
+
+def test_refund_restores_exactly_cost(clock):
+    buckets = TokenBuckets(rate=1, burst=5)
+    assert buckets.take('u', cost=5) == 0
+    buckets.refund('u', cost=2)
+    assert buckets.take('u', cost=3) == pytest.approx(1.0)
+    assert buckets.take('u', cost=2) == 0
+    assert buckets.take('u') == pytest.approx(1.0)
+    assert buckets.stats()['allowed'] == 1   # the refunded take no longer counts
+
+    # a refund can't push a bucket past burst
+    clock.now += 60
+    buckets.take('u')
+    buckets.refund('u', cost=10)
+    assert buckets.take('u', cost=5) == 0
+    assert buckets.take('u') == pytest.approx(1.0)
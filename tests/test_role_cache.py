@@ -0,0 +1,71 @@
+"""Membership changes must reach board_access on the very next request, not
+once the cached role expires (AUTH_CACHE_TTL)."""
+import pytest
+
+from cache import MISSING, VersionClock
+from conftest import add_user, login
+
+
+@pytest.fixture
+def member(nexusboard, board):
+    """(client logged in as a second member of the board, its user id)."""
+    user_id = add_user(board.conn, board.word, 'member')
+    with board.conn.cursor() as cur:
+        cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s, %s)", (user_id, board.id))
+    board.conn.commit()
+    return login(nexusboard.app.test_client(), user_id, board.word, 'member'), user_id
+
+
+def tasks_status(client, board_id):
+    return client.get(f'/api/board/{board_id}/tasks').status_code
+
+
+def cached_role(nexusboard, user_id, board_id):
+    cached = nexusboard.role_cache.get((user_id, board_id), MISSING)
+    return cached[0] if cached is not MISSING else MISSING
+
+
+def test_removed_member_is_refused_on_the_next_request(nexusboard, board, member):
+    client, user_id = member
+    assert tasks_status(client, board.id) == 200
+    assert cached_role(nexusboard, user_id, board.id) == 'member'
+
+    board.client.get(f'/remove_member/{board.id}/{user_id}')
+    assert tasks_status(client, board.id) == 403
+
+
+def test_deleted_board_is_refused_on_the_next_request(nexusboard, board, member):
+    client, user_id = member
+    assert tasks_status(client, board.id) == 200
+    assert tasks_status(board.client, board.id) == 200
+    assert cached_role(nexusboard, board.user_id, board.id) == 'owner'
+
+    board.client.get(f'/delete_board/{board.id}')
+    assert tasks_status(board.client, board.id) in (403, 404)
+    assert tasks_status(client, board.id) in (403, 404)
+
+
+def test_invited_user_is_admitted_on_the_next_request(nexusboard, board):
+    user_id = add_user(board.conn, board.word, 'guest')
+    board.conn.commit()
+    client = login(nexusboard.app.test_client(), user_id, board.word, 'guest')
+    assert tasks_status(client, board.id) == 403
+    assert cached_role(nexusboard, user_id, board.id) is None
+
+    board.client.post(f'/invite_member/{board.id}', data={'email': f'guest.{board.word}@example.test'})
+    assert tasks_status(client, board.id) == 200
+
+
+def test_membership_version_drops_roles_cached_by_other_workers(nexusboard, board, member, monkeypatch):
+    # the shared clock is what reaches the other workers; their caches never
+    # see this worker's discard, so change the row and only bump the version
+    monkeypatch.setattr(nexusboard, 'membership_versions', VersionClock())
+    client, user_id = member
+    assert tasks_status(client, board.id) == 200
+    with board.conn.cursor() as cur:
+        cur.execute("DELETE FROM user_boards WHERE user_id = %s AND board_id = %s", (user_id, board.id))
+    board.conn.commit()
+    assert tasks_status(client, board.id) == 200   # still cached
+
+    nexusboard.membership_versions.bump([board.id])
+    assert tasks_status(client, board.id) == 403
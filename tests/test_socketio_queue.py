@@ -0,0 +1,110 @@
+"""Emits published through a message queue (SOCKETIO_MESSAGE_QUEUE) still
+reach only the sockets in the target room. Flask-SocketIO's test client
+refuses a message queue, so the app is served on a local port and real
+Socket.IO clients connect to it over long-polling."""
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+import pytest
+import socketio
+from werkzeug.serving import make_server
+
+from conftest import add_user, connect, login
+
+
+@pytest.fixture(scope='module')
+def queued(nexusboard):
+    """A second copy of the app module, built with an in-process kombu queue."""
+    env = {'SOCKETIO_MESSAGE_QUEUE': 'memory://', 'SOCKETIO_CHANNEL': 'nexusboard-test'}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location('app_message_queue', nexusboard.__file__)
+    module = sys.modules[spec.name] = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+        yield module
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        sys.modules.pop(spec.name, None)
+        if hasattr(module, 'db_pool'):
+            module.audit_writer.close()
+            module.db_pool.closeall()
+
+
+@pytest.fixture(scope='module')
+def server(queued):
+    """The queued app's base URL."""
+    httpd = make_server('127.0.0.1', 0, queued.app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.port}'
+    httpd.shutdown()
+    thread.join()
+
+
+class Socket:
+    """A Socket.IO client logged in with http_client's session, recording
+    the events it is sent."""
+
+    def __init__(self, url, http_client):
+        self.events = []
+        self.client = socketio.Client()
+        for name in ('task_update', 'board_update'):
+            self.client.on(name, lambda data, name=name: self.events.append((name, data)))
+        cookie = http_client.get_cookie('session').value
+        self.client.connect(url, headers={'Cookie': f'session={cookie}'}, transports=['polling'])
+
+    def received(self, name, timeout=5.0):
+        """The `name` events so far, waiting up to timeout for the first one
+        (delivery goes through the queue's listener thread)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            found = [data for n, data in self.events if n == name]
+            if found or time.monotonic() > deadline:
+                return found
+            time.sleep(0.05)
+
+
+def test_board_events_reach_only_the_rooms_members(queued, server, board):
+    assert queued.SOCKETIO_MESSAGE_QUEUE == 'memory://'
+    conn = connect()
+    other_user = add_user(board.conn, board.word, 'other')
+    with board.conn.cursor() as cur:
+        cur.execute("INSERT INTO boards (name, board_code, owner_id) VALUES ('Other', %s, %s) RETURNING id",
+                    (f'U{board.word}', other_user))
+        other_board = cur.fetchone()[0]
+        cur.execute("INSERT INTO user_boards (user_id, board_id) VALUES (%s, %s)", (other_user, other_board))
+    board.conn.commit()
+    try:
+        owner_http = login(queued.app.test_client(), board.user_id, board.word)
+        other_http = login(queued.app.test_client(), other_user, board.word, 'other')
+        owner, other = Socket(server, owner_http), Socket(server, other_http)
+        owner.client.call('join_board', {'board_id': board.id})
+        other.client.call('join_board', {'board_id': other_board})
+        other.client.call('join_board', {'board_id': board.id})   # not a member: refused
+
+        owner_http.post(f'/add_task/{board.id}', data={'name': 'queued task'})
+        (update,) = owner.received('task_update')
+        assert [t['name'] for t in update['tasks']] == ['queued task']
+        (update,) = owner.received('board_update')
+        assert update['board']['id'] == board.id
+
+        other_http.post(f'/add_task/{other_board}', data={'name': 'elsewhere'})
+        assert [u['board_id'] for u in other.received('task_update')] == [other_board]
+        assert [u['board']['id'] for u in other.received('board_update')] == [other_board]
+        # by now the first task's events would have reached `other` too
+        assert [u['board_id'] for u in owner.received('task_update')] == [board.id]
+        assert [u['board']['id'] for u in owner.received('board_update')] == [board.id]
+        owner.client.disconnect(), other.client.disconnect()
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM boards WHERE id = %s", (other_board,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,62 @@
+import archive
+
+
+def add_tasks(board, *names):
+    for name in names:
+        assert board.client.post(f'/add_task/{board.id}', data={'name': name}).status_code == 302
+    with board.conn.cursor() as cur:
+        cur.execute("SELECT name, id FROM tasks WHERE board_id = %s", (board.id,))
+        ids = dict(cur.fetchall())
+    board.conn.rollback()
+    return [ids[name] for name in names]
+
+
+def delta(board, since):
+    resp = board.client.get(f'/api/board/{board.id}/tasks?since={since}')
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_since_returns_only_newer_tasks(board):
+    add_tasks(board, 'first', 'second')
+    data = delta(board, 0)
+    assert sorted(t['name'] for t in data['tasks']) == ['first', 'second']
+    seq = data['seq']
+
+    (third,) = add_tasks(board, 'third')
+    data = delta(board, seq)
+    assert [t['id'] for t in data['tasks']] == [third]
+    assert data['seq'] == seq + 1 and data['deleted'] == [] and 'full' not in data
+    assert delta(board, data['seq'])['tasks'] == []
+
+
+def test_deletes_come_back_as_tombstones(board):
+    first, second = add_tasks(board, 'first', 'second')
+    seq = delta(board, 0)['seq']
+
+    board.client.get(f'/delete_task/{first}')
+    data = delta(board, seq)
+    assert data['tasks'] == [] and data['deleted'] == [first]
+    # a client that never saw the task gets no tombstone for it
+    assert [t['id'] for t in delta(board, 0)['tasks']] == [second]
+
+
+def test_client_behind_pruned_tombstones_gets_everything(board):
+    first, second, third = add_tasks(board, 'first', 'second', 'third')
+    behind = delta(board, 0)['seq']
+    board.client.get(f'/delete_task/{first}')
+    # push this board far enough ahead that only its tombstones are pruned
+    keep = 10 ** 9
+    with board.conn.cursor() as cur:
+        cur.execute("UPDATE boards SET task_seq = task_seq + %s WHERE id = %s RETURNING task_seq",
+                    (keep, board.id))
+        current = cur.fetchone()[0]
+    board.conn.commit()
+
+    assert archive.prune_task_tombstones(board.conn, keep) >= 1
+
+    data = delta(board, behind)
+    assert data['full'] is True and data['deleted'] == []
+    assert sorted(t['id'] for t in data['tasks']) == [second, third]
+    data = delta(board, current)
+    assert 'full' not in data and data['tasks'] == [] and data['deleted'] == []
@@ -0,0 +1,46 @@
+"""Production entry point for NexusBoard.
+
+    gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker \\
+        -w 1 -b 127.0.0.1:8001 wsgi:app
+
+Each gunicorn process is one Socket.IO server, so scale out by running
+several of these on different ports (or hosts) behind a load balancer with
+sticky sessions, and give them all the same SOCKETIO_MESSAGE_QUEUE so a
+board emit made by one worker reaches clients connected to the others.
+See README.txt.
+"""
+# patch before anything imports socket/threading/psycopg2
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()   # psycopg2 waits on the event loop instead of blocking the worker
+
+import os
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'gevent')
+
+from app import app, asset_pipeline  # noqa: E402
+
+from werkzeug.middleware.proxy_fix import ProxyFix  # noqa: E402
+
+# this many proxies in front of the workers set X-Forwarded-For/-Proto; the
+# login throttle then counts the client's address rather than the proxy's.
+# Off by default (the headers are not trusted) so a directly reachable app
+# can't be fed a spoofed address; deployments behind a proxy opt in
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# pages link the vendored scripts from static/vendor/; refuse to serve
+# pages that would load without them
+if not app.debug:
+    asset_pipeline.check_vendor()
+
+if not os.environ.get('SOCKETIO_MESSAGE_QUEUE'):
+    app.logger.warning('SOCKETIO_MESSAGE_QUEUE is not set; board updates only reach '
+                       'clients connected to this process')
+if not os.environ.get('SHARED_CACHE_URL'):
+    app.logger.warning('SHARED_CACHE_URL is not set; dashboard ETags, rate limits and board '
+                       'permission caching are per process, and ETags may go stale with more '
+                       'than one worker')